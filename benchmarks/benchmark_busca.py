@@ -0,0 +1,91 @@
+"""
+Benchmark da busca: a primeira página da gestão de serviços com ?q= e a API
+de busca unificada, comparando o ILIKE antigo
+(JOIN com os itens + DISTINCT) com o motor de busca (documentos_busca). Também
+confere que o motor acha tudo o que o ILIKE achava; FALHA (código de saída 1)
+se algum resultado antigo sumir.
+
+    python -m benchmarks.benchmark_busca            # ~1 milhão de itens de venda
+    python -m benchmarks.benchmark_busca 100000
+"""
+import sys
+import time
+
+from sqlalchemy import or_, text
+
+from benchmarks.comum import criar_app_benchmark, recriar_base, popular_vendas, medir_latencia
+
+# Termos como digitados na tela (com acento/caixa) e se são estreitos o bastante para comparar conjuntos
+TERMOS = [
+    ('Cliente 4321', True),
+    ('cliente 77', True),
+    ('Peça 2', False),
+    ('tinta', True),
+]
+
+
+def main():
+    qtd_itens = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    app = criar_app_benchmark()
+
+    with app.app_context():
+        from src.extensoes import banco_de_dados as db
+        from src.modulos.vendas.modelos import Venda, ItemVenda
+        from src.modulos.busca import motor
+
+        usuario = recriar_base()
+        # popular_vendas gera 2 itens para cada 3 vendas e 2 pagamentos por venda
+        popular_vendas(qtd_itens * 3, usuario.id)
+
+        inicio = time.perf_counter()
+        conexao = db.session.connection()
+        trigramas = motor.garantir_indices_trigrama(conexao)
+        documentos = motor.reindexar_tudo(conexao)
+        db.session.commit()
+        db.session.execute(text('ANALYZE documentos_busca'))
+        db.session.commit()
+        total_itens = db.session.execute(text('SELECT count(*) FROM venda_itens')).scalar()
+        print(f"Base: {total_itens:,} itens, {documentos['venda']:,} vendas indexadas em "
+              f"{time.perf_counter() - inicio:.1f} s (pg_trgm: {'sim' if trigramas else 'não disponível'})\n")
+
+        def antiga(termo):
+            return Venda.query.outerjoin(ItemVenda).filter(or_(
+                Venda.cliente_nome.ilike(f'%{termo}%'),
+                Venda.descricao_servico.ilike(f'%{termo}%'),
+                ItemVenda.descricao.ilike(f'%{termo}%'),
+                Venda.cor_nome_snapshot.ilike(f'%{termo}%'))).distinct()
+
+        def nova(termo):
+            return Venda.query.filter(motor.condicao('venda', termo, Venda.id))
+
+        def pagina(consulta):
+            return lambda: consulta.order_by(Venda.id.desc()).limit(11).all()
+
+        faltando = 0
+        print(f"{'termo':14} | {'ILIKE (ms)':>10} | {'motor (ms)':>10} | {'API (ms)':>8} | resultados")
+        print('-' * 70)
+        for termo, comparar in TERMOS:
+            ms_antiga = medir_latencia(pagina(antiga(termo)))
+            ms_nova = medir_latencia(pagina(nova(termo)))
+
+            ms_api = medir_latencia(lambda: motor.buscar(termo))
+
+            situacao = '-'
+            if comparar:
+                ids_antigos = {v for (v,) in antiga(termo).with_entities(Venda.id)}
+                ids_novos = {v for (v,) in nova(termo).with_entities(Venda.id)}
+                perdidos = ids_antigos - ids_novos
+                faltando += len(perdidos)
+                situacao = f"{len(ids_antigos):,} -> {len(ids_novos):,}" + (f" ({len(perdidos)} PERDIDOS)" if perdidos else '')
+            db.session.rollback()
+
+            print(f"{termo:14} | {ms_antiga:>10.1f} | {ms_nova:>10.1f} | {ms_api:>8.1f} | {situacao}")
+
+        if faltando:
+            print(f"\nO motor de busca deixou de achar {faltando} venda(s) que o ILIKE achava.")
+            sys.exit(1)
+        print('\nO motor de busca acha tudo o que o ILIKE achava.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark do cadastro de clientes: tempo do "flask deduplicar-clientes" sobre o
+histórico, conferência da deduplicação (mesmo cliente com caixa, acento, espaços e
+pontuação do CPF diferentes vira um registro só; toda venda fica ligada) e latência
+do autocomplete (/vendas/api/buscar-clientes) contra o DISTINCT + ILIKE antigo em
+vendas. FALHA (código de saída 1) se a deduplicação errar ou se o autocomplete
+passar de LIMITE_MS.
+
+    python -m benchmarks.benchmark_clientes            # ~440 mil vendas, 100 mil clientes
+    python -m benchmarks.benchmark_clientes 100000
+"""
+import sys
+import time
+
+from flask import request
+from flask_login import login_user
+from sqlalchemy import text
+
+from benchmarks.comum import criar_app_benchmark, recriar_base, popular_vendas, medir_latencia
+
+LIMITE_MS = 10.0
+TERMOS = ['maria', 'JOSÉ SIL', 'souza', 'concei', 'silva jose', 'cliente 42', '000.000.12', 'zzz', 'maria zzz']
+
+
+def main():
+    qtd_vendas = int(sys.argv[1]) if len(sys.argv) > 1 else 400_000
+    qtd_clientes = max(1, qtd_vendas // 4)
+    app = criar_app_benchmark()
+
+    with app.app_context():
+        from src.extensoes import banco_de_dados as db
+        from src.modulos.vendas.modelos import Venda
+        from src.modulos.vendas.servicos import deduplicar_clientes
+
+        usuario = recriar_base()
+        # popular_vendas cria "Cliente 0".."Cliente 4999" sem documento (1 venda a cada 10 ficam aqui)
+        popular_vendas(qtd_vendas // 5, usuario.id)
+
+        # Cada cliente k aparece ~4 vezes; as repetições alternam caixa/acento/espaços e CPF com ou sem pontuação
+        db.session.execute(text("""
+            INSERT INTO vendas (modo, tipo_cliente, cliente_nome, cliente_documento, cliente_contato,
+                                valor_base, valor_final, status, vendedor_id, criado_em, valor_pago, valor_restante)
+            SELECT 'simples', 'PF',
+                   CASE WHEN (g / :clientes) % 2 = 0 THEN nome ELSE '  ' || upper(translate(nome, 'éãç', 'eac')) || ' ' END,
+                   CASE WHEN k % 2 = 1 THEN NULL
+                        WHEN (g / :clientes) % 2 = 0 THEN doc
+                        ELSE substr(doc, 1, 3) || '.' || substr(doc, 4, 3) || '.' || substr(doc, 7, 3) || '-' || substr(doc, 10) END,
+                   '0000-0000', 100, 100, 'pendente', :usuario, now() - make_interval(days => g % 400), 0, 100
+            FROM (
+                SELECT g, g % :clientes AS k,
+                       (ARRAY['José', 'Maria', 'João', 'Ana', 'Antônio'])[1 + (g % :clientes) % 5] || ' ' ||
+                       (ARRAY['Silva', 'Souza', 'Conceição', 'Oliveira'])[1 + ((g % :clientes) / 5) % 4] || ' ' ||
+                       (g % :clientes) AS nome,
+                       lpad((g % :clientes)::text, 11, '0') AS doc
+                FROM generate_series(1, :qtd) AS g
+            ) s
+        """), {'qtd': qtd_vendas, 'clientes': qtd_clientes, 'usuario': usuario.id})
+        db.session.commit()
+        total_vendas = db.session.query(db.func.count(Venda.id)).scalar()
+
+        inicio = time.perf_counter()
+        total, religadas, _ = deduplicar_clientes()
+        segundos = time.perf_counter() - inicio
+        db.session.commit()
+        # Estado normal depois da carga (o autovacuum faria o mesmo): estatísticas e mapa de visibilidade
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conexao:
+            conexao.execute(text('VACUUM ANALYZE clientes, clientes_palavras'))
+        print(f"Base: {total_vendas:,} vendas -> {total:,} clientes ({religadas:,} vendas ligadas) "
+              f"em {segundos:.1f} s\n")
+
+        falhas = 0
+        esperado = qtd_clientes + min(5000, qtd_vendas // 10)
+        sem_cliente = Venda.query.filter(Venda.cliente_id.is_(None)).count()
+        if total != esperado or sem_cliente:
+            print(f"[FALHOU] esperados {esperado:,} clientes e 0 vendas sem cliente; "
+                  f"obtidos {total:,} e {sem_cliente:,}\n")
+            falhas += 1
+        refeito = deduplicar_clientes()
+        if refeito[1] or refeito[2]:
+            print(f"[FALHOU] rodar de novo mexeu em {refeito[1]} venda(s) e {refeito[2]} cliente(s)\n")
+            falhas += 1
+
+        def chamar(termo):
+            with app.test_request_context('/vendas/api/buscar-clientes', query_string={'q': termo}):
+                login_user(usuario)
+                resposta = app.view_functions[request.endpoint]()
+                return resposta.get_json()
+
+        def antiga(termo):
+            return db.session.query(Venda.cliente_nome, Venda.cliente_documento)\
+                .filter(Venda.cliente_nome.ilike(f'%{termo}%')).distinct().limit(10).all
+
+        print(f"{'termo':12} | {'ILIKE em vendas (ms)':>20} | {'autocomplete (ms)':>17} | sugestões")
+        print('-' * 72)
+        for termo in TERMOS:
+            ms_antiga = medir_latencia(antiga(termo))
+            ms_nova = medir_latencia(lambda: chamar(termo))
+            sugestoes = chamar(termo)
+            db.session.rollback()
+            ok = ms_nova <= LIMITE_MS
+            falhas += not ok
+            exemplo = sugestoes[0]['nome'] if sugestoes else '-'
+            print(f"{termo:12} | {ms_antiga:>20.1f} | {ms_nova:>17.2f} | {len(sugestoes):>2} ({exemplo})"
+                  + ('' if ok else '  <- LENTO'))
+
+        if falhas:
+            print(f"\n{falhas} verificação(ões) falharam.")
+            sys.exit(1)
+        print(f"\nDeduplicação correta e autocomplete abaixo de {LIMITE_MS:.0f} ms.")
+
+
+if __name__ == '__main__':
+    main()
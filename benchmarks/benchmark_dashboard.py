@@ -0,0 +1,38 @@
+"""
+Benchmark do painel (dashboard): quantidade de consultas e latência do
+cálculo dos KPIs com 10 mil, 100 mil e 1 milhão de pagamentos.
+
+    python -m benchmarks.benchmark_dashboard            # 10k, 100k e 1M
+    python -m benchmarks.benchmark_dashboard 10000      # só um tamanho
+"""
+import sys
+from datetime import date
+
+from benchmarks.comum import criar_app_benchmark, recriar_base, popular_vendas, ContadorConsultas, medir_latencia
+
+TAMANHOS = [10_000, 100_000, 1_000_000]
+
+
+def main():
+    tamanhos = [int(t) for t in sys.argv[1:]] or TAMANHOS
+    app = criar_app_benchmark()
+
+    with app.app_context():
+        from src.modulos.dashboard.metricas import calcular_snapshot
+
+        print(f"{'pagamentos':>12} | {'consultas':>9} | {'mediana (ms)':>12}")
+        print('-' * 40)
+        for tamanho in tamanhos:
+            usuario = recriar_base()
+            popular_vendas(tamanho, usuario.id)
+
+            contador = ContadorConsultas()
+            with contador.medir():
+                calcular_snapshot(date.today())
+
+            latencia = medir_latencia(lambda: calcular_snapshot(date.today()))
+            print(f"{tamanho:>12,} | {contador.total:>9} | {latencia:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
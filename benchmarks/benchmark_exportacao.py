@@ -0,0 +1,85 @@
+"""
+Mede o pico de memória (tracemalloc) das exportações para Excel de
+relatorio_servicos e relatorio_consumo com ~10% e com 100% da base.
+Com o cursor em lotes e o XLSX gerado em fluxo o pico não depende do
+número de linhas; FALHA (código de saída 1) se crescer junto com elas.
+
+    python -m benchmarks.benchmark_exportacao            # ~500 mil itens
+    python -m benchmarks.benchmark_exportacao 100000
+"""
+import sys
+import time
+import tracemalloc
+from datetime import timedelta
+
+from flask import request
+from flask_login import login_user
+
+from benchmarks.comum import criar_app_benchmark, recriar_base, popular_vendas
+from src.periodos import hoje_brasilia
+
+DIAS = 400
+# O pico com a base inteira pode ser no máximo isso vezes o pico com ~10% dela
+TOLERANCIA = 1.5
+
+
+def exportar(app, usuario, url):
+    """Chama a rota e consome a resposta como o waitress faria; devolve (bytes, pico MB, 1º bloco s, total s)"""
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    primeiro_bloco = None
+    tamanho = 0
+    with app.test_request_context(url):
+        login_user(usuario)
+        resposta = app.view_functions[request.endpoint](**request.view_args)
+        for bloco in resposta.response:
+            if primeiro_bloco is None:
+                primeiro_bloco = time.perf_counter() - inicio
+            tamanho += len(bloco)
+        resposta.close()
+    segundos = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tamanho, pico / 1024 / 1024, primeiro_bloco, segundos
+
+
+def main():
+    qtd_itens = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    app = criar_app_benchmark()
+
+    with app.app_context():
+        from sqlalchemy import text
+        from src.extensoes import banco_de_dados as db
+
+        usuario = recriar_base()
+        # popular_vendas gera 2 itens para cada 3 vendas e 2 pagamentos por venda
+        popular_vendas(qtd_itens * 3, usuario.id, dias=DIAS)
+        total_itens = db.session.execute(text('SELECT count(*) FROM venda_itens')).scalar()
+        total_saidas = db.session.execute(text('SELECT count(*) FROM movimentacoes_estoque')).scalar()
+        print(f"Base: {total_itens:,} itens de venda, {total_saidas:,} saídas de estoque\n")
+
+        hoje = hoje_brasilia()
+        recorte = f"tipo_periodo=periodo&data_inicio={hoje - timedelta(days=DIAS // 10)}&data_fim={hoje}"
+        tudo = f"tipo_periodo=periodo&data_inicio={hoje - timedelta(days=DIAS + 30)}&data_fim={hoje + timedelta(days=30)}"
+
+        falhas = 0
+        for rota in ['/relatorios/servicos', '/relatorios/consumo-materiais']:
+            picos = []
+            for nome, filtro in [('~10%', recorte), ('100%', tudo)]:
+                tamanho, pico, primeiro_bloco, segundos = exportar(app, usuario, f'{rota}?exportar=excel&{filtro}')
+                picos.append(pico)
+                print(f"{rota:32} {nome:5} xlsx {tamanho / 1024 / 1024:7.1f} MB  pico {pico:6.1f} MB  "
+                      f"1º bloco {primeiro_bloco:5.1f} s  total {segundos:6.1f} s")
+            ok = picos[1] <= picos[0] * TOLERANCIA
+            print(f"[{'OK' if ok else 'FALHOU':6}] pico com a base inteira = {picos[1] / picos[0]:.2f}x o do recorte\n")
+            if not ok:
+                falhas += 1
+
+        if falhas:
+            print(f"{falhas} exportação(ões) com memória proporcional ao número de linhas.")
+            sys.exit(1)
+        print('Memória das exportações constante em relação ao número de linhas.')
+
+
+if __name__ == '__main__':
+    main()
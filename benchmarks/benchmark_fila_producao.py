@@ -0,0 +1,106 @@
+"""
+Benchmark dos contadores da fila de produção (src/modulos/operacional/servicos.py):
+com a fila em aberto e o movimento diário do mesmo tamanho e só o histórico de
+entregas crescendo (10 mil, 100 mil e 1 milhão de pagamentos), compara o jeito antigo
+do painel inicial (carregar todos os itens e vendas simples já vendidos e separar em
+Python) com contar_tarefas + listar_tarefas + tarefas_atrasadas. FALHA (código de
+saída 1) se as contagens divergirem das do jeito antigo.
+
+    python -m benchmarks.benchmark_fila_producao            # 10k, 100k e 1M
+    python -m benchmarks.benchmark_fila_producao 100000     # só um tamanho
+"""
+import sys
+from dataclasses import astuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from benchmarks.comum import criar_app_benchmark, recriar_base, popular_vendas, medir_latencia, ContadorConsultas
+
+TAMANHOS = [10_000, 100_000, 1_000_000]
+VENDAS_EM_ABERTO = 300 # só as vendas mais novas continuam na fila; o resto vira histórico entregue
+PAGAMENTOS_POR_DIA = 25
+
+
+def main():
+    tamanhos = [int(t) for t in sys.argv[1:]] or TAMANHOS
+    app = criar_app_benchmark()
+
+    with app.app_context():
+        from sqlalchemy.orm import joinedload
+        from src.extensoes import banco_de_dados as db
+        from src.periodos import hoje_brasilia
+        from src.modulos.vendas.modelos import Venda, ItemVenda
+        from src.modulos.operacional.servicos import (contar_tarefas, listar_tarefas, tarefas_atrasadas,
+                                                      ContagemTarefas, DIAS_ATRASO)
+
+        hoje = hoje_brasilia()
+
+        def antigo():
+            # Como o painel inicial contava antes: tudo o que já foi vendido, separado em Python
+            contagem = ContagemTarefas()
+            limite = datetime.utcnow() - timedelta(days=DIAS_ATRASO)
+            itens = db.session.query(ItemVenda).join(Venda).filter(
+                Venda.status != 'cancelado', Venda.status != 'orcamento', Venda.modo == 'multipla'
+            ).options(joinedload(ItemVenda.venda)).all()
+            simples = Venda.query.filter(Venda.modo == 'simples', Venda.status != 'cancelado',
+                                         Venda.status != 'orcamento').all()
+            tarefas = [(i.status, i.data_entregue, i.venda.criado_em) for i in itens] + \
+                      [(v.status, v.data_entrega, v.criado_em) for v in simples]
+            for status, entregue_em, criado_em in tarefas:
+                if status == 'entregue':
+                    if entregue_em and (entregue_em.year, entregue_em.month) == (hoje.year, hoje.month):
+                        contagem.entregues_mes += 1
+                    continue
+                setattr(contagem, status, getattr(contagem, status) + 1)
+                if status != 'pronto' and criado_em <= limite:
+                    contagem.atrasados += 1
+            return contagem
+
+        def novo():
+            contagem = contar_tarefas(hoje)
+            listar_tarefas(hoje)
+            tarefas_atrasadas()
+            return contagem
+
+        falhas = 0
+        contador = ContadorConsultas()
+        print(f"{'pagamentos':>12} | {'tarefas lidas (antigo)':>22} | {'antigo (ms)':>11} | {'serviço (ms)':>12} | consultas")
+        print('-' * 82)
+        for tamanho in tamanhos:
+            usuario = recriar_base()
+            # Mesmo movimento por dia em todos os tamanhos: cresce só o histórico, não o mês atual
+            popular_vendas(tamanho, usuario.id, dias=tamanho // PAGAMENTOS_POR_DIA)
+            # Histórico realista: tudo entregue (dois dias depois da venda), menos as vendas mais novas
+            for tabela, coluna, venda in (('venda_itens', 'data_entregue', 'venda_id'), ('vendas', 'data_entrega', 'id')):
+                db.session.execute(text(f"""
+                    UPDATE {tabela} t SET status = 'entregue', {coluna} = v.criado_em + interval '2 days'
+                    FROM vendas v
+                    WHERE v.id = t.{venda} AND t.status NOT IN ('entregue', 'cancelado', 'orcamento')
+                      AND v.id <= (SELECT max(id) FROM vendas) - :em_aberto
+                """), {'em_aberto': VENDAS_EM_ABERTO})
+            db.session.commit()
+            db.session.execute(text('ANALYZE'))
+            db.session.commit()
+
+            esperado = antigo()
+            lidas = db.session.query(ItemVenda).join(Venda).filter(Venda.modo == 'multipla').count() + \
+                Venda.query.filter(Venda.modo == 'simples').count()
+            ms_antigo = medir_latencia(antigo, repeticoes=3)
+            ms_novo = medir_latencia(novo)
+            with contador.medir():
+                obtido = novo()
+            db.session.close() # nada da base deste tamanho fica na sessão ao recriá-la
+
+            ok = astuple(obtido) == astuple(esperado)
+            falhas += not ok
+            print(f"{tamanho:>12,} | {lidas:>22,} | {ms_antigo:>11.1f} | {ms_novo:>12.1f} | {contador.total}"
+                  + ('' if ok else f'\n  <- {obtido} != {esperado}'))
+
+        if falhas:
+            sys.exit(1)
+        print("\nContagens do serviço iguais às do painel antigo, sem ler o histórico de entregas.")
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
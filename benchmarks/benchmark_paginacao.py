@@ -0,0 +1,108 @@
+"""
+Latência de uma página da gestão de serviços (/vendas/lista), da lista do
+financeiro e do histórico de estoque (/estoque/api/historico) no começo, no
+meio e no fim da listagem. Com a paginação por chave a página do fim custa o
+mesmo que a primeira; FALHA (código de saída 1) se ela ficar mais cara. Para
+comparação mostra também o que o OFFSET antigo custaria na mesma profundidade.
+
+    python -m benchmarks.benchmark_paginacao            # ~400 mil vendas
+    python -m benchmarks.benchmark_paginacao 100000
+"""
+import sys
+import time
+
+from flask import request
+from flask_login import login_user
+from sqlalchemy import and_, or_
+
+from benchmarks.comum import criar_app_benchmark, recriar_base, popular_vendas, medir_latencia
+from src.periodos import periodo_mes, hoje_brasilia
+
+# A página mais funda pode custar no máximo isso vezes a primeira (+ folga em ms para ruído)
+TOLERANCIA = 2.0
+FOLGA_MS = 5.0
+PROFUNDIDADES = [('início', 0.0), ('meio', 0.5), ('fim', 0.99)]
+
+
+def chamar(app, usuario, url):
+    with app.test_request_context(url):
+        login_user(usuario)
+        resposta = app.view_functions[request.endpoint](**request.view_args)
+        if not isinstance(resposta, str):
+            assert resposta.status_code == 200, url
+
+
+def medir_offset(consulta, ordem, deslocamento, por_pagina):
+    inicio = time.perf_counter()
+    consulta.order_by(*ordem).offset(deslocamento).limit(por_pagina).all()
+    return (time.perf_counter() - inicio) * 1000
+
+
+def main():
+    qtd_vendas = int(sys.argv[1]) if len(sys.argv) > 1 else 400_000
+    app = criar_app_benchmark()
+
+    with app.app_context():
+        from src.extensoes import banco_de_dados as db
+        from src.paginacao import codificar_cursor
+        from src.modulos.vendas.modelos import Venda
+        from src.modulos.financeiro.modelos import Despesa
+        from src.modulos.financeiro.rotas.painel import CHAVES_LISTA, _chave_despesa
+        from src.modulos.estoque.modelos import MovimentacaoEstoque
+
+        usuario = recriar_base()
+        popular_vendas(qtd_vendas * 2, usuario.id)
+
+        # Cada alvo: (url base, consulta na ordem da tela, ordem, chave da linha, tamanho da página)
+        vendas = Venda.query.filter(Venda.status != 'orcamento')
+        # Mês atual do financeiro: pagas no mês + todas as pendentes acumuladas até ele
+        mes = periodo_mes(hoje_brasilia().month, hoje_brasilia().year)
+        despesas = Despesa.query.filter(or_(
+            and_(Despesa.status == 'pago', mes.filtro(Despesa.data_pagamento)),
+            and_(Despesa.status == 'pendente', mes.antes_de(Despesa.data_vencimento))))
+        produto_id, _ = db.session.query(MovimentacaoEstoque.produto_id, db.func.count())\
+            .group_by(MovimentacaoEstoque.produto_id).order_by(db.func.count().desc()).first()
+        movimentacoes = MovimentacaoEstoque.query.filter_by(produto_id=produto_id)
+
+        alvos = {
+            'gestão de serviços': ('/vendas/lista?', vendas, [Venda.id.desc()], lambda v: [v.id], 10),
+            'financeiro (mês atual)': (
+                '/financeiro/?', despesas,
+                [coluna.asc() for coluna, _ in CHAVES_LISTA], _chave_despesa, 50),
+            'histórico de estoque': (
+                f'/estoque/api/historico/{produto_id}?', movimentacoes,
+                [MovimentacaoEstoque.data_movimentacao.desc(), MovimentacaoEstoque.id.desc()],
+                lambda m: [m.data_movimentacao, m.id], 50),
+        }
+
+        falhas = 0
+        for nome, (url, consulta, ordem, chave, por_pagina) in alvos.items():
+            total = consulta.order_by(None).count()
+            print(f"{nome} ({total:,} linhas)")
+            tempos = []
+            for rotulo, fracao in PROFUNDIDADES:
+                deslocamento = int(total * fracao)
+                alvo = url
+                if deslocamento:
+                    anterior = consulta.order_by(*ordem).offset(deslocamento - 1).first()
+                    alvo += f'depois={codificar_cursor(chave(anterior))}'
+                    db.session.rollback()
+                latencia = medir_latencia(lambda: chamar(app, usuario, alvo))
+                offset = medir_offset(consulta, ordem, deslocamento, por_pagina)
+                db.session.rollback()
+                tempos.append(latencia)
+                print(f"    {rotulo:7} (linha {deslocamento:>9,})  keyset {latencia:7.1f} ms   OFFSET equivalente {offset:7.1f} ms")
+
+            ok = tempos[-1] <= tempos[0] * TOLERANCIA + FOLGA_MS
+            print(f"[{'OK' if ok else 'FALHOU':6}] última página = {tempos[-1] / tempos[0]:.2f}x a primeira\n")
+            if not ok:
+                falhas += 1
+
+        if falhas:
+            print(f"{falhas} listagem(ns) com custo crescendo com a profundidade da página.")
+            sys.exit(1)
+        print('Latência das páginas constante em qualquer profundidade.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Mostra, via EXPLAIN ANALYZE, a diferença entre os filtros antigos
+(extract('month'/'year', coluna) / func.date(coluna)) e os intervalos
+semiabertos de src/periodos.py: só o segundo consegue usar índice B-tree.
+
+    python -m benchmarks.benchmark_periodos            # 100 mil pagamentos
+    python -m benchmarks.benchmark_periodos 1000000
+"""
+import sys
+import json
+
+from sqlalchemy import select, func, extract, text
+
+from benchmarks.comum import criar_app_benchmark, recriar_base, popular_vendas
+
+# Índices mínimos para a comparação (o banco de benchmark é descartável)
+INDICES = [
+    'CREATE INDEX IF NOT EXISTS bench_pagamentos_data ON pagamentos (data_pagamento)',
+    'CREATE INDEX IF NOT EXISTS bench_vendas_criado_em ON vendas (criado_em)',
+    'CREATE INDEX IF NOT EXISTS bench_despesas_vencimento ON despesas (data_vencimento)',
+]
+
+
+def _nos(plano):
+    """Lista os tipos de nó do plano (Seq Scan, Index Scan, Bitmap Heap Scan...) com a tabela"""
+    nos = []
+    pilha = [plano]
+    while pilha:
+        no = pilha.pop()
+        if 'Relation Name' in no:
+            nos.append(f"{no['Node Type']} em {no['Relation Name']}")
+        pilha.extend(no.get('Plans', []))
+    return nos
+
+
+def explicar(db, consulta):
+    sql = consulta.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    resultado = db.session.execute(text(f'EXPLAIN (ANALYZE, FORMAT JSON) {sql}')).scalar()
+    if isinstance(resultado, str):
+        resultado = json.loads(resultado)
+    return resultado[0]['Execution Time'], _nos(resultado[0]['Plan'])
+
+
+def main():
+    tamanho = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    app = criar_app_benchmark()
+
+    with app.app_context():
+        from src.extensoes import banco_de_dados as db
+        from src.modulos.vendas.modelos import Venda, Pagamento
+        from src.modulos.financeiro.modelos import Despesa
+        from src.periodos import periodo_mes, periodo_dia, hoje_brasilia
+
+        usuario = recriar_base()
+        popular_vendas(tamanho, usuario.id)
+        for ddl in INDICES:
+            db.session.execute(text(ddl))
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+
+        hoje = hoje_brasilia()
+        mes, ano = hoje.month, hoje.year
+        periodo = periodo_mes(mes, ano)
+
+        casos = [
+            ('Recebido no mês',
+             select(func.sum(Pagamento.valor)).where(extract('month', Pagamento.data_pagamento) == mes,
+                                                     extract('year', Pagamento.data_pagamento) == ano),
+             select(func.sum(Pagamento.valor)).where(periodo.filtro(Pagamento.data_pagamento))),
+            ('Recebido hoje',
+             select(func.sum(Pagamento.valor)).where(func.date(Pagamento.data_pagamento) == hoje),
+             select(func.sum(Pagamento.valor)).where(periodo_dia(hoje).filtro(Pagamento.data_pagamento))),
+            ('Vendas do mês',
+             select(func.count(Venda.id)).where(extract('month', Venda.criado_em) == mes,
+                                                extract('year', Venda.criado_em) == ano),
+             select(func.count(Venda.id)).where(periodo.filtro(Venda.criado_em))),
+            ('Despesas que vencem no mês',
+             select(func.sum(Despesa.valor)).where(extract('month', Despesa.data_vencimento) == mes,
+                                                   extract('year', Despesa.data_vencimento) == ano),
+             select(func.sum(Despesa.valor)).where(periodo.filtro(Despesa.data_vencimento))),
+        ]
+
+        print(f"{tamanho:,} pagamentos\n")
+        for nome, antiga, nova in casos:
+            t_antigo, nos_antigo = explicar(db, antiga)
+            t_novo, nos_novo = explicar(db, nova)
+            print(nome)
+            print(f"  extract/date : {t_antigo:8.2f} ms  {', '.join(nos_antigo)}")
+            print(f"  intervalo    : {t_novo:8.2f} ms  {', '.join(nos_novo)}")
+
+
+if __name__ == '__main__':
+    main()
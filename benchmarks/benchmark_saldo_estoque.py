@@ -0,0 +1,113 @@
+"""
+Benchmark dos fechamentos de estoque: tempo do "flask fechar-estoque" sobre o
+histórico, latência do saldo numa data (a partir do fechamento mais próximo)
+contra a soma de todo o histórico desde a data, e "flask conciliar-estoque".
+Também lança movimentações pelo razão e estorna uma de meses atrás (que já entrou
+em fechamentos) e a primeira de um produto ainda sem fechamento. FALHA (código de saída 1) se o saldo numa data divergir da soma do
+histórico, se a conciliação apontar divergência ou se a API de histórico fizer mais
+consultas com páginas maiores (usuário carregado por linha).
+
+    python -m benchmarks.benchmark_saldo_estoque            # ~300 mil movimentações
+    python -m benchmarks.benchmark_saldo_estoque 200000
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from benchmarks.comum import criar_app_benchmark, recriar_base, popular_vendas, medir_latencia
+from benchmarks.verificar_planos import capturar_consultas
+
+DIAS_ATRAS = [3, 20, 45, 100, 200, 390]
+
+
+def main():
+    tamanho = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    app = criar_app_benchmark()
+
+    with app.app_context():
+        from src.extensoes import banco_de_dados as db
+        from src.modulos.estoque.modelos import ProdutoEstoque, MovimentacaoEstoque, FechamentoEstoque
+        from src.modulos.estoque.servicos import (Movimento, movimentar, estornar, fechar_meses, saldo_em,
+                                                  conciliar, DELTA)
+
+        usuario = recriar_base()
+        # popular_vendas gera uma saída de estoque por item produzido, em 20 produtos
+        popular_vendas(tamanho, usuario.id)
+        total = MovimentacaoEstoque.query.count()
+
+        inicio = time.perf_counter()
+        fechados = fechar_meses()
+        segundos = time.perf_counter() - inicio
+        db.session.commit()
+        print(f"Base: {total:,} movimentações -> {len(fechados)} mês(es) fechados em {segundos:.1f} s\n")
+
+        falhas = 0
+
+        # Razão depois dos fechamentos: lançamentos novos e o estorno de uma baixa antiga
+        produto_id = db.session.query(MovimentacaoEstoque.produto_id).group_by(MovimentacaoEstoque.produto_id)\
+            .order_by(db.func.count().desc()).first()[0]
+        movimentar([Movimento(produto_id, 'entrada', Decimal('12.5'), 'benchmark', usuario_id=usuario.id),
+                    Movimento(produto_id, 'saida', Decimal('3.25'), 'benchmark', usuario_id=usuario.id)])
+        antiga = MovimentacaoEstoque.query.filter(
+            MovimentacaoEstoque.produto_id == produto_id,
+            MovimentacaoEstoque.data_movimentacao < datetime.utcnow() - timedelta(days=200)
+        ).first()
+        estornar(MovimentacaoEstoque.id == antiga.id)
+
+        # Produto sem fechamento cuja primeira movimentação (baixa de produção) é estornada,
+        # como em voltar_venda: o saldo_anterior da linha seguinte ainda conta com ela
+        novo = ProdutoEstoque(nome='Produto sem fechamento', quantidade_atual=Decimal('40'))
+        db.session.add(novo)
+        db.session.flush()
+        movimentar([Movimento(novo.id, 'saida', Decimal('7'), 'producao', usuario_id=usuario.id),
+                                  Movimento(novo.id, 'saida', Decimal('3'), 'benchmark', usuario_id=usuario.id)])
+        estornar(MovimentacaoEstoque.produto_id == novo.id, MovimentacaoEstoque.origem == 'producao')
+        db.session.commit()
+
+        def pela_soma(momento):
+            # Sem fechamento: saldo atual menos tudo o que aconteceu desde a data
+            atual = db.session.get(ProdutoEstoque, produto_id).quantidade_atual
+            depois = db.session.query(db.func.coalesce(db.func.sum(DELTA), 0)).filter(
+                MovimentacaoEstoque.produto_id == produto_id, MovimentacaoEstoque.data_movimentacao >= momento
+            ).scalar()
+            return atual - depois
+
+        print(f"{'data':10} | {'soma desde a data (ms)':>22} | {'fechamento (ms)':>15} | saldo")
+        print('-' * 70)
+        for dias in DIAS_ATRAS:
+            momento = datetime.utcnow() - timedelta(days=dias)
+            ms_soma = medir_latencia(lambda: pela_soma(momento))
+            ms_fechamento = medir_latencia(lambda: saldo_em(produto_id, momento))
+            esperado, obtido = pela_soma(momento), saldo_em(produto_id, momento)
+            ok = esperado == obtido
+            falhas += not ok
+            print(f"{momento:%d/%m/%Y} | {ms_soma:>22.1f} | {ms_fechamento:>15.1f} | {obtido}"
+                  + ('' if ok else f'  <- ESPERADO {esperado}'))
+
+        inicio = time.perf_counter()
+        divergencias = conciliar()
+        print(f"\nConciliação: {len(divergencias)} produto(s) com divergência "
+              f"em {(time.perf_counter() - inicio) * 1000:.0f} ms")
+        for divergencia in divergencias[:5]:
+            print(f"  {divergencia}")
+        falhas += bool(divergencias)
+
+        url = f'/estoque/api/historico/{produto_id}?por_pagina='
+        capturar_consultas(app, db, usuario, url + '10') # aquece caches do primeiro acesso
+        consultas = {n: len(capturar_consultas(app, db, usuario, f'{url}{n}'))
+                     for n in (10, 200)}
+        ok = len(set(consultas.values())) == 1
+        falhas += not ok
+        print(f"API de histórico: {consultas[10]} consultas com 10 linhas, {consultas[200]} com 200"
+              + ('' if ok else '  <- CRESCE COM A PÁGINA'))
+
+        fechamentos = FechamentoEstoque.query.count()
+        if falhas:
+            print(f"\n{falhas} verificação(ões) falharam.")
+            sys.exit(1)
+        print(f"\n{fechamentos:,} fechamentos; saldo numa data e conciliação conferem com o histórico.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark do status da venda a partir dos contadores de itens: para vendas de 10 a
+2.000 itens, compara o jeito antigo (carregar todos os itens irmãos a cada mudança de
+um item) com os contadores mantidos no flush, e conta os SELECTs de
+/operacional/item/<id>/avancar. FALHA (código de saída 1) se o número de consultas da
+rota mudar com o tamanho da venda ou se "flask recalcular-contadores-itens --verificar"
+apontar divergência no fim.
+
+    python -m benchmarks.benchmark_status_itens
+    python -m benchmarks.benchmark_status_itens 100000      # pagamentos da base de fundo
+"""
+import sys
+
+from sqlalchemy import insert
+
+from benchmarks.comum import criar_app_benchmark, recriar_base, popular_vendas, medir_latencia, ContadorConsultas
+from benchmarks.verificar_planos import capturar_consultas
+
+ITENS_POR_VENDA = [10, 100, 500, 2000]
+
+
+def main():
+    tamanho = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    app = criar_app_benchmark()
+
+    with app.app_context():
+        from src.extensoes import banco_de_dados as db
+        from src.modulos.vendas.modelos import Venda, ItemVenda
+        from src.modulos.vendas.servicos import recalcular_contadores_itens
+
+        usuario = recriar_base()
+        popular_vendas(tamanho, usuario.id)
+
+        # Itens gravados fora do ORM: os contadores saem do recálculo
+        vendas = {}
+        for qtd in ITENS_POR_VENDA:
+            venda = Venda(modo='multipla', tipo_cliente='PF', cliente_nome=f'Venda com {qtd} itens',
+                          cliente_contato='0000-0000', valor_base=qtd, valor_final=qtd, status='producao',
+                          vendedor_id=usuario.id)
+            db.session.add(venda)
+            db.session.flush()
+            db.session.execute(insert(ItemVenda), [
+                {'venda_id': venda.id, 'descricao': f'Peça {n}', 'quantidade': 1, 'valor_unitario': 1,
+                 'valor_total': 1, 'status': 'pendente' if n % 2 else 'producao'} for n in range(qtd)
+            ])
+            vendas[qtd] = venda.id
+        db.session.commit()
+        corrigidas = recalcular_contadores_itens()
+        print(f"Contadores preenchidos pelo recálculo em {len(corrigidas):,} venda(s)\n")
+
+        def item_pendente(venda_id):
+            return db.session.query(ItemVenda.id)\
+                .filter_by(venda_id=venda_id, status='pendente').order_by(ItemVenda.id).first()[0]
+
+        def pelos_itens(item_id):
+            item = db.session.get(ItemVenda, item_id)
+            item.status = 'producao'
+            db.session.flush()
+            return set(i.status for i in ItemVenda.query.filter_by(venda_id=item.venda_id).all())
+
+        def pelos_contadores(item_id):
+            item = db.session.get(ItemVenda, item_id)
+            item.status = 'producao'
+            db.session.flush()
+            return db.session.get(Venda, item.venda_id).status_itens
+
+        # Aquecimento: a 1ª requisição ainda carrega usuário/permissões fora do cache
+        capturar_consultas(app, db, usuario, f'/operacional/item/{item_pendente(vendas[ITENS_POR_VENDA[0]])}/avancar')
+
+        contador = ContadorConsultas()
+        rota = {}
+        print(f"{'itens':>6} | {'carregando itens (ms)':>21} | {'contadores (ms)':>15} | SQL antigo | SQL novo | SELECTs da rota")
+        print('-' * 95)
+        for qtd, venda_id in vendas.items():
+            item_id = item_pendente(venda_id)
+            ms_itens = medir_latencia(lambda: pelos_itens(item_id))
+            ms_contadores = medir_latencia(lambda: pelos_contadores(item_id))
+            with contador.medir():
+                antigo = pelos_itens(item_id)
+            sql_antigo = contador.total
+            db.session.rollback()
+            with contador.medir():
+                novo = pelos_contadores(item_id)
+            sql_novo = contador.total
+            db.session.rollback()
+
+            rota[qtd] = len(capturar_consultas(app, db, usuario, f'/operacional/item/{item_id}/avancar'))
+            print(f"{qtd:>6} | {ms_itens:>21.1f} | {ms_contadores:>15.1f} | {sql_antigo:>10} | {sql_novo:>8} | {rota[qtd]}"
+                  + ('' if antigo == novo else f'  <- STATUS {sorted(novo)} != {sorted(antigo)}'))
+
+        falhas = 0
+        if len(set(rota.values())) != 1:
+            falhas += 1
+            print("\nO número de consultas da rota cresce com o tamanho da venda.")
+
+        divergencias = recalcular_contadores_itens(apenas_verificar=True)
+        if divergencias:
+            falhas += 1
+            print(f"\n{len(divergencias)} venda(s) com contadores divergentes dos itens:")
+            for venda_id, colunas in divergencias[:5]:
+                print(f"  Venda #{venda_id}: {colunas}")
+
+        if falhas:
+            sys.exit(1)
+        print("\nStatus da venda pelos contadores, com número fixo de consultas; contadores conferem com os itens.")
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,86 @@
+"""
+Garante que os bytes de fotos e documentos só saem do banco nas rotas que
+servem o arquivo (imagem_db, visualizar_documento_rh, baixar_documento_rh).
+Abre as telas que listam fotos/documentos, captura os SELECTs e FALHA
+(código de saída 1) se algum deles trouxer uma coluna binária.
+
+    python -m benchmarks.verificar_colunas_binarias
+"""
+import re
+import sys
+
+from sqlalchemy import text
+
+from benchmarks.comum import criar_app_benchmark, recriar_base, popular_vendas
+from benchmarks.verificar_planos import capturar_consultas
+
+COLUNA_BINARIA = re.compile(r'\bdados_binarios\b')
+FOTOS_POR_ITEM = 3
+ITENS_COM_FOTO = 50
+
+
+def popular_arquivos(usuario):
+    """Fotos legadas (ainda em BLOB) nos primeiros itens e um documento de RH"""
+    from src.extensoes import banco_de_dados as db
+
+    db.session.execute(text("""
+        INSERT INTO fotos_itens_venda (item_venda_id, nome_arquivo, tipo_mime, dados_binarios, etapa, data_upload, enviado_por_id)
+        SELECT i.id, 'foto.jpg', 'image/jpeg', decode(repeat('ff', 100000), 'hex'), 'recebimento', now(), :usuario
+          FROM (SELECT id FROM venda_itens ORDER BY id LIMIT :itens) i
+         CROSS JOIN generate_series(1, :fotos)
+    """), {'usuario': usuario.id, 'itens': ITENS_COM_FOTO, 'fotos': FOTOS_POR_ITEM})
+    db.session.execute(text("""
+        INSERT INTO documentos_colaboradores (colaborador_id, nome_original, tipo_arquivo, tamanho_kb, dados_binarios, criado_em, enviado_por_id)
+        VALUES (:colaborador, 'atestado.pdf', 'pdf', 100, decode(repeat('ff', 100000), 'hex'), now(), :usuario)
+    """), {'colaborador': usuario.colaborador_id, 'usuario': usuario.id})
+    db.session.commit()
+
+
+def main():
+    app = criar_app_benchmark()
+
+    with app.app_context():
+        from src.extensoes import banco_de_dados as db
+
+        usuario = recriar_base()
+        popular_vendas(2_000, usuario.id)
+        popular_arquivos(usuario)
+
+        venda_id, foto_id = db.session.execute(text("""
+            SELECT i.venda_id, f.id FROM fotos_itens_venda f JOIN venda_itens i ON i.id = f.item_venda_id
+             ORDER BY f.id LIMIT 1
+        """)).one()
+        doc_id = db.session.execute(text('SELECT id FROM documentos_colaboradores LIMIT 1')).scalar()
+        colaborador_id = usuario.colaborador_id
+
+        # (url, deve ler os bytes?)
+        telas = [
+            ('/operacional/painel', False),
+            (f'/vendas/api/servico/{venda_id}/detalhes', False),
+            ('/vendas/lista', False),
+            (f'/rh/perfil/{colaborador_id}', False),
+            (f'/rh/documentos/{colaborador_id}', False),
+            (f'/vendas/imagem/{foto_id}', True),
+            (f'/rh/documentos/visualizar/{doc_id}', True),
+            (f'/rh/documentos/baixar/{doc_id}', True),
+        ]
+
+        falhas = 0
+        for url, le_bytes in telas:
+            consultas = capturar_consultas(app, db, usuario, url)
+            com_binario = [s for s, _ in consultas if COLUNA_BINARIA.search(s)]
+            ok = bool(com_binario) == le_bytes
+            print(f"[{'OK' if ok else 'FALHOU':6}] {url}  ({len(consultas)} consultas, {len(com_binario)} com coluna binária)")
+            if not ok:
+                falhas += 1
+                for statement in com_binario[:3]:
+                    print(f"         {' '.join(statement.split())[:300]}")
+
+        if falhas:
+            print(f"\n{falhas} rota(s) lendo (ou deixando de ler) colunas binárias indevidamente.")
+            sys.exit(1)
+        print('\nBytes de fotos/documentos só são lidos nas rotas que servem o arquivo.')
+
+
+if __name__ == '__main__':
+    main()
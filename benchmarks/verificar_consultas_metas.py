@@ -0,0 +1,77 @@
+"""
+Garante que o painel de metas (/metas/) usa um número fixo de consultas: monta
+equipes de 1, 5 e 30 vendedores, todos com vendas recebidas no mês, e FALHA (código de saída 1) se o número de SELECTs da
+tela for diferente de CONSULTAS_ESPERADAS em algum tamanho de equipe — sinal de
+consulta por vendedor ou por dia do calendário.
+
+    python -m benchmarks.verificar_consultas_metas
+"""
+import sys
+
+from sqlalchemy import text
+
+from benchmarks.comum import criar_app_benchmark, recriar_base, popular_vendas
+from benchmarks.verificar_planos import capturar_consultas
+from src.periodos import hoje_brasilia
+
+# Meta do mês, recebimentos agrupados por vendedor e dia (ranking e calendário), metas por
+# vendedor com os nomes, mais 4 do usuário logado (colaborador, cargo e módulos do menu)
+CONSULTAS_ESPERADAS = 7
+EQUIPES = [1, 5, 30]
+
+
+def main():
+    app = criar_app_benchmark()
+
+    with app.app_context():
+        from src.extensoes import banco_de_dados as db
+        from src.modulos.autenticacao.modelos import Usuario
+        from src.modulos.metas.modelos import MetaMensal, MetaVendedor
+        from src.modulos.rh.modelos import Colaborador
+
+        hoje = hoje_brasilia()
+        usuario = recriar_base()
+        popular_vendas(20_000, usuario.id, dias=60)
+
+        vendedores = [usuario]
+        for n in range(1, max(EQUIPES)):
+            colaborador = Colaborador(nome_completo=f'Vendedor {n}', cpf=f'{n:011d}', data_admissao=hoje,
+                                      cargo_id=usuario.colaborador.cargo_id)
+            db.session.add(colaborador)
+            db.session.flush()
+            vendedor = Usuario(usuario=f'vendedor{n}', colaborador_id=colaborador.id)
+            vendedor.definir_senha('benchmark')
+            db.session.add(vendedor)
+            vendedores.append(vendedor)
+
+        meta = MetaMensal(mes=hoje.month, ano=hoje.year, valor_loja=100000, dias_uteis=22, config_semana='0,1,2,3,4,5')
+        db.session.add(meta)
+        db.session.commit()
+
+        # Aquecimento: a 1ª requisição ainda carrega usuário/permissões fora do cache
+        capturar_consultas(app, db, usuario, '/metas/')
+
+        falhas = 0
+        for tamanho in EQUIPES:
+            equipe = vendedores[:tamanho]
+            MetaVendedor.query.filter_by(meta_mensal_id=meta.id).delete()
+            db.session.add_all(MetaVendedor(meta_mensal_id=meta.id, usuario_id=v.id, valor_meta=100000 / tamanho)
+                               for v in equipe)
+            # As vendas da base se dividem entre a equipe: todo vendedor tem recebimentos no mês
+            db.session.execute(text('UPDATE vendas SET vendedor_id = (:ids)[1 + id % :qtd]'),
+                               {'ids': [v.id for v in equipe], 'qtd': tamanho})
+            db.session.commit()
+
+            consultas = capturar_consultas(app, db, usuario, '/metas/')
+            ok = len(consultas) == CONSULTAS_ESPERADAS
+            falhas += not ok
+            print(f"[{'OK' if ok else 'FALHOU':6}] equipe de {tamanho:>2} vendedor(es): {len(consultas)} consultas")
+
+        if falhas:
+            print(f'\nO painel de metas deveria fazer {CONSULTAS_ESPERADAS} consultas em qualquer tamanho de equipe.')
+            sys.exit(1)
+        print(f'\nPainel de metas com {CONSULTAS_ESPERADAS} consultas, qualquer que seja o tamanho da equipe.')
+
+
+if __name__ == '__main__':
+    main()
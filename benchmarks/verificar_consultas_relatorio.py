@@ -0,0 +1,75 @@
+"""
+Garante que o relatório de serviços (tela e /relatorios/api/servicos) usa um
+plano fixo de consultas: abre os dois com recortes de tamanhos bem diferentes
+(um dia, um mês, a base inteira) e FALHA (código de saída 1) se o número de
+SELECTs mudar com o número de itens — sinal de lazy load por linha.
+
+    python -m benchmarks.verificar_consultas_relatorio
+"""
+import sys
+from datetime import timedelta
+
+from flask import template_rendered
+
+from benchmarks.comum import criar_app_benchmark, recriar_base, popular_vendas
+from benchmarks.verificar_planos import capturar_consultas
+from src.periodos import hoje_brasilia
+
+DIAS = 400
+
+
+def main():
+    app = criar_app_benchmark()
+
+    with app.app_context():
+        from src.extensoes import banco_de_dados as db
+
+        usuario = recriar_base()
+        popular_vendas(20_000, usuario.id, dias=DIAS)
+
+        hoje = hoje_brasilia()
+        recortes = {
+            'um dia': (hoje - timedelta(days=3), hoje - timedelta(days=3)),
+            'um mês': (hoje - timedelta(days=30), hoje),
+            'base inteira': (hoje - timedelta(days=DIAS + 30), hoje + timedelta(days=30)),
+        }
+
+        itens = []
+
+        def anotar_itens(sender, template, context, **extra):
+            itens.append(context['qtd_itens'])
+
+        template_rendered.connect(anotar_itens, app)
+        # Aquecimento: a 1ª requisição ainda carrega usuário/permissões fora do cache
+        capturar_consultas(app, db, usuario, '/relatorios/servicos')
+
+        alvos = {
+            'tela': '/relatorios/servicos?',
+            'api (itens)': '/relatorios/api/servicos?detalhe=item&por_pagina=100&',
+            'api (vendas)': '/relatorios/api/servicos?detalhe=venda&por_pagina=100&',
+        }
+
+        falhas = 0
+        for tipo_data in ['criacao', 'recebimento']:
+            for alvo, prefixo in alvos.items():
+                contagens = {}
+                for nome, (inicio, fim) in recortes.items():
+                    filtro = f'tipo_periodo=periodo&data_inicio={inicio}&data_fim={fim}&tipo_data_filtro={tipo_data}'
+                    capturar_consultas(app, db, usuario, f'/relatorios/servicos?{filtro}') # só para saber o nº de itens
+                    consultas = capturar_consultas(app, db, usuario, prefixo + filtro)
+                    contagens[nome] = (len(consultas), itens[-1])
+
+                ok = len({qtd for qtd, _ in contagens.values()}) == 1
+                detalhes = ', '.join(f'{nome} ({qtd_itens} itens): {qtd}' for nome, (qtd, qtd_itens) in contagens.items())
+                print(f"[{'OK' if ok else 'FALHOU':6}] {alvo:12} por {tipo_data:11} consultas -> {detalhes}")
+                if not ok:
+                    falhas += 1
+
+        if falhas:
+            print('\nO número de consultas do relatório cresce com o número de itens.')
+            sys.exit(1)
+        print('\nRelatório de serviços com número fixo de consultas, qualquer que seja o recorte.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Teste de estresse do razão de estoque (src/modulos/estoque/servicos.py): várias
+threads, cada uma com sua sessão, lançam entradas e saídas nos mesmos produtos
+ao mesmo tempo e depois disputam os mesmos estornos. FALHA (código de saída 1) se:
+
+- algum saldo final diferir de saldo inicial + soma das movimentações gravadas
+  (atualização perdida ou estorno aplicado duas vezes);
+- o histórico de um produto não formar uma sequência (o saldo_anterior de cada
+  movimentação tem que ser o saldo_novo de outra, ou o saldo inicial);
+- alguma transação falhar (deadlock, por exemplo).
+
+Para comparação, roda a mesma carga com o read-modify-write antigo
+(produto.quantidade_atual += qtd) e mostra quantas atualizações ele perde.
+
+    python -m benchmarks.verificar_estoque_concorrente
+    python -m benchmarks.verificar_estoque_concorrente 16 200    # threads, transações por thread
+"""
+import sys
+import random
+import threading
+from collections import Counter
+from decimal import Decimal
+
+from benchmarks.comum import criar_app_benchmark, recriar_base
+
+PRODUTOS = 4
+SALDO_INICIAL = Decimal('100000.000')
+
+
+def _carga(semente, transacoes):
+    """Lista fixa de transações: cada uma com 1 a 3 movimentos em produtos sorteados"""
+    sorteio = random.Random(semente)
+    return [[(sorteio.randrange(PRODUTOS), sorteio.choice(['entrada', 'saida']),
+              Decimal(sorteio.randint(1, 5000)) / 1000) for _ in range(sorteio.randint(1, 3))]
+            for _ in range(transacoes)]
+
+
+def _rodar_em_threads(app, qtd_threads, trabalho):
+    erros = []
+    barreira = threading.Barrier(qtd_threads)
+
+    def executar(indice):
+        with app.app_context():
+            from src.extensoes import banco_de_dados as db
+            barreira.wait() # todas começam juntas
+            try:
+                trabalho(indice, db)
+            except Exception as erro:
+                db.session.rollback()
+                erros.append(f"thread {indice}: {erro.__class__.__name__}: {str(erro).splitlines()[0]}")
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=executar, args=(i,)) for i in range(qtd_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return erros
+
+
+def main():
+    qtd_threads = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    transacoes = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    app = criar_app_benchmark()
+
+    with app.app_context():
+        from src.extensoes import banco_de_dados as db
+        from src.modulos.estoque.modelos import ProdutoEstoque, MovimentacaoEstoque
+        from src.modulos.estoque.servicos import Movimento, movimentar, estornar, SINAL
+
+        usuario = recriar_base()
+        usuario_id = usuario.id
+
+        def preparar():
+            MovimentacaoEstoque.query.delete()
+            ProdutoEstoque.query.delete()
+            produtos = [ProdutoEstoque(nome=f'Produto {i}', quantidade_atual=SALDO_INICIAL) for i in range(PRODUTOS)]
+            db.session.add_all(produtos)
+            db.session.commit()
+            return [p.id for p in produtos]
+
+        def conferir(ids, verificar_sequencia):
+            db.session.expire_all()
+            problemas = []
+            for produto_id in ids:
+                saldo = db.session.get(ProdutoEstoque, produto_id).quantidade_atual
+                movimentos = MovimentacaoEstoque.query.filter_by(produto_id=produto_id).all()
+                esperado = SALDO_INICIAL + sum(SINAL[m.tipo] * m.quantidade for m in movimentos)
+                if saldo != esperado:
+                    problemas.append(f"produto {produto_id}: saldo {saldo} mas as movimentações somam {esperado}")
+                if verificar_sequencia:
+                    # Cada saldo_anterior consome um saldo já existente (o inicial ou o saldo_novo de outra)
+                    disponiveis = Counter([SALDO_INICIAL] + [m.saldo_novo for m in movimentos])
+                    disponiveis.subtract([saldo])
+                    if disponiveis != Counter(m.saldo_anterior for m in movimentos):
+                        problemas.append(f"produto {produto_id}: saldo_anterior/saldo_novo não formam uma sequência")
+                    if any(m.saldo_novo != m.saldo_anterior + SINAL[m.tipo] * m.quantidade for m in movimentos):
+                        problemas.append(f"produto {produto_id}: saldo_novo diferente de saldo_anterior ± quantidade")
+            return problemas
+
+        cargas = [_carga(i, transacoes) for i in range(qtd_threads)]
+        total_movimentos = sum(len(t) for carga in cargas for t in carga)
+        print(f"{qtd_threads} threads x {transacoes} transações ({total_movimentos:,} movimentos) "
+              f"em {PRODUTOS} produtos\n")
+
+        # --- 1. Read-modify-write antigo, só para comparação ---
+        ids = preparar()
+
+        def antigo(indice, db):
+            for transacao in cargas[indice]:
+                for posicao, tipo, qtd in transacao:
+                    produto = db.session.get(ProdutoEstoque, ids[posicao])
+                    saldo_ant = produto.quantidade_atual
+                    produto.quantidade_atual += SINAL[tipo] * qtd
+                    db.session.add(MovimentacaoEstoque(produto_id=produto.id, tipo=tipo, quantidade=qtd,
+                                                       saldo_anterior=saldo_ant, saldo_novo=produto.quantidade_atual,
+                                                       origem='benchmark', usuario_id=usuario_id))
+                db.session.commit()
+
+        erros = _rodar_em_threads(app, qtd_threads, antigo)
+        perdidos = conferir(ids, verificar_sequencia=False)
+        print(f"[antigo] read-modify-write: {len(perdidos)} produto(s) com saldo errado, {len(erros)} erro(s)")
+
+        # --- 2. Razão de estoque ---
+        ids = preparar()
+
+        def com_razao(indice, db):
+            for numero, transacao in enumerate(cargas[indice]):
+                movimentar(Movimento(produto_id=ids[posicao], tipo=tipo, quantidade=qtd, origem='benchmark',
+                                     referencia_id=numero, usuario_id=usuario_id)
+                           for posicao, tipo, qtd in transacao)
+                db.session.commit()
+
+        falhas = []
+        erros = _rodar_em_threads(app, qtd_threads, com_razao)
+        problemas = conferir(ids, verificar_sequencia=True)
+        gravados = MovimentacaoEstoque.query.count()
+        if gravados != total_movimentos:
+            problemas.append(f"{gravados:,} movimentações gravadas de {total_movimentos:,}")
+        print(f"[{'OK' if not (erros or problemas) else 'FALHOU':6}] movimentar: {gravados:,} movimentações, "
+              f"{len(problemas)} problema(s), {len(erros)} erro(s)")
+        falhas += erros + problemas
+
+        # --- 3. Estornos disputados: todas as threads tentam desfazer a 1ª metade das referências ---
+        referencias = list(range(transacoes // 2))
+
+        def disputar_estornos(indice, db):
+            ordem = referencias[:]
+            random.Random(indice).shuffle(ordem)
+            for referencia in ordem:
+                estornar(MovimentacaoEstoque.referencia_id == referencia)
+                db.session.commit()
+
+        erros = _rodar_em_threads(app, qtd_threads, disputar_estornos)
+        problemas = conferir(ids, verificar_sequencia=False)
+        restantes = MovimentacaoEstoque.query.count()
+        print(f"[{'OK' if not (erros or problemas) else 'FALHOU':6}] estornar: {gravados - restantes:,} movimentações "
+              f"desfeitas, {len(problemas)} problema(s), {len(erros)} erro(s)")
+        falhas += erros + problemas
+
+        if falhas:
+            print()
+            for falha in falhas[:20]:
+                print(f"  {falha}")
+            sys.exit(1)
+        print('\nNenhuma atualização de estoque perdida ou duplicada sob concorrência.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Regressão de planos de consulta: abre as telas principais num banco populado,
+captura todo SELECT que elas disparam, roda EXPLAIN ANALYZE em cada um e
+FALHA (código de saída 1) se aparecer Seq Scan seletivo numa tabela grande —
+isto é, uma varredura completa que descarta a maior parte das linhas e
+portanto deveria ter usado índice. Varreduras que aproveitam quase tudo
+(ex.: somar a tabela inteira) são legítimas e não contam.
+
+    python -m benchmarks.verificar_planos            # 100 mil pagamentos
+    python -m benchmarks.verificar_planos 500000
+"""
+import sys
+import json
+
+from flask import request
+from flask_login import login_user
+from sqlalchemy import event, text
+
+from benchmarks.comum import criar_app_benchmark, recriar_base, popular_vendas
+
+TABELAS_GRANDES = {'vendas', 'pagamentos', 'venda_itens', 'despesas', 'movimentacoes_estoque'}
+LIMITE_LINHAS = 10_000      # abaixo disso o Seq Scan costuma ser o plano certo
+FRACAO_SELETIVA = 0.10      # Seq Scan que aproveita menos que isso das linhas é suspeito
+
+
+def telas(hoje):
+    return [
+        '/dashboard/',
+        '/vendas/lista',
+        '/vendas/lista?status=pendente',
+        f'/vendas/lista?data={hoje.isoformat()}',
+        '/metas/',
+        '/financeiro/',
+        '/relatorios/servicos',
+        '/relatorios/api/servicos',
+        '/relatorios/api/servicos?detalhe=venda',
+        '/relatorios/consumo-materiais',
+        '/estoque/',
+        '/estoque/api/historico/1',
+        '/operacional/painel',
+    ]
+
+
+def capturar_consultas(app, db, usuario, url):
+    """Executa a view da URL (sem os before_request de licença) e devolve os SELECTs emitidos"""
+    capturadas = []
+
+    def ouvir(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            capturadas.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', ouvir)
+    try:
+        with app.test_request_context(url):
+            login_user(usuario)
+            app.view_functions[request.endpoint](**(request.view_args or {}))
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', ouvir)
+        db.session.rollback()
+    return capturadas
+
+
+def varreduras_seletivas(plano, tamanhos):
+    problemas = []
+    pilha = [plano]
+    while pilha:
+        no = pilha.pop()
+        pilha.extend(no.get('Plans', []))
+        tabela = no.get('Relation Name')
+        if no.get('Node Type') != 'Seq Scan' or tabela not in TABELAS_GRANDES:
+            continue
+        if tamanhos.get(tabela, 0) < LIMITE_LINHAS:
+            continue
+        lidas = no.get('Actual Rows', 0) + no.get('Rows Removed by Filter', 0)
+        if lidas and no.get('Actual Rows', 0) / lidas < FRACAO_SELETIVA:
+            problemas.append(f"Seq Scan em {tabela}: {no.get('Actual Rows', 0):,} de {lidas:,} linhas ({no.get('Filter', 'sem filtro')})")
+    return problemas
+
+
+def main():
+    tamanho = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    app = criar_app_benchmark()
+
+    with app.app_context():
+        from src.extensoes import banco_de_dados as db
+        from src.modulos.metas.modelos import MetaMensal, MetaVendedor
+        from src.periodos import hoje_brasilia
+
+        hoje = hoje_brasilia()
+        usuario = recriar_base()
+        popular_vendas(tamanho, usuario.id)
+        meta = MetaMensal(mes=hoje.month, ano=hoje.year, valor_loja=100000, dias_uteis=22, config_semana='0,1,2,3,4,5')
+        db.session.add(meta)
+        db.session.flush()
+        db.session.add(MetaVendedor(meta_mensal_id=meta.id, usuario_id=usuario.id, valor_meta=50000))
+        db.session.commit()
+
+        tamanhos = {t: db.session.execute(text(f'SELECT count(*) FROM {t}')).scalar() for t in TABELAS_GRANDES}
+        print('Linhas: ' + ', '.join(f'{t}={n:,}' for t, n in sorted(tamanhos.items())))
+
+        falhas = 0
+        for url in telas(hoje):
+            consultas = capturar_consultas(app, db, usuario, url)
+
+            # A mesma consulta repetida (N+1) só precisa ser explicada uma vez
+            vistas = {}
+            for statement, parametros in consultas:
+                vistas.setdefault(statement, parametros)
+
+            problemas = []
+            for statement, parametros in vistas.items():
+                resultado = db.session.connection().exec_driver_sql(
+                    'EXPLAIN (ANALYZE, FORMAT JSON) ' + statement, parametros
+                ).scalar()
+                if isinstance(resultado, str):
+                    resultado = json.loads(resultado)
+                for problema in varreduras_seletivas(resultado[0]['Plan'], tamanhos):
+                    problemas.append((problema, statement))
+            db.session.rollback()
+
+            situacao = 'OK' if not problemas else 'FALHOU'
+            print(f"[{situacao:6}] {url}  ({len(consultas)} consultas, {len(vistas)} distintas)")
+            for problema, statement in problemas:
+                print(f"         {problema}")
+                print(f"         {' '.join(statement.split())[:300]}")
+            falhas += len(problemas)
+
+        if falhas:
+            print(f"\n{falhas} varredura(s) sequencial(is) seletiva(s) em tabela grande.")
+            sys.exit(1)
+        print('\nNenhuma varredura sequencial seletiva em tabela grande.')
+
+
+if __name__ == '__main__':
+    main()
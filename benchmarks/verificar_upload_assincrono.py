@@ -0,0 +1,78 @@
+"""
+Garante que o upload de foto devolve a thread do waitress antes do processamento
+das versões: ocupa todas as threads do processador de mídia, envia uma foto
+grande e confere que a resposta saiu com a foto ainda 'pendente'. Depois libera
+o pool e confere que ela fica 'pronto'. FALHA (código de saída 1) se a
+requisição tiver esperado o processamento.
+
+    python -m benchmarks.verificar_upload_assincrono
+"""
+import sys
+import time
+import threading
+from io import BytesIO
+
+from flask import request
+from flask_login import login_user
+from PIL import Image
+
+from benchmarks.comum import criar_app_benchmark, recriar_base, popular_vendas
+
+
+def foto_de_celular(largura=4000, altura=3000):
+    """JPEG de ~12 MP (ruído não comprime: pior caso para o processamento)"""
+    saida = BytesIO()
+    Image.effect_noise((largura, altura), 60).convert('RGB').save(saida, 'JPEG', quality=92)
+    return saida.getvalue()
+
+
+def main():
+    app = criar_app_benchmark()
+
+    with app.app_context():
+        from src.extensoes import banco_de_dados as db, processador_midia
+        from src.modulos.vendas.modelos import ItemVenda, FotoItemVenda
+
+        usuario = recriar_base()
+        popular_vendas(200, usuario.id)
+        item_id = db.session.query(ItemVenda.id).order_by(ItemVenda.id).first()[0]
+        conteudo = foto_de_celular()
+        print(f"Foto enviada: {len(conteudo) / 1024 / 1024:.1f} MB")
+
+        if processador_midia.sincrono:
+            sys.exit("MIDIA_PROCESSAMENTO está 'sincrono'; nada a verificar.")
+
+        # Segura todas as threads do pool: nada é processado até liberar
+        liberar = threading.Event()
+        for _ in range(processador_midia.qtd_threads):
+            processador_midia.enviar(liberar.wait)
+
+        url = f'/vendas/itens/{item_id}/upload-foto'
+        dados = {'foto': (BytesIO(conteudo), 'celular.jpg', 'image/jpeg')}
+        inicio = time.perf_counter()
+        with app.test_request_context(url, method='POST', data=dados, content_type='multipart/form-data'):
+            login_user(usuario)
+            resposta = app.view_functions[request.endpoint](**request.view_args)
+        tempo_requisicao = (time.perf_counter() - inicio) * 1000
+
+        foto_id = int(resposta.get_json()['url'].rsplit('/', 1)[1])
+        status_na_resposta = db.session.get(FotoItemVenda, foto_id).status_midia
+        db.session.rollback()
+
+        inicio = time.perf_counter()
+        liberar.set()
+        processador_midia.aguardar()
+        tempo_processamento = (time.perf_counter() - inicio) * 1000
+        status_final = db.session.get(FotoItemVenda, foto_id).status_midia
+
+        print(f"Requisição:     {tempo_requisicao:8.1f} ms  (status na resposta: {status_na_resposta})")
+        print(f"Processamento:  {tempo_processamento:8.1f} ms  (status final: {status_final})")
+
+        if status_na_resposta != 'pendente' or status_final != 'pronto':
+            print('\nFALHOU: a requisição não foi liberada antes do processamento.')
+            sys.exit(1)
+        print('\nUpload respondeu antes do processamento, que terminou em segundo plano.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+"""Índices parciais de entregas e cancelamentos por data (contadores da fila de produção)
+
+Revision ID: 0d6b3e8f2a71
+Revises: f7a2d4c81b93
+Create Date: 2026-10-19 10:17:52.640183
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0d6b3e8f2a71'
+down_revision = 'f7a2d4c81b93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_venda_itens_entregues', 'venda_itens', ['data_entregue'], unique=False,
+                    postgresql_where=sa.text("status = 'entregue'"))
+    op.create_index('ix_vendas_entregues', 'vendas', ['data_entrega'], unique=False,
+                    postgresql_where=sa.text("status = 'entregue'"))
+    op.create_index('ix_vendas_canceladas', 'vendas', ['data_cancelamento'], unique=False,
+                    postgresql_where=sa.text("status = 'cancelado'"))
+
+
+def downgrade():
+    op.drop_index('ix_vendas_canceladas', table_name='vendas', postgresql_where=sa.text("status = 'cancelado'"))
+    op.drop_index('ix_vendas_entregues', table_name='vendas', postgresql_where=sa.text("status = 'entregue'"))
+    op.drop_index('ix_venda_itens_entregues', table_name='venda_itens', postgresql_where=sa.text("status = 'entregue'"))
\ No newline at end of file
@@ -0,0 +1,44 @@
+"""Totais materializados (valor_pago/valor_restante) em vendas
+
+Revision ID: 5b7e2c91d4a3
+Revises: e2cdb495a034
+Create Date: 2026-10-18 09:12:41.308512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e2c91d4a3'
+down_revision = 'e2cdb495a034'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('vendas', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('valor_pago', sa.Numeric(precision=10, scale=2), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('valor_restante', sa.Numeric(precision=10, scale=2), server_default='0', nullable=False))
+
+    # Backfill a partir dos pagamentos já existentes
+    op.execute("""
+        UPDATE vendas v
+           SET valor_pago = COALESCE(p.pago, 0),
+               valor_restante = GREATEST(v.valor_final - COALESCE(p.pago, 0), 0)
+          FROM vendas v2
+          LEFT JOIN (SELECT venda_id, SUM(valor) AS pago FROM pagamentos GROUP BY venda_id) p
+                 ON p.venda_id = v2.id
+         WHERE v2.id = v.id
+    """)
+
+    op.create_index('ix_vendas_em_aberto', 'vendas', ['status', 'valor_restante'], unique=False,
+                    postgresql_where=sa.text('valor_restante > 0'))
+
+
+def downgrade():
+    op.drop_index('ix_vendas_em_aberto', table_name='vendas', postgresql_where=sa.text('valor_restante > 0'))
+
+    with op.batch_alter_table('vendas', schema=None) as batch_op:
+        batch_op.drop_column('valor_restante')
+        batch_op.drop_column('valor_pago')
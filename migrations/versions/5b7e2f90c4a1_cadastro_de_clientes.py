@@ -0,0 +1,102 @@
+"""Cadastro de clientes deduplicado (clientes, clientes_palavras e vendas.cliente_id)
+
+Revision ID: 5b7e2f90c4a1
+Revises: a8f3c61d27e4
+Create Date: 2026-10-18 21:14:37.502913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e2f90c4a1'
+down_revision = 'a8f3c61d27e4'
+branch_labels = None
+depends_on = None
+
+# Mesmas normalizações de src/modulos/vendas/servicos.py (normalizar_nome_cliente / normalizar_documento)
+ACENTOS = 'ÁÀÂÃÄÉÈÊËÍÌÎÏÓÒÔÕÖÚÙÛÜÇÑáàâãäéèêëíìîïóòôõöúùûüçñ'
+SEM_ACENTOS = 'AAAAAEEEEIIIIOOOOOUUUUCNaaaaaeeeeiiiiooooouuuucn'
+NOME = f"left(regexp_replace(btrim(lower(translate(cliente_nome, '{ACENTOS}', '{SEM_ACENTOS}'))), '\\s+', ' ', 'g'), 150)"
+DOCUMENTO = "nullif(left(regexp_replace(coalesce(cliente_documento, ''), '[^0-9]', '', 'g'), 20), '')"
+
+
+def _ultimo(coluna):
+    # Valor mais recente não vazio do grupo
+    return f"(array_agg({coluna} ORDER BY criado_em DESC, id DESC) FILTER (WHERE coalesce({coluna}, '') <> ''))[1]"
+
+
+def upgrade():
+    op.create_table('clientes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tipo', sa.String(length=2), nullable=False),
+        sa.Column('nome', sa.String(length=150), nullable=False),
+        sa.Column('nome_normalizado', sa.String(length=150, collation='C'), nullable=False),
+        sa.Column('documento', sa.String(length=20, collation='C'), nullable=True),
+        sa.Column('solicitante', sa.String(length=100), nullable=True),
+        sa.Column('contato', sa.String(length=50), nullable=True),
+        sa.Column('email', sa.String(length=100), nullable=True),
+        sa.Column('endereco', sa.String(length=255), nullable=True),
+        sa.Column('criado_em', sa.DateTime(), nullable=True),
+        sa.Column('atualizado_em', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('clientes_palavras',
+        sa.Column('palavra', sa.String(length=150, collation='C'), nullable=False),
+        sa.Column('cliente_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['cliente_id'], ['clientes.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('palavra', 'cliente_id')
+    )
+    with op.batch_alter_table('vendas', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('cliente_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('vendas_cliente_id_fkey', 'clientes', ['cliente_id'], ['id'])
+
+    # Um cliente por documento (ou, sem documento, por nome normalizado) de todo o histórico
+    op.execute(f"""
+        INSERT INTO clientes (tipo, nome, nome_normalizado, documento, solicitante, contato, email,
+                              endereco, criado_em, atualizado_em)
+        SELECT {_ultimo('tipo_cliente')}, {_ultimo('btrim(cliente_nome)')}, {_ultimo('nome_normalizado')}, documento,
+               {_ultimo('cliente_solicitante')}, {_ultimo('cliente_contato')}, {_ultimo('cliente_email')},
+               {_ultimo('cliente_endereco')}, min(criado_em), max(criado_em)
+        FROM (SELECT vendas.*, {NOME} AS nome_normalizado, {DOCUMENTO} AS documento FROM vendas) v
+        WHERE nome_normalizado <> ''
+        GROUP BY documento, CASE WHEN documento IS NULL THEN nome_normalizado END
+    """)
+    op.execute(f"""
+        UPDATE vendas v SET cliente_id = coalesce(por_documento.id, por_nome.id)
+        FROM (SELECT id, {NOME} AS nome_normalizado, {DOCUMENTO} AS documento FROM vendas) chave
+        LEFT JOIN clientes por_documento ON por_documento.documento = chave.documento
+        LEFT JOIN clientes por_nome ON chave.documento IS NULL AND por_nome.documento IS NULL
+                                   AND por_nome.nome_normalizado = chave.nome_normalizado
+        WHERE chave.id = v.id
+    """)
+    op.execute("""
+        INSERT INTO clientes_palavras (palavra, cliente_id)
+        SELECT DISTINCT palavra, id FROM clientes, regexp_split_to_table(nome_normalizado, '[^a-z0-9]+') AS palavra
+        WHERE palavra <> ''
+    """)
+
+    op.create_index('ux_clientes_documento', 'clientes', ['documento'], unique=True,
+                    postgresql_where=sa.text('documento IS NOT NULL'))
+    op.create_index('ux_clientes_nome_sem_documento', 'clientes', ['nome_normalizado'], unique=True,
+                    postgresql_where=sa.text('documento IS NULL'))
+    op.create_index('ix_clientes_nome_prefixo', 'clientes', ['nome_normalizado'], unique=False)
+    op.create_index('ix_clientes_palavras_cliente', 'clientes_palavras', ['cliente_id', 'palavra'], unique=False)
+    op.create_index('ix_vendas_cliente_id', 'vendas', ['cliente_id'], unique=False)
+
+    # O autocomplete de clientes saiu de vendas.cliente_nome: o índice de trigramas do nome não serve mais
+    op.execute('DROP INDEX IF EXISTS ix_vendas_cliente_nome_trgm')
+
+
+def downgrade():
+    if op.get_bind().execute(sa.text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first():
+        op.execute(f"CREATE INDEX IF NOT EXISTS ix_vendas_cliente_nome_trgm ON vendas "
+                   f"USING gin (lower(translate(cliente_nome, '{ACENTOS}', '{SEM_ACENTOS}')) gin_trgm_ops)")
+    op.drop_index('ix_vendas_cliente_id', table_name='vendas')
+    with op.batch_alter_table('vendas', schema=None) as batch_op:
+        batch_op.drop_constraint('vendas_cliente_id_fkey', type_='foreignkey')
+        batch_op.drop_column('cliente_id')
+    op.drop_index('ix_clientes_palavras_cliente', table_name='clientes_palavras')
+    op.drop_table('clientes_palavras')
+    op.drop_table('clientes')
@@ -0,0 +1,56 @@
+"""Índices das consultas principais (painel, vendas, financeiro, estoque)
+
+Revision ID: 7c4d1e8a2f60
+Revises: 5b7e2c91d4a3
+Create Date: 2026-10-18 11:02:17.514208
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c4d1e8a2f60'
+down_revision = '5b7e2c91d4a3'
+branch_labels = None
+depends_on = None
+
+
+# (nome, tabela, colunas, opções extras)
+INDICES = [
+    # Pagamentos: join com a venda e somas por período
+    ('ix_pagamentos_venda_id', 'pagamentos', ['venda_id'], {}),
+    ('ix_pagamentos_data_pagamento', 'pagamentos', ['data_pagamento'], {'postgresql_include': ['venda_id', 'valor']}),
+
+    # Vendas: contagens por status/modo, filtros por data e ranking por vendedor
+    ('ix_vendas_status_modo', 'vendas', ['status', 'modo'], {}),
+    ('ix_vendas_criado_em', 'vendas', ['criado_em'], {}),
+    ('ix_vendas_vendedor_id', 'vendas', ['vendedor_id'], {}),
+
+    # Itens: carregados pela venda; a fila/contagens por status só olham os não entregues
+    ('ix_venda_itens_venda_status', 'venda_itens', ['venda_id', 'status'], {}),
+    ('ix_venda_itens_em_aberto', 'venda_itens', ['status', 'venda_id'], {'postgresql_where': sa.text("status <> 'entregue'")}),
+
+    # Despesas: o grosso da tabela é 'pago', então as pendentes ficam num índice parcial
+    ('ix_despesas_vencimento', 'despesas', ['data_vencimento'], {}),
+    ('ix_despesas_pendentes_vencimento', 'despesas', ['data_vencimento'], {'postgresql_where': sa.text("status = 'pendente'")}),
+    ('ix_despesas_pagas_pagamento', 'despesas', ['data_pagamento'], {'postgresql_where': sa.text("status = 'pago'")}),
+    ('ix_despesas_grupo_parcelamento', 'despesas', ['grupo_parcelamento'], {'postgresql_where': sa.text('grupo_parcelamento IS NOT NULL')}),
+
+    # Estoque: histórico do produto e estorno/consumo pela referência (item ou despesa)
+    ('ix_mov_estoque_produto_data', 'movimentacoes_estoque', ['produto_id', 'data_movimentacao'], {}),
+    ('ix_mov_estoque_referencia', 'movimentacoes_estoque', ['referencia_id', 'origem', 'tipo'], {}),
+]
+
+
+def upgrade():
+    # if_not_exists: bancos criados depois deste commit já ganham os índices pelo create_all
+    for nome, tabela, colunas, opcoes in INDICES:
+        op.create_index(nome, tabela, colunas, unique=False, if_not_exists=True, **opcoes)
+
+    op.execute('ANALYZE pagamentos, vendas, venda_itens, despesas, movimentacoes_estoque')
+
+
+def downgrade():
+    for nome, tabela, colunas, opcoes in reversed(INDICES):
+        op.drop_index(nome, table_name=tabela, if_exists=True)
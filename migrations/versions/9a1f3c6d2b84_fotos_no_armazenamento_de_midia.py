@@ -0,0 +1,40 @@
+"""Fotos no armazenamento de mídia (hash SHA-256 em vez de BLOB)
+
+Revision ID: 9a1f3c6d2b84
+Revises: 7c4d1e8a2f60
+Create Date: 2026-10-18 13:40:05.927311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a1f3c6d2b84'
+down_revision = '7c4d1e8a2f60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Só estrutura: os BLOBs existentes são movidos depois, em lotes, com "flask migrar-fotos-disco"
+    with op.batch_alter_table('fotos_itens_venda', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('hash_sha256', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('tamanho_bytes', sa.Integer(), nullable=True))
+        batch_op.alter_column('dados_binarios', existing_type=sa.LargeBinary(), nullable=True)
+        batch_op.create_index(batch_op.f('ix_fotos_itens_venda_hash_sha256'), ['hash_sha256'], unique=False)
+
+
+def downgrade():
+    # Sem o hash, fotos que já estão só no disco ficariam perdidas
+    movidas = op.get_bind().execute(
+        sa.text("SELECT COUNT(*) FROM fotos_itens_venda WHERE dados_binarios IS NULL")
+    ).scalar()
+    if movidas:
+        raise RuntimeError(f"{movidas} foto(s) já estão no armazenamento de mídia; traga-as de volta ao banco antes do downgrade.")
+
+    with op.batch_alter_table('fotos_itens_venda', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_fotos_itens_venda_hash_sha256'))
+        batch_op.alter_column('dados_binarios', existing_type=sa.LargeBinary(), nullable=False)
+        batch_op.drop_column('tamanho_bytes')
+        batch_op.drop_column('hash_sha256')
@@ -0,0 +1,70 @@
+"""Documentos da busca unificada (tsvector + trigramas)
+
+Revision ID: a8f3c61d27e4
+Revises: d41c7a9e0b35
+Create Date: 2026-10-18 19:05:12.418220
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8f3c61d27e4'
+down_revision = 'd41c7a9e0b35'
+branch_labels = None
+depends_on = None
+
+# Mesmo mapeamento de src/modulos/busca/motor.py (ACENTOS / SEM_ACENTOS)
+ACENTOS = 'ÁÀÂÃÄÉÈÊËÍÌÎÏÓÒÔÕÖÚÙÛÜÇÑáàâãäéèêëíìîïóòôõöúùûüçñ'
+SEM_ACENTOS = 'AAAAAEEEEIIIIOOOOOUUUUCNaaaaaeeeeiiiiooooouuuucn'
+
+
+def _normalizado(expressao):
+    return f"lower(translate({expressao}, '{ACENTOS}', '{SEM_ACENTOS}'))"
+
+
+def upgrade():
+    op.create_table('documentos_busca',
+        sa.Column('entidade', sa.String(length=20), nullable=False),
+        sa.Column('entidade_id', sa.Integer(), nullable=False),
+        sa.Column('documento', sa.Text(), nullable=False),
+        sa.Column('vetor', postgresql.TSVECTOR(),
+                  sa.Computed("to_tsvector('portuguese'::regconfig, documento)", persisted=True), nullable=True),
+        sa.PrimaryKeyConstraint('entidade', 'entidade_id')
+    )
+
+    # Documentos das vendas (com os itens), despesas e colaboradores já existentes
+    op.execute(f"""
+        INSERT INTO documentos_busca (entidade, entidade_id, documento)
+        SELECT 'venda', v.id, {_normalizado(
+            "concat_ws(' ', v.cliente_nome, v.descricao_servico, v.cor_nome_snapshot, "
+            "(SELECT string_agg(i.descricao, ' ') FROM venda_itens i WHERE i.venda_id = v.id))")}
+        FROM vendas v
+    """)
+    op.execute(f"""
+        INSERT INTO documentos_busca (entidade, entidade_id, documento)
+        SELECT 'despesa', d.id, {_normalizado('d.descricao')} FROM despesas d
+    """)
+    op.execute(f"""
+        INSERT INTO documentos_busca (entidade, entidade_id, documento)
+        SELECT 'colaborador', c.id, {_normalizado("concat_ws(' ', c.nome_completo, c.cpf)")} FROM colaboradores c
+    """)
+
+    op.create_index('ix_documentos_busca_vetor', 'documentos_busca', ['vetor'], unique=False, postgresql_using='gin')
+
+    # Trigramas só onde o servidor tem o contrib pg_trgm; sem ele a busca por trecho funciona sem índice
+    conexao = op.get_bind()
+    if conexao.execute(sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).first():
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute('CREATE INDEX IF NOT EXISTS ix_documentos_busca_trgm ON documentos_busca USING gin (documento gin_trgm_ops)')
+        op.execute(f"CREATE INDEX IF NOT EXISTS ix_vendas_cliente_nome_trgm ON vendas "
+                   f"USING gin ({_normalizado('cliente_nome')} gin_trgm_ops)")
+
+
+def downgrade():
+    op.execute('DROP INDEX IF EXISTS ix_vendas_cliente_nome_trgm')
+    op.execute('DROP INDEX IF EXISTS ix_documentos_busca_trgm')
+    op.drop_index('ix_documentos_busca_vetor', table_name='documentos_busca', postgresql_using='gin')
+    op.drop_table('documentos_busca')
@@ -0,0 +1,33 @@
+"""Hash SHA-256 dos documentos do RH (ETag dos downloads)
+
+Revision ID: b3e85d17c9f2
+Revises: 9a1f3c6d2b84
+Create Date: 2026-10-18 14:55:31.046187
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e85d17c9f2'
+down_revision = '9a1f3c6d2b84'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('documentos_colaboradores', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('hash_sha256', sa.String(length=64), nullable=True))
+
+    # Calculado no próprio PostgreSQL: os bytes não trafegam
+    op.execute("""
+        UPDATE documentos_colaboradores
+           SET hash_sha256 = encode(sha256(dados_binarios), 'hex')
+         WHERE dados_binarios IS NOT NULL
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('documentos_colaboradores', schema=None) as batch_op:
+        batch_op.drop_column('hash_sha256')
@@ -0,0 +1,34 @@
+"""Fechamentos mensais de estoque (saldo de cada produto no 1º dia do mês)
+
+Revision ID: c31d7a9e5f20
+Revises: 5b7e2f90c4a1
+Create Date: 2026-10-18 23:02:11.318640
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c31d7a9e5f20'
+down_revision = '5b7e2f90c4a1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Os fechamentos são gravados por "flask fechar-estoque" (o primeiro parte do saldo atual)
+    op.create_table('fechamentos_estoque',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('produto_id', sa.Integer(), nullable=False),
+        sa.Column('data_corte', sa.DateTime(), nullable=False),
+        sa.Column('saldo', sa.Numeric(precision=10, scale=3), nullable=False),
+        sa.Column('criado_em', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['produto_id'], ['produtos_estoque.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('produto_id', 'data_corte', name='ux_fechamentos_estoque_produto_corte')
+    )
+
+
+def downgrade():
+    op.drop_table('fechamentos_estoque')
@@ -0,0 +1,35 @@
+"""Versões das fotos (miniatura/média) e status do processamento
+
+Revision ID: d41c7a9e0b35
+Revises: b3e85d17c9f2
+Create Date: 2026-10-18 16:20:48.731902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41c7a9e0b35'
+down_revision = 'b3e85d17c9f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # As versões das fotos existentes são geradas depois, em lotes, com "flask gerar-versoes-fotos"
+    with op.batch_alter_table('fotos_itens_venda', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('hash_media', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('hash_miniatura', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('status_midia', sa.String(length=20), server_default='pendente', nullable=False))
+        batch_op.create_index(batch_op.f('ix_fotos_itens_venda_hash_media'), ['hash_media'], unique=False)
+        batch_op.create_index(batch_op.f('ix_fotos_itens_venda_hash_miniatura'), ['hash_miniatura'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('fotos_itens_venda', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_fotos_itens_venda_hash_miniatura'))
+        batch_op.drop_index(batch_op.f('ix_fotos_itens_venda_hash_media'))
+        batch_op.drop_column('status_midia')
+        batch_op.drop_column('hash_miniatura')
+        batch_op.drop_column('hash_media')
@@ -0,0 +1,48 @@
+"""Contadores de itens por status em vendas
+
+Revision ID: f7a2d4c81b93
+Revises: c31d7a9e5f20
+Create Date: 2026-10-19 08:41:27.904316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7a2d4c81b93'
+down_revision = 'c31d7a9e5f20'
+branch_labels = None
+depends_on = None
+
+# Mesmo mapeamento de src/modulos/vendas/modelos.py (CONTADORES_STATUS_ITENS)
+CONTADORES = {
+    'pendente': 'itens_pendentes',
+    'producao': 'itens_producao',
+    'retrabalho': 'itens_retrabalho',
+    'pronto': 'itens_prontos',
+    'entregue': 'itens_entregues',
+}
+
+
+def upgrade():
+    with op.batch_alter_table('vendas', schema=None) as batch_op:
+        for coluna in CONTADORES.values():
+            batch_op.add_column(sa.Column(coluna, sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill a partir dos itens já existentes
+    op.execute(f"""
+        UPDATE vendas v
+           SET {', '.join(f'{coluna} = c.{coluna}' for coluna in CONTADORES.values())}
+          FROM (SELECT venda_id,
+                       {', '.join(f"count(*) FILTER (WHERE status = '{status}') AS {coluna}"
+                                  for status, coluna in CONTADORES.items())}
+                  FROM venda_itens GROUP BY venda_id) c
+         WHERE c.venda_id = v.id
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('vendas', schema=None) as batch_op:
+        for coluna in reversed(list(CONTADORES.values())):
+            batch_op.drop_column(coluna)
\ No newline at end of file
@@ -0,0 +1,265 @@
+import time
+import pickle
+import sqlite3
+import threading
+import pytz
+from collections import OrderedDict
+from datetime import date, datetime
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+# Marcador usado na sessão para "apagar tudo" (mudança que afeta qualquer mês)
+TODOS_OS_MESES = '*'
+
+
+def _meses_correntes():
+    """Mês de hoje no relógio do servidor e no de Brasília (diferem na virada do mês)"""
+    local = date.today()
+    brasilia = datetime.now(pytz.timezone('America/Sao_Paulo')).date()
+    return {(local.year, local.month), (brasilia.year, brasilia.month)}
+
+
+# =========================================================
+# --- BACKENDS ---
+# =========================================================
+class CacheMemoria:
+    """LRU em memória do processo, compartilhado entre as threads do waitress"""
+
+    def __init__(self, max_itens=256):
+        self.max_itens = max_itens
+        self._dados = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave):
+        with self._trava:
+            item = self._dados.get(chave)
+            if item is None:
+                return None
+            expira, valor = item
+            if expira < time.time():
+                del self._dados[chave]
+                return None
+            self._dados.move_to_end(chave)
+            return valor
+
+    def definir(self, chave, valor, ttl):
+        with self._trava:
+            self._dados[chave] = (time.time() + ttl, valor)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_itens:
+                self._dados.popitem(last=False)
+
+    def apagar_prefixo(self, prefixo):
+        with self._trava:
+            for chave in [c for c in self._dados if c.startswith(prefixo)]:
+                del self._dados[chave]
+
+    def limpar(self):
+        with self._trava:
+            self._dados.clear()
+
+
+class CacheSQLite:
+    """
+    Cache num arquivo SQLite: vale para todas as threads E processos da máquina,
+    então uma invalidação feita por um processo é vista pelos outros.
+    """
+
+    def __init__(self, caminho, max_itens=256):
+        self.caminho = caminho
+        self.max_itens = max_itens
+        self._local = threading.local()
+
+        with self._conexao() as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS cache (
+                    chave TEXT PRIMARY KEY,
+                    valor BLOB NOT NULL,
+                    expira REAL NOT NULL
+                )
+            """)
+
+    def _conexao(self):
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+            con.execute('PRAGMA journal_mode=WAL')
+            con.execute('PRAGMA synchronous=NORMAL')
+            self._local.con = con
+        return con
+
+    def obter(self, chave):
+        linha = self._conexao().execute(
+            'SELECT valor FROM cache WHERE chave = ? AND expira >= ?', (chave, time.time())
+        ).fetchone()
+        return linha[0] if linha else None
+
+    def definir(self, chave, valor, ttl):
+        con = self._conexao()
+        agora = time.time()
+        con.execute('INSERT OR REPLACE INTO cache (chave, valor, expira) VALUES (?, ?, ?)',
+                    (chave, valor, agora + ttl))
+        # Faxina: expirados e, se passou do limite, os que vencem primeiro
+        con.execute('DELETE FROM cache WHERE expira < ?', (agora,))
+        con.execute('DELETE FROM cache WHERE chave IN (SELECT chave FROM cache ORDER BY expira DESC LIMIT -1 OFFSET ?)',
+                    (self.max_itens,))
+
+    def apagar_prefixo(self, prefixo):
+        self._conexao().execute("DELETE FROM cache WHERE substr(chave, 1, ?) = ?", (len(prefixo), prefixo))
+
+    def limpar(self):
+        self._conexao().execute('DELETE FROM cache')
+
+
+class CacheDesligado:
+    """Não guarda nada (CACHE_TIPO = 'nenhum')"""
+
+    def obter(self, chave):
+        return None
+
+    def definir(self, chave, valor, ttl):
+        pass
+
+    def apagar_prefixo(self, prefixo):
+        pass
+
+    def limpar(self):
+        pass
+
+
+# =========================================================
+# --- CACHE DE AGREGADOS ---
+# =========================================================
+class CacheAgregados:
+    """
+    Guarda números da loja inteira (KPIs do painel, metas, cards da gestão)
+    sob chaves "AAAA-MM:nome[:extra]". Os valores vão serializados com pickle,
+    assim nenhuma requisição recebe um objeto que outra thread possa alterar.
+
+    Filtros de permissão por usuário NÃO entram aqui: são aplicados na hora de renderizar.
+    """
+
+    def __init__(self):
+        self.backend = CacheDesligado()
+        self.ttl = 60
+        self._modelos = {}
+
+    def init_app(self, app):
+        tipo = app.config.get('CACHE_TIPO', 'memoria')
+        max_itens = app.config.get('CACHE_MAX_ITENS', 256)
+        self.ttl = app.config.get('CACHE_TTL', 60)
+
+        if tipo == 'sqlite':
+            self.backend = CacheSQLite(app.config['CACHE_ARQUIVO'], max_itens)
+        elif tipo == 'memoria':
+            self.backend = CacheMemoria(max_itens)
+        else:
+            self.backend = CacheDesligado()
+
+        app.extensions['cache_agregados'] = self
+
+        if not event.contains(Session, 'after_flush', self._apos_flush):
+            event.listen(Session, 'after_flush', self._apos_flush)
+            event.listen(Session, 'do_orm_execute', self._apos_execucao_em_massa)
+            event.listen(Session, 'after_commit', self._apos_commit)
+            event.listen(Session, 'after_rollback', self._apos_rollback)
+
+    @staticmethod
+    def chave(nome, ano, mes, *extra):
+        return ':'.join([f'{ano:04d}-{mes:02d}', nome] + [str(e) for e in extra])
+
+    def obter_ou_calcular(self, chave, funcao, ttl=None):
+        """Devolve o valor do cache ou calcula, guarda e devolve. Erro no cache nunca derruba a tela."""
+        try:
+            bruto = self.backend.obter(chave)
+            if bruto is not None:
+                return pickle.loads(bruto)
+        except Exception as e:
+            print(f"Erro ao ler cache ({chave}): {e}")
+
+        valor = funcao()
+
+        try:
+            self.backend.definir(chave, pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL), ttl or self.ttl)
+        except Exception as e:
+            print(f"Erro ao gravar cache ({chave}): {e}")
+        return valor
+
+    def invalidar_meses(self, meses):
+        try:
+            if TODOS_OS_MESES in meses:
+                self.backend.limpar()
+                return
+            for ano, mes in meses:
+                self.backend.apagar_prefixo(f'{ano:04d}-{mes:02d}:')
+        except Exception as e:
+            print(f"Erro ao invalidar cache: {e}")
+
+    # =========================================================
+    # --- INVALIDAÇÃO PELAS ESCRITAS ---
+    # =========================================================
+    def monitorar(self, modelo, datas=(), globais=(), sempre_tudo=False):
+        """
+        Registra um modelo cujas escritas invalidam o cache.
+        - datas: colunas cujo mês (valor novo e antigo) deve ser invalidado;
+        - globais: colunas que, se mudarem, afetam qualquer mês (apaga tudo);
+        - sempre_tudo: qualquer escrita apaga tudo.
+        O mês corrente é sempre invalidado (saldos a receber/pagar são globais).
+        """
+        self._modelos[modelo] = (tuple(datas), tuple(globais), sempre_tudo)
+
+    def _regra(self, obj):
+        for modelo, regra in self._modelos.items():
+            if isinstance(obj, modelo):
+                return regra
+        return None
+
+    def _meses_afetados(self, obj, regra, removido):
+        datas, globais, sempre_tudo = regra
+        if sempre_tudo or removido:
+            return {TODOS_OS_MESES}
+
+        estado = inspect(obj)
+        meses = set()
+        for coluna in globais:
+            if estado.attrs[coluna].history.has_changes():
+                return {TODOS_OS_MESES}
+        for coluna in datas:
+            historico = estado.attrs[coluna].history
+            for valor in list(historico.added) + list(historico.deleted) + list(historico.unchanged):
+                if isinstance(valor, date):
+                    meses.add((valor.year, valor.month))
+        return meses
+
+    def _pendentes(self, session):
+        return session.info.setdefault('cache_meses_sujos', set())
+
+    def _apos_flush(self, session, flush_context):
+        if not self._modelos:
+            return
+        pendentes = self._pendentes(session)
+        for colecao, removido in ((session.new, False), (session.dirty, False), (session.deleted, True)):
+            for obj in colecao:
+                regra = self._regra(obj)
+                if regra is None:
+                    continue
+                if colecao is session.dirty and not session.is_modified(obj, include_collections=False):
+                    continue
+                pendentes.update(self._meses_afetados(obj, regra, removido))
+                pendentes.update(_meses_correntes())
+
+    def _apos_execucao_em_massa(self, execucao):
+        # update()/delete() em massa não passam pelo flush: apaga tudo ao confirmar
+        if not (execucao.is_update or execucao.is_delete) or execucao.bind_mapper is None:
+            return
+        if any(issubclass(execucao.bind_mapper.class_, m) for m in self._modelos):
+            self._pendentes(execucao.session).add(TODOS_OS_MESES)
+
+    def _apos_commit(self, session):
+        meses = session.info.pop('cache_meses_sujos', None)
+        if meses:
+            self.invalidar_meses(meses)
+
+    def _apos_rollback(self, session):
+        session.info.pop('cache_meses_sujos', None)
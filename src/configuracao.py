@@ -11,12 +11,37 @@ class ConfiguracaoBase:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     basedir = os.path.abspath(os.path.dirname(__file__))
     UPLOAD_FOLDER = os.path.join(os.path.dirname(basedir), 'uploads_colaboradores')
-    MAX_CONTENT_LENGTH = 64 * 1024 * 1024 # Limite de 16MB
+    MAX_CONTENT_LENGTH = 64 * 1024 * 1024 # Limite da requisição inteira (por arquivo: UPLOAD_LIMITES)
 
     # --- CONFIGURAÇÃO DE TIMEOUT ---
     # Define que a sessão expira em 30 minutos
     PERMANENT_SESSION_LIFETIME = timedelta(minutes=30)
 
+    # --- CACHE DOS INDICADORES (painel, metas, cards da gestão) ---
+    # 'memoria' = LRU por processo | 'sqlite' = arquivo compartilhado entre processos | 'nenhum'
+    CACHE_TIPO = os.getenv('CACHE_TIPO', 'memoria')
+    CACHE_ARQUIVO = os.getenv('CACHE_ARQUIVO', os.path.join(os.path.dirname(basedir), 'cache_indicadores.sqlite3'))
+    CACHE_TTL = int(os.getenv('CACHE_TTL', 60)) # segundos
+    CACHE_MAX_ITENS = 256
+
+    # --- MÍDIA (fotos dos serviços) ---
+    # Arquivos ficam fora do banco, endereçados pelo SHA-256 do conteúdo
+    MIDIA_TIPO = os.getenv('MIDIA_TIPO', 'local')
+    MIDIA_PASTA = os.getenv('MIDIA_PASTA', os.path.join(os.path.dirname(basedir), 'midia'))
+    MIDIA_MAX_AGE = 365 * 24 * 3600 # arquivos imutáveis: o navegador guarda por 1 ano
+    # Versões das fotos são geradas fora da requisição: 'segundo_plano' (pool) | 'sincrono'
+    MIDIA_PROCESSAMENTO = os.getenv('MIDIA_PROCESSAMENTO', 'segundo_plano')
+    MIDIA_THREADS = 2
+    MIDIA_FILA_MAX = 200
+    MIDIA_ENCERRAR_TIMEOUT = 30 # segundos para drenar a fila ao desligar
+
+    # --- UPLOADS: limite por tipo declarado do arquivo (checado enquanto o corpo chega) ---
+    UPLOAD_LIMITES = {
+        'image/': 25 * 1024 * 1024,
+        'application/pdf': 20 * 1024 * 1024,
+    }
+    UPLOAD_LIMITE_PADRAO = 10 * 1024 * 1024 # Word e demais tipos
+
 class ConfiguracaoDesenvolvimento(ConfiguracaoBase):
     DEBUG = True
     
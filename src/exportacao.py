@@ -0,0 +1,141 @@
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from flask import Response, stream_with_context
+
+TIPO_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Linhas por ida ao cursor do servidor: memória fixa, poucas idas ao banco
+TAMANHO_LOTE = 2000
+# A resposta recebe um bloco sempre que o zip acumula isso de bytes comprimidos
+TAMANHO_BLOCO = 64 * 1024
+
+# Mesmos caracteres que o openpyxl recusa (o Excel não abre o arquivo com eles)
+CARACTERES_ILEGAIS = re.compile(r'[\000-\010]|[\013-\014]|[\016-\037]')
+
+_PARTES_FIXAS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{nome}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+
+_INICIO_ABA = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_FIM_ABA = '</sheetData></worksheet>'
+
+
+def linhas_em_lotes(consulta, tamanho=TAMANHO_LOTE):
+    """
+    Percorre a consulta com cursor do lado do servidor (yield_per): o driver só
+    traz `tamanho` linhas por vez, em vez de materializar o resultado inteiro
+    como o .all(). Use consultas de colunas (with_entities), não de objetos —
+    assim nada se acumula no identity map da sessão.
+    """
+    return consulta.yield_per(tamanho)
+
+
+class _SaidaZip:
+    """Destino do ZipFile: guarda os bytes comprimidos até a resposta buscá-los (sem seek, o zip grava em fluxo)"""
+
+    def __init__(self):
+        self._blocos = []
+        self._posicao = 0
+        self.pendente = 0
+
+    def write(self, dados):
+        self._blocos.append(bytes(dados))
+        self._posicao += len(dados)
+        self.pendente += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def flush(self):
+        pass
+
+    def retirar(self):
+        dados = b''.join(self._blocos)
+        self._blocos.clear()
+        self.pendente = 0
+        return dados
+
+
+def _celula(valor):
+    if valor is None:
+        return '<c/>'
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor) # 10 em vez de 10.0, como o openpyxl grava
+    if isinstance(valor, (int, float, Decimal)) and not isinstance(valor, bool):
+        return f'<c><v>{valor}</v></c>'
+    texto = escape(CARACTERES_ILEGAIS.sub('', str(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _linha(valores):
+    return '<row>' + ''.join(_celula(v) for v in valores) + '</row>'
+
+
+def gerar_xlsx(titulo_aba, cabecalho, linhas):
+    """
+    Gera o XLSX (uma aba, textos inline) em pedaços, à medida que as linhas chegam:
+    o zip é escrito em fluxo (data descriptors) e cada bloco comprimido sai assim
+    que passa de TAMANHO_BLOCO. Nem a planilha nem o resultado ficam inteiros na memória.
+    """
+    saida = _SaidaZip()
+    with zipfile.ZipFile(saida, 'w', compression=zipfile.ZIP_DEFLATED) as pacote:
+        for nome, conteudo in _PARTES_FIXAS.items():
+            pacote.writestr(nome, conteudo)
+        pacote.writestr('xl/workbook.xml', _WORKBOOK.format(nome=escape(titulo_aba[:31], {'"': '&quot;'})))
+
+        with pacote.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as aba:
+            aba.write(_INICIO_ABA.encode())
+            aba.write(_linha(cabecalho).encode())
+            for valores in linhas:
+                aba.write(_linha(valores).encode())
+                if saida.pendente >= TAMANHO_BLOCO:
+                    yield saida.retirar()
+            aba.write(_FIM_ABA.encode())
+    yield saida.retirar()
+
+
+def resposta_planilha(nome_arquivo, titulo_aba, cabecalho, linhas):
+    """
+    Resposta de download que vai sendo enviada enquanto as linhas são lidas do banco.
+    `linhas` deve ser um gerador (ex.: sobre linhas_em_lotes): a memória fica a mesma
+    com mil ou um milhão de linhas, e o primeiro byte sai sem esperar a planilha inteira.
+    """
+    return Response(
+        stream_with_context(gerar_xlsx(titulo_aba, cabecalho, linhas)),
+        mimetype=TIPO_XLSX,
+        headers={'Content-Disposition': f'attachment; filename="{nome_arquivo}"'}
+    )
@@ -1,11 +1,16 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
+from src.cache import CacheAgregados
+from src.midia import ArmazenamentoMidia, ProcessadorMidia
 
 # Instâncias
 banco_de_dados = SQLAlchemy()
 migracao = Migrate()
 login_manager = LoginManager()
+cache_agregados = CacheAgregados()
+armazenamento_midia = ArmazenamentoMidia()
+processador_midia = ProcessadorMidia()
 
 # Configuração do Login
 login_manager.login_view = 'autenticacao.login' # Nome da rota de login
@@ -1,22 +1,13 @@
 import os
-import requests
-import hmac
-import hashlib
 import json
-import time
-from datetime import datetime, date, timedelta
-from dateutil.relativedelta import relativedelta
-from flask import Flask, redirect, url_for, request, render_template, session # <--- ADICIONE session AQUI
+import click
+from flask import Flask, redirect, url_for, request, render_template, session, jsonify, flash # <--- ADICIONE session AQUI
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask_login import current_user
 from src.configuracao import configuracoes
-from src.extensoes import banco_de_dados, migracao, login_manager
-
-
-# --- CONFIGURAÇÕES DO SISTEMA DE LICENÇA ---
-# URL "Raw" do seu Gist (Substitua pelo seu link real)
-URL_GIST = "https://gist.githubusercontent.com/Zhenriquee/1aa33c7f49b9871419411214002e33f1/raw/config.json"
-# Nome do arquivo local que guardará a licença
-ARQUIVO_LICENCA = 'license.key'
+from src.extensoes import banco_de_dados, migracao, login_manager, cache_agregados, armazenamento_midia, processador_midia
+from src.licenca import EstadoLicenca, ARQUIVO_LICENCA
+from src.uploads import RequisicaoComUpload
 
 
 def criar_app(nome_configuracao='desenvolvimento'):
@@ -64,94 +55,140 @@ def criar_app(nome_configuracao='desenvolvimento'):
     from src.modulos.relatorios import bp_relatorios
     app.register_blueprint(bp_relatorios)
 
+    # --- BUSCA UNIFICADA: documentos reconstruídos no flush das vendas/itens/despesas/colaboradores ---
+    from src.modulos.busca import bp_busca
+    from src.modulos.busca.motor import monitorar_escritas
+    app.register_blueprint(bp_busca)
+    monitorar_escritas()
+
+    # --- CONTADORES DE STATUS DOS ITENS EM VENDA (status da venda sem carregar os itens) ---
+    from src.modulos.vendas.servicos import monitorar_status_itens
+    monitorar_status_itens()
+
+    # --- FOTOS E ANEXOS FORA DO BANCO ---
+    # Uploads chegam direto no disco (em blocos, com hash e limite por tipo) — ver src/uploads.py
+    app.request_class = RequisicaoComUpload
+    armazenamento_midia.init_app(app)
+    processador_midia.init_app(app)
+    from src.modulos.vendas.modelos import FotoItemVenda
+    from src.modulos.rh.modelos import DocumentoColaborador
+    armazenamento_midia.referenciar(
+        FotoItemVenda.hash_sha256, FotoItemVenda.hash_media, FotoItemVenda.hash_miniatura,
+        DocumentoColaborador.hash_sha256
+    )
+
+    # --- CACHE DE INDICADORES: escritas nestes modelos invalidam os meses afetados ---
+    cache_agregados.init_app(app)
+    from src.modulos.vendas.modelos import Venda, ItemVenda, Pagamento
+    from src.modulos.financeiro.modelos import Despesa
+    from src.modulos.metas.modelos import MetaMensal, MetaVendedor
+    cache_agregados.monitorar(Pagamento, datas=['data_pagamento'])
+    cache_agregados.monitorar(Venda, datas=['criado_em'], globais=['status', 'vendedor_id'])
+    cache_agregados.monitorar(ItemVenda)
+    cache_agregados.monitorar(Despesa, datas=['data_vencimento', 'data_pagamento'])
+    cache_agregados.monitorar(MetaMensal, sempre_tudo=True)
+    cache_agregados.monitorar(MetaVendedor, sempre_tudo=True)
+
     @app.cli.command("backup")
     def comando_backup():
         """Executa backup rotativo (dias 1, 10, 20) para nuvem."""
         from src.backup_cloud import realizar_backup_nuvem
         realizar_backup_nuvem()
 
+    @app.cli.command("recalcular-totais-vendas")
+    @click.option('--verificar', is_flag=True, help='Apenas lista as divergências, sem corrigir.')
+    def comando_recalcular_totais_vendas(verificar):
+        """Reconstrói valor_pago/valor_restante das vendas a partir dos pagamentos."""
+        from src.modulos.vendas.servicos import recalcular_totais_vendas
+        divergencias = recalcular_totais_vendas(apenas_verificar=verificar)
+        for venda_id, pago, pago_real, restante, restante_real in divergencias:
+            print(f"Venda #{venda_id}: pago {pago} -> {pago_real} | restante {restante} -> {restante_real}")
+        acao = "encontrada(s)" if verificar else "corrigida(s)"
+        print(f"{len(divergencias)} divergência(s) {acao}.")
+
+    @app.cli.command("recalcular-contadores-itens")
+    @click.option('--verificar', is_flag=True, help='Apenas lista as divergências, sem corrigir.')
+    def comando_recalcular_contadores_itens(verificar):
+        """Reconstrói os contadores de itens por status das vendas a partir dos itens."""
+        from src.modulos.vendas.servicos import recalcular_contadores_itens
+        divergencias = recalcular_contadores_itens(apenas_verificar=verificar)
+        for venda_id, colunas in divergencias:
+            detalhe = ', '.join(f"{coluna} {gravado} -> {real}" for coluna, (gravado, real) in colunas.items())
+            print(f"Venda #{venda_id}: {detalhe}")
+        acao = "encontrada(s)" if verificar else "corrigida(s)"
+        print(f"{len(divergencias)} divergência(s) {acao}.")
+
+    @app.cli.command("deduplicar-clientes")
+    def comando_deduplicar_clientes():
+        """Monta/atualiza o cadastro de clientes a partir do histórico de vendas, sem duplicados."""
+        from src.modulos.vendas.servicos import deduplicar_clientes
+        total, religadas, removidos = deduplicar_clientes()
+        print(f"{total} cliente(s) no cadastro; {religadas} venda(s) religada(s); {removidos} cliente(s) sem vendas removido(s).")
+
+    @app.cli.command("fechar-estoque")
+    def comando_fechar_estoque():
+        """Grava o saldo de cada produto nos cortes mensais ainda não fechados (rodar todo início de mês)."""
+        from src.modulos.estoque.servicos import fechar_meses
+        fechados = fechar_meses()
+        for corte, produtos in fechados:
+            print(f"{corte:%m/%Y}: {produtos} produto(s) fechado(s).")
+        banco_de_dados.session.commit()
+        print(f"{len(fechados)} mês(es) fechado(s).")
+
+    @app.cli.command("conciliar-estoque")
+    def comando_conciliar_estoque():
+        """Confere saldos e movimentações de estoque a partir do último fechamento de cada produto."""
+        from src.modulos.estoque.servicos import conciliar
+        divergencias = conciliar()
+        for produto_id, nome, atual, calculado, inconsistentes in divergencias:
+            print(f"Produto #{produto_id} ({nome}): saldo {atual} | pelo histórico {calculado} | "
+                  f"{inconsistentes} movimentação(ões) com saldo_novo incoerente")
+        print(f"{len(divergencias)} produto(s) com divergência.")
+        if divergencias:
+            raise SystemExit(1)
+
+    @app.cli.command("migrar-fotos-disco")
+    @click.option('--lote', default=50, show_default=True, help='Fotos por transação.')
+    @click.option('--limpar-orfaos', is_flag=True, help='Também apaga arquivos que nenhuma foto referencia.')
+    def comando_migrar_fotos_disco(lote, limpar_orfaos):
+        """Move as fotos gravadas no banco (BLOB) para o armazenamento de mídia."""
+        from src.modulos.vendas.servicos import migrar_fotos_para_disco
+        movidas, total_bytes = migrar_fotos_para_disco(lote=lote)
+        print(f"{movidas} foto(s) movida(s) para {app.config['MIDIA_PASTA']} ({total_bytes / 1024 / 1024:.1f} MB).")
+        if movidas:
+            print("Rode VACUUM FULL fotos_itens_venda para devolver o espaço ao disco")
+            print("e depois 'flask gerar-versoes-fotos' para criar as versões reduzidas.")
+        if limpar_orfaos:
+            print(f"{armazenamento_midia.limpar_orfaos(banco_de_dados.session)} arquivo(s) órfão(s) removido(s).")
+
+    @app.cli.command("gerar-versoes-fotos")
+    @click.option('--lote', default=20, show_default=True, help='Fotos por transação.')
+    def comando_gerar_versoes_fotos(lote):
+        """Gera miniatura/média/original (WebP, sem EXIF) das fotos pendentes ou com erro."""
+        from src.modulos.vendas.servicos import gerar_versoes_fotos
+        processadas, ignoradas, erros, antes, depois = gerar_versoes_fotos(lote=lote)
+        print(f"{processadas} foto(s) processada(s), {ignoradas} ignorada(s) (não são imagem), {erros} com erro.")
+        if processadas:
+            print(f"Originais: {antes / 1024 / 1024:.1f} MB -> {depois / 1024 / 1024:.1f} MB.")
+
+    @app.cli.command("reindexar-busca")
+    def comando_reindexar_busca():
+        """Reconstrói todos os documentos da busca e os índices de trigramas (pg_trgm)."""
+        from src.modulos.busca.motor import reindexar_tudo, garantir_indices_trigrama
+        conexao = banco_de_dados.session.connection()
+        if not garantir_indices_trigrama(conexao):
+            print("pg_trgm não está disponível neste servidor: busca por trecho sem índice.")
+        for entidade, qtd in reindexar_tudo(conexao).items():
+            print(f"{entidade}: {qtd} documento(s).")
+        banco_de_dados.session.commit()
+
     # =========================================================
-    # --- FUNÇÕES DE SEGURANÇA E LICENÇA ---
+    # --- LICENÇA (VEREDITO EM MEMÓRIA) ---
     # =========================================================
-    def assinar_dados(dados_str):
-        """Gera uma assinatura HMAC para proteger o arquivo local"""
-        chave = app.config['SECRET_KEY'].encode('utf-8')
-        msg = dados_str.encode('utf-8')
-        return hmac.new(chave, msg, hashlib.sha256).hexdigest()
-
-    def salvar_licenca_offline(data_validade):
-        """Grava a data de validade + assinatura no disco"""
-        data_str = data_validade.strftime('%Y-%m-%d')
-        assinatura = assinar_dados(data_str)
-        caminho = os.path.join(app.root_path, ARQUIVO_LICENCA)
-        
-        with open(caminho, 'w') as f:
-            f.write(f"{data_str}|{assinatura}")
-
-    def validar_licenca_local():
-        """Verifica se o arquivo local é válido e não expirou"""
-        caminho = os.path.join(app.root_path, ARQUIVO_LICENCA)
-        if not os.path.exists(caminho):
-            return False
-        
-        try:
-            with open(caminho, 'r') as f:
-                conteudo = f.read().strip()
-                
-            if '|' not in conteudo: return False
-            
-            data_str, assinatura_lida = conteudo.split('|')
-            
-            # 1. Checa adulteração
-            assinatura_real = assinar_dados(data_str)
-            if not hmac.compare_digest(assinatura_lida, assinatura_real):
-                return False
-            
-            # 2. Checa data
-            validade = datetime.strptime(data_str, '%Y-%m-%d').date()
-            if date.today() <= validade:
-                return True
-            else:
-                return False # Expirou
-        except:
-            return False
-
-    def tentar_renovar_online():
-        """Conecta no Gist para tentar renovar a licença"""
-        try:
-            # --- CORREÇÃO DE CACHE ---
-            # Adiciona um timestamp aleatório no final da URL para obrigar
-            # o servidor a baixar a versão nova e não a versão em cache.
-            url_fresca = f"{URL_GIST}?v={int(time.time())}"
-            
-            print(f"Consultando Licença em: {url_fresca}") # Log para debug
-            
-            response = requests.get(url_fresca, timeout=5)
-            
-            if response.status_code == 200:
-                dados = response.json()
-                status = dados.get('status', 'bloqueado').lower()
-                
-                print(f"Status Recebido: {status}") # Log para debug
-
-                if status == 'ativo':
-                    # Renovação: Validade até o final do PRÓXIMO mês
-                    hoje = date.today()
-                    proximo_mes = hoje + relativedelta(months=2)
-                    data_limite = proximo_mes.replace(day=1) - timedelta(days=1)
-                    
-                    salvar_licenca_offline(data_limite)
-                    return True
-                else:
-                    # Se estiver bloqueado no Gist, remove a licença local
-                    caminho = os.path.join(app.root_path, ARQUIVO_LICENCA)
-                    if os.path.exists(caminho):
-                        os.remove(caminho)
-                    return False
-            return False
-        except Exception as e:
-            print(f"Erro na renovação online: {e}")
-            return False # Sem internet ou erro
+    # Valida uma vez e guarda o resultado até a meia-noite ou até o arquivo mudar.
+    # A renovação online roda em background, fora das threads do waitress.
+    licenca = EstadoLicenca(os.path.join(app.root_path, ARQUIVO_LICENCA), app.config['SECRET_KEY'])
+    app.extensions['licenca'] = licenca
         
     # 1. TIMEOUT DE SESSÃO (NOVO)
     @app.before_request
@@ -170,15 +207,11 @@ def criar_app(nome_configuracao='desenvolvimento'):
         if rota and ('static' in rota or 'sistema_suspenso' in rota):
             return None
 
-        # 1. Tenta validar localmente (Rápido e Offline)
-        if validar_licenca_local():
+        # Checagem em memória (a renovação online, se necessária, já roda em background)
+        if licenca.liberado():
             return None # Acesso Liberado
         
-        # 2. Se falhou (expirou ou não existe), tenta renovar online
-        if tentar_renovar_online():
-            return None # Renovou e liberou
-        
-        # 3. Se tudo falhou -> Bloqueia
+        # Licença inválida/expirada -> Bloqueia
         return redirect(url_for('autenticacao.sistema_suspenso'))
     
     # =========================================================
@@ -196,6 +229,27 @@ def criar_app(nome_configuracao='desenvolvimento'):
         except Exception as e:
             print(f"Nota: Banco de dados ainda não pronto ou erro de conexão. ({e})")
 
+        try:
+            # Índices de trigramas da busca (só se o servidor tiver o pg_trgm; no-op se já existem)
+            from src.modulos.busca.motor import garantir_indices_trigrama
+            garantir_indices_trigrama(banco_de_dados.session.connection())
+            banco_de_dados.session.commit()
+        except Exception as e:
+            banco_de_dados.session.rollback()
+            print(f"Nota: índices de trigramas da busca não criados. ({e})")
+
+    # --- UPLOAD ACIMA DO LIMITE (UPLOAD_LIMITES / MAX_CONTENT_LENGTH) ---
+    @app.errorhandler(RequestEntityTooLarge)
+    def upload_grande_demais(erro):
+        mensagem = erro.description
+        if mensagem == RequestEntityTooLarge.description:
+            mensagem = 'Arquivo grande demais para envio.'
+        # Uploads via fetch (fotos) esperam JSON; formulários comuns voltam para a página com aviso
+        if 'text/html' not in request.accept_mimetypes.values():
+            return jsonify({'erro': mensagem}), 413
+        flash(mensagem, 'error')
+        return redirect(request.referrer or url_for('index'))
+
     # --- ROTAS GERAIS ---
     @app.route('/')
     def index():
@@ -211,7 +265,7 @@ def sincronizar_modulos_oficiais():
     Função que garante que os módulos no banco sejam EXATAMENTE
     os definidos aqui. Remove os obsoletos.
     """
-    from src.modulos.autenticacao.modelos import Modulo
+    from src.modulos.autenticacao.modelos import Modulo, invalidar_permissoes
     
     # LISTA OFICIAL DE PERMISSÕES 
     modulos_oficiais = [
@@ -305,4 +359,5 @@ def sincronizar_modulos_oficiais():
             alteracoes = True
 
     if alteracoes:
-        banco_de_dados.session.commit()
\ No newline at end of file
+        banco_de_dados.session.commit()
+        invalidar_permissoes()
\ No newline at end of file
@@ -0,0 +1,182 @@
+import os
+import hmac
+import hashlib
+import threading
+import time
+import requests
+from datetime import datetime, date, timedelta
+from dateutil.relativedelta import relativedelta
+
+# --- CONFIGURAÇÕES DO SISTEMA DE LICENÇA ---
+# URL "Raw" do seu Gist (Substitua pelo seu link real)
+URL_GIST = "https://gist.githubusercontent.com/Zhenriquee/1aa33c7f49b9871419411214002e33f1/raw/config.json"
+# Nome do arquivo local que guardará a licença
+ARQUIVO_LICENCA = 'license.key'
+
+# Intervalo mínimo entre duas checagens do mtime do arquivo (segundos)
+INTERVALO_CHECAGEM_ARQUIVO = 5
+# Backoff da renovação online: começa em 30s e dobra até 30 min
+BACKOFF_INICIAL = 30
+BACKOFF_MAXIMO = 30 * 60
+
+
+class EstadoLicenca:
+    """
+    Guarda em memória o veredito da licença.
+    O arquivo só é relido quando vira o dia ou quando o mtime muda,
+    e a renovação online roda numa thread separada (nunca na requisição).
+    """
+
+    def __init__(self, caminho, chave_secreta):
+        self.caminho = caminho
+        self.chave = chave_secreta.encode('utf-8')
+
+        self._trava = threading.Lock()
+        self._liberado = False
+        self._dia_validacao = None
+        self._mtime = None
+        self._ultima_checagem = 0.0
+
+        self._thread_renovacao = None
+        self._backoff = BACKOFF_INICIAL
+
+    # =========================================================
+    # --- ARQUIVO LOCAL ---
+    # =========================================================
+    def assinar_dados(self, dados_str):
+        """Gera uma assinatura HMAC para proteger o arquivo local"""
+        return hmac.new(self.chave, dados_str.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def salvar_licenca_offline(self, data_validade):
+        """Grava a data de validade + assinatura no disco"""
+        data_str = data_validade.strftime('%Y-%m-%d')
+        assinatura = self.assinar_dados(data_str)
+
+        with open(self.caminho, 'w') as f:
+            f.write(f"{data_str}|{assinatura}")
+
+    def validar_licenca_local(self):
+        """Verifica se o arquivo local é válido e não expirou"""
+        if not os.path.exists(self.caminho):
+            return False
+
+        try:
+            with open(self.caminho, 'r') as f:
+                conteudo = f.read().strip()
+
+            if '|' not in conteudo: return False
+
+            data_str, assinatura_lida = conteudo.split('|')
+
+            # 1. Checa adulteração
+            assinatura_real = self.assinar_dados(data_str)
+            if not hmac.compare_digest(assinatura_lida, assinatura_real):
+                return False
+
+            # 2. Checa data
+            validade = datetime.strptime(data_str, '%Y-%m-%d').date()
+            return date.today() <= validade
+        except Exception:
+            return False
+
+    def _mtime_arquivo(self):
+        try:
+            return os.stat(self.caminho).st_mtime
+        except OSError:
+            return None
+
+    # =========================================================
+    # --- RENOVAÇÃO ONLINE ---
+    # =========================================================
+    def tentar_renovar_online(self):
+        """Conecta no Gist para tentar renovar a licença"""
+        try:
+            # Timestamp na URL obriga o servidor a entregar a versão nova (sem cache)
+            url_fresca = f"{URL_GIST}?v={int(time.time())}"
+
+            print(f"Consultando Licença em: {url_fresca}") # Log para debug
+
+            response = requests.get(url_fresca, timeout=5)
+
+            if response.status_code == 200:
+                dados = response.json()
+                status = dados.get('status', 'bloqueado').lower()
+
+                print(f"Status Recebido: {status}") # Log para debug
+
+                if status == 'ativo':
+                    # Renovação: Validade até o final do PRÓXIMO mês
+                    hoje = date.today()
+                    proximo_mes = hoje + relativedelta(months=2)
+                    data_limite = proximo_mes.replace(day=1) - timedelta(days=1)
+
+                    self.salvar_licenca_offline(data_limite)
+                    return True
+                else:
+                    # Se estiver bloqueado no Gist, remove a licença local
+                    if os.path.exists(self.caminho):
+                        os.remove(self.caminho)
+                    return False
+            return False
+        except Exception as e:
+            print(f"Erro na renovação online: {e}")
+            return False # Sem internet ou erro
+
+    def _loop_renovacao(self):
+        """Tenta renovar com backoff exponencial até conseguir"""
+        while True:
+            if self.tentar_renovar_online():
+                with self._trava:
+                    self._revalidar()
+                    self._backoff = BACKOFF_INICIAL
+                    self._thread_renovacao = None
+                return
+
+            with self._trava:
+                espera = self._backoff
+                self._backoff = min(self._backoff * 2, BACKOFF_MAXIMO)
+            time.sleep(espera)
+
+            with self._trava:
+                # Alguém colocou uma licença válida no disco enquanto esperávamos
+                self._revalidar()
+                if self._liberado:
+                    self._thread_renovacao = None
+                    return
+
+    def _agendar_renovacao(self):
+        """Dispara a thread de renovação (apenas uma por vez). Chamar com a trava."""
+        if self._thread_renovacao is not None and self._thread_renovacao.is_alive():
+            return
+        self._thread_renovacao = threading.Thread(
+            target=self._loop_renovacao, name='renovacao-licenca', daemon=True
+        )
+        self._thread_renovacao.start()
+
+    # =========================================================
+    # --- VEREDITO EM MEMÓRIA ---
+    # =========================================================
+    def _revalidar(self):
+        """Relê o arquivo e atualiza o veredito. Chamar com a trava."""
+        self._mtime = self._mtime_arquivo()
+        self._liberado = self.validar_licenca_local()
+        self._dia_validacao = date.today()
+        self._ultima_checagem = time.monotonic()
+        if not self._liberado:
+            self._agendar_renovacao()
+
+    def liberado(self):
+        """
+        Checagem feita a cada requisição. No caminho comum não toca no disco:
+        só relê o arquivo se virou o dia ou se o mtime mudou.
+        """
+        agora = time.monotonic()
+        if self._dia_validacao == date.today() and agora - self._ultima_checagem < INTERVALO_CHECAGEM_ARQUIVO:
+            return self._liberado
+
+        with self._trava:
+            if self._dia_validacao != date.today() or self._mtime_arquivo() != self._mtime:
+                self._revalidar()
+            else:
+                self._ultima_checagem = agora
+            return self._liberado
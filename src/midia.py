@@ -0,0 +1,373 @@
+import os
+import time
+import queue
+import atexit
+import hashlib
+import tempfile
+import threading
+import traceback
+from io import BytesIO
+
+from flask import current_app, request, send_file
+from PIL import Image, ImageOps
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.uploads import ArquivoRecebido
+
+TAMANHO_BLOCO = 64 * 1024
+
+# Versões geradas de cada foto: (nome, lado maior em px), da maior para a menor
+TAMANHOS_FOTO = (('original', 2560), ('media', 1280), ('miniatura', 320))
+QUALIDADE_WEBP = 80
+
+
+# =========================================================
+# --- BACKENDS ---
+# =========================================================
+class ArmazenamentoLocal:
+    """
+    Arquivos numa pasta do servidor, endereçados pelo SHA-256 do conteúdo:
+    MIDIA_PASTA/ab/cd/abcd...  Arquivos iguais viram um só (deduplicação).
+    """
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+        self.pasta_temporaria = os.path.join(pasta, 'tmp') # mesmo disco: mover para o endereço final é atômico
+        os.makedirs(self.pasta_temporaria, exist_ok=True)
+
+    def caminho(self, hash_sha256):
+        return os.path.join(self.pasta, hash_sha256[:2], hash_sha256[2:4], hash_sha256)
+
+    def existe(self, hash_sha256):
+        return os.path.isfile(self.caminho(hash_sha256))
+
+    def salvar(self, fluxo):
+        """
+        Copia o fluxo em blocos para um temporário, calculando o hash no caminho,
+        e só então move para o endereço final (os.replace é atômico).
+        Retorna (hash, tamanho). Conteúdo vazio não é gravado.
+        """
+        if isinstance(fluxo, ArquivoRecebido):
+            return self._adotar(fluxo)
+
+        sha = hashlib.sha256()
+        tamanho = 0
+        descritor, temporario = tempfile.mkstemp(dir=self.pasta_temporaria)
+        try:
+            with os.fdopen(descritor, 'wb') as destino:
+                while True:
+                    bloco = fluxo.read(TAMANHO_BLOCO)
+                    if not bloco:
+                        break
+                    sha.update(bloco)
+                    destino.write(bloco)
+                    tamanho += len(bloco)
+                destino.flush()
+                os.fsync(destino.fileno())
+
+            hash_sha256 = sha.hexdigest()
+            if tamanho and not self.existe(hash_sha256):
+                os.makedirs(os.path.dirname(self.caminho(hash_sha256)), exist_ok=True)
+                os.replace(temporario, self.caminho(hash_sha256))
+            return hash_sha256, tamanho
+        finally:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+
+    def _adotar(self, recebido):
+        """Upload que já chegou no disco com hash e tamanho (src/uploads.py): só muda de lugar"""
+        recebido.finalizar()
+        hash_sha256 = recebido.hash_sha256
+        if recebido.tamanho and not self.existe(hash_sha256):
+            os.makedirs(os.path.dirname(self.caminho(hash_sha256)), exist_ok=True)
+            os.replace(recebido.caminho, self.caminho(hash_sha256))
+        return hash_sha256, recebido.tamanho
+
+    def abrir(self, hash_sha256):
+        return open(self.caminho(hash_sha256), 'rb')
+
+    def remover(self, hash_sha256):
+        try:
+            os.remove(self.caminho(hash_sha256))
+        except FileNotFoundError:
+            pass
+
+    def listar(self):
+        """Todos os hashes gravados (usado na limpeza de órfãos)"""
+        for raiz, pastas, arquivos in os.walk(self.pasta):
+            if raiz == self.pasta_temporaria:
+                pastas[:] = []
+                continue
+            for nome in arquivos:
+                if len(nome) == 64:
+                    yield nome
+
+
+# =========================================================
+# --- ARMAZENAMENTO DE MÍDIA ---
+# =========================================================
+class ArmazenamentoMidia:
+    """
+    Ponto único para gravar/ler fotos e anexos fora do banco. A linha no banco
+    guarda só os metadados e o hash; o conteúdo fica no backend configurado
+    (MIDIA_TIPO — por enquanto só 'local').
+    """
+
+    def __init__(self):
+        self.backend = None
+        self._referencias = []
+
+    def init_app(self, app):
+        tipo = app.config.get('MIDIA_TIPO', 'local')
+        if tipo != 'local':
+            raise ValueError(f"MIDIA_TIPO desconhecido: {tipo}")
+        self.backend = ArmazenamentoLocal(app.config['MIDIA_PASTA'])
+        self._referencias = []
+        app.extensions['armazenamento_midia'] = self
+
+    def salvar(self, fluxo):
+        return self.backend.salvar(fluxo)
+
+    def caminho(self, hash_sha256):
+        return self.backend.caminho(hash_sha256)
+
+    def existe(self, hash_sha256):
+        return self.backend.existe(hash_sha256)
+
+    def abrir(self, hash_sha256):
+        return self.backend.abrir(hash_sha256)
+
+    def remover(self, hash_sha256):
+        self.backend.remover(hash_sha256)
+
+    def listar(self):
+        return self.backend.listar()
+
+    @property
+    def pasta_temporaria(self):
+        return self.backend.pasta_temporaria
+
+    # =========================================================
+    # --- LIMPEZA (ARQUIVOS SEM REFERÊNCIA) ---
+    # =========================================================
+    def referenciar(self, *colunas):
+        """Registra colunas que guardam hashes deste armazenamento: arquivo citado nelas nunca é apagado"""
+        self._referencias.extend(colunas)
+
+    def hashes_em_uso(self, session, hashes=None):
+        """Hashes citados em alguma coluna registrada, opcionalmente só entre `hashes`"""
+        em_uso = set()
+        for coluna in self._referencias:
+            consulta = session.query(coluna).filter(coluna.isnot(None))
+            if hashes is not None:
+                consulta = consulta.filter(coluna.in_(hashes))
+            em_uso.update(h for (h,) in consulta.distinct())
+        return em_uso
+
+    def remover_sem_uso(self, session, hashes):
+        """Apaga os arquivos que mais nada referencia. Chamar DEPOIS do commit que soltou a referência."""
+        hashes = {h for h in hashes if h}
+        if not hashes:
+            return
+        for hash_sha256 in hashes - self.hashes_em_uso(session, hashes):
+            self.remover(hash_sha256)
+
+    def limpar_orfaos(self, session):
+        """Remove arquivos sem referência (ex.: itens/vendas apagados em cascata). Retorna a quantidade."""
+        em_uso = self.hashes_em_uso(session)
+        orfaos = [h for h in self.listar() if h not in em_uso]
+        for hash_sha256 in orfaos:
+            self.remover(hash_sha256)
+        return len(orfaos)
+
+
+# =========================================================
+# --- PROCESSAMENTO EM SEGUNDO PLANO ---
+# =========================================================
+class ProcessadorMidia:
+    """
+    Pool limitado de threads para o pós-processamento de mídia (versões, hash, dedup),
+    fora das 6 threads do waitress: a requisição grava o arquivo bruto e responde.
+
+    - Tarefas agendadas com apos_commit() só entram na fila quando a transação da
+      requisição é confirmada (a thread precisa enxergar a linha).
+    - Fila cheia não trava ninguém: a tarefa é descartada e a foto continua 'pendente'
+      (o "flask gerar-versoes-fotos" recolhe depois).
+    - No encerramento do processo a fila é drenada até MIDIA_ENCERRAR_TIMEOUT segundos.
+    MIDIA_PROCESSAMENTO = 'sincrono' executa na hora, na própria thread (CLI/depuração).
+    """
+
+    def __init__(self):
+        self.app = None
+        self.sincrono = False
+        self.qtd_threads = 2
+        self.timeout_encerrar = 30
+        self._fila = None
+        self._threads = []
+        self._trava = threading.Lock()
+        self._encerrando = False
+
+    def init_app(self, app):
+        self.app = app
+        self.sincrono = app.config.get('MIDIA_PROCESSAMENTO', 'segundo_plano') == 'sincrono'
+        self.qtd_threads = app.config.get('MIDIA_THREADS', 2)
+        self.timeout_encerrar = app.config.get('MIDIA_ENCERRAR_TIMEOUT', 30)
+        self._fila = queue.Queue(maxsize=app.config.get('MIDIA_FILA_MAX', 200))
+        app.extensions['processador_midia'] = self
+
+        if not event.contains(Session, 'after_commit', self._apos_commit):
+            event.listen(Session, 'after_commit', self._apos_commit)
+            event.listen(Session, 'after_rollback', self._apos_rollback)
+        atexit.register(self.encerrar)
+
+    # --- Agendamento ---
+    def apos_commit(self, session, funcao, *args):
+        """Enfileira funcao(*args) quando a transação atual da sessão for confirmada"""
+        session.info.setdefault('midia_tarefas', []).append((funcao, args))
+
+    def _apos_commit(self, session):
+        for funcao, args in session.info.pop('midia_tarefas', []):
+            self.enviar(funcao, *args)
+
+    def _apos_rollback(self, session):
+        session.info.pop('midia_tarefas', None)
+
+    def enviar(self, funcao, *args):
+        """Coloca a tarefa na fila. Retorna False se a fila estiver cheia ou o pool encerrando."""
+        if self.sincrono:
+            self._executar(funcao, args)
+            return True
+        if self._encerrando:
+            return False
+        self._iniciar_threads()
+        try:
+            self._fila.put_nowait((funcao, args))
+            return True
+        except queue.Full:
+            print(f"Fila de mídia cheia ({self._fila.maxsize}): {funcao.__name__}{args} fica para depois.")
+            return False
+
+    def pendentes(self):
+        return self._fila.qsize() if self._fila else 0
+
+    def aguardar(self):
+        """Bloqueia até a fila esvaziar (CLI e verificações)"""
+        if self._fila is not None and self._threads:
+            self._fila.join()
+
+    # --- Threads ---
+    def _iniciar_threads(self):
+        # Sobe sob demanda: comandos CLI que nunca enviam nada não criam threads
+        if self._threads:
+            return
+        with self._trava:
+            if self._threads:
+                return
+            for i in range(self.qtd_threads):
+                thread = threading.Thread(target=self._loop, name=f'processador-midia-{i + 1}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _loop(self):
+        while True:
+            tarefa = self._fila.get()
+            try:
+                if tarefa is None:
+                    return
+                self._executar(*tarefa)
+            finally:
+                self._fila.task_done()
+
+    def _executar(self, funcao, args):
+        try:
+            with self.app.app_context():
+                funcao(*args)
+        except Exception:
+            print(f"Erro no processamento de mídia ({funcao.__name__}{args}):")
+            traceback.print_exc()
+
+    def encerrar(self):
+        """Para de aceitar tarefas, termina as que estão na fila e espera as threads (com limite)"""
+        if self._encerrando or not self._threads:
+            return
+        self._encerrando = True
+        prazo = time.monotonic() + self.timeout_encerrar
+        for _ in self._threads:
+            try:
+                self._fila.put(None, timeout=max(0.1, prazo - time.monotonic()))
+            except queue.Full:
+                break
+        for thread in self._threads:
+            thread.join(max(0.0, prazo - time.monotonic()))
+
+
+# =========================================================
+# --- DERIVADOS DE IMAGEM ---
+# =========================================================
+def gerar_derivados(fluxo, tamanhos=TAMANHOS_FOTO):
+    """
+    Gera as versões da foto em WebP: orientação corrigida pela EXIF e sem metadados
+    (EXIF/GPS do celular não são copiados). Retorna {nome: BytesIO}, ou None se o
+    arquivo não for uma imagem que o Pillow consiga abrir.
+    """
+    try:
+        imagem = Image.open(fluxo)
+        maior = tamanhos[0][1]
+        imagem.draft('RGB', (maior, maior)) # JPEG: já decodifica reduzido (bem mais rápido e leve)
+        imagem = ImageOps.exif_transpose(imagem)
+        if imagem.mode not in ('RGB', 'RGBA'):
+            transparente = 'A' in imagem.mode or 'transparency' in imagem.info
+            imagem = imagem.convert('RGBA' if transparente else 'RGB')
+
+        versoes = {}
+        for nome, lado in tamanhos:
+            imagem = imagem.copy()
+            imagem.thumbnail((lado, lado), Image.LANCZOS)
+            saida = BytesIO()
+            imagem.save(saida, 'WEBP', quality=QUALIDADE_WEBP, method=4)
+            saida.seek(0)
+            versoes[nome] = saida
+        return versoes
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+# =========================================================
+# --- ENTREGA HTTP ---
+# =========================================================
+def enviar_arquivo(etag, abrir, mimetype=None, download_name=None, as_attachment=False, imutavel=True):
+    """
+    Resposta para arquivos que nunca mudam depois do upload (fotos e documentos só
+    são apagados, não editados): ETag forte, Cache-Control privado e imutável,
+    304 sem chamar `abrir` (nem tocar nos bytes) e suporte a Range.
+    `abrir` devolve o caminho no disco ou um BytesIO. Com imutavel=False (foto ainda
+    sendo processada) o navegador revalida a cada uso.
+    """
+    max_age = current_app.config.get('MIDIA_MAX_AGE', 31536000)
+
+    if request.if_none_match.contains(etag):
+        resposta = current_app.response_class(status=304)
+        resposta.set_etag(etag)
+    else:
+        resposta = send_file(
+            abrir(),
+            mimetype=mimetype,
+            as_attachment=as_attachment,
+            download_name=download_name,
+            etag=etag,
+            conditional=True,
+            max_age=max_age
+        )
+
+    # Só o navegador do usuário logado guarda (nunca proxies compartilhados)
+    resposta.cache_control.public = None
+    resposta.cache_control.private = True
+    if imutavel:
+        resposta.cache_control.max_age = max_age
+        resposta.cache_control.immutable = True
+    else:
+        resposta.cache_control.max_age = None
+        resposta.cache_control.no_cache = True
+        resposta.expires = None
+    return resposta
@@ -2,6 +2,7 @@ from src.extensoes import banco_de_dados as db
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+import threading
 import pytz
 
 def hora_brasilia():
@@ -15,6 +16,20 @@ usuario_modulos = db.Table('usuario_modulos',
     db.Column('modulo_id', db.Integer, db.ForeignKey('modulos.id'), primary_key=True)
 )
 
+# Cache de permissões compiladas por usuário: {usuario_id: (acesso_total, frozenset(codigos))}
+# Evita percorrer Colaborador -> Cargo -> Módulos a cada checagem. Deve ser
+# invalidado sempre que as permissões de um Cargo/Usuário ou o cargo de alguém mudarem.
+_cache_permissoes = {}
+_trava_permissoes = threading.Lock()
+
+def invalidar_permissoes(usuario_id=None):
+    """Descarta as permissões compiladas de um usuário (ou de todos, se None)"""
+    with _trava_permissoes:
+        if usuario_id is None:
+            _cache_permissoes.clear()
+        else:
+            _cache_permissoes.pop(usuario_id, None)
+
 class Modulo(db.Model):
     __tablename__ = 'modulos'
     id = db.Column(db.Integer, primary_key=True)
@@ -42,7 +57,8 @@ class Usuario(UserMixin, db.Model):
     criado_em = db.Column(db.DateTime, default=datetime.utcnow)
 
     # Relacionamento de permissões EXTRAS (além das do cargo)
-    permissoes = db.relationship('Modulo', secondary=usuario_modulos, lazy='subquery',
+    # lazy='select': só é lido ao compilar as permissões, não a cada carregamento da sessão
+    permissoes = db.relationship('Modulo', secondary=usuario_modulos, lazy='select',
         backref=db.backref('usuarios', lazy=True))
 
     # =================================================================
@@ -91,35 +107,41 @@ class Usuario(UserMixin, db.Model):
     def verificar_senha(self, senha):
         return check_password_hash(self.senha_hash, senha)
 
-    def tem_permissao(self, codigo_modulo):
+    def _compilar_permissoes(self):
         """
-        Verifica se o usuário pode acessar um módulo.
+        Monta o conjunto final de permissões do usuário.
         Ordem de Checagem:
         1. É Dono? (Acesso Total)
         2. O Cargo dele tem a permissão? (Herdado do Corporativo)
         3. Ele tem uma permissão manual extra?
         """
         # 1. Acesso Total (Dono ou Nível 1)
-        if self.nivel_acesso <= 1:
-            return True
-        
         cargo_nome = self.cargo.lower() if self.cargo else ''
-        if cargo_nome == 'dono':
-            return True
-            
-        # 2. Verifica Permissões do CARGO (Padrão)
+        acesso_total = self.nivel_acesso <= 1 or cargo_nome == 'dono'
+
+        codigos = set()
+        # 2. Permissões do CARGO (Padrão)
         if self.colaborador and self.colaborador.cargo_ref:
-            # Itera sobre os módulos vinculados ao Cargo
-            for mod in self.colaborador.cargo_ref.permissoes:
-                if mod.codigo == codigo_modulo:
-                    return True
-
-        # 3. Verifica Permissões MANUAIS (Exceções)
-        for mod in self.permissoes:
-            if mod.codigo == codigo_modulo:
-                return True
-        
-        return False
+            codigos.update(mod.codigo for mod in self.colaborador.cargo_ref.permissoes)
+
+        # 3. Permissões MANUAIS (Exceções)
+        codigos.update(mod.codigo for mod in self.permissoes)
+
+        return (acesso_total, frozenset(codigos))
+
+    @property
+    def permissoes_compiladas(self):
+        compiladas = _cache_permissoes.get(self.id)
+        if compiladas is None:
+            compiladas = self._compilar_permissoes()
+            with _trava_permissoes:
+                _cache_permissoes[self.id] = compiladas
+        return compiladas
+
+    def tem_permissao(self, codigo_modulo):
+        """Verifica se o usuário pode acessar um módulo (O(1), usa o cache compilado)"""
+        acesso_total, codigos = self.permissoes_compiladas
+        return acesso_total or codigo_modulo in codigos
 
     def __repr__(self):
         return f'<Usuario {self.usuario}>'
\ No newline at end of file
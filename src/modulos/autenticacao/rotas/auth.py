@@ -1,7 +1,7 @@
 from flask import render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
 from src.modulos.autenticacao import bp_autenticacao
-from src.modulos.autenticacao.modelos import Usuario
+from src.modulos.autenticacao.modelos import Usuario, invalidar_permissoes
 from src.modulos.autenticacao.formularios import FormularioLogin
 
 @bp_autenticacao.route('/login', methods=['GET', 'POST'])
@@ -20,6 +20,8 @@ def login():
                 return render_template('autenticacao/login.html', form=form)
             # ----------------------------------
 
+            # Recompila as permissões a cada login (pega alterações feitas fora do sistema)
+            invalidar_permissoes(user_banco.id)
             login_user(user_banco, remember=form.lembrar_de_mim.data)
             next_page = request.args.get('next')
             return redirect(next_page or url_for('dashboard.painel'))
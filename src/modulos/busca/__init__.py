@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+bp_busca = Blueprint('busca', __name__, url_prefix='/busca')
+
+from . import rotas
\ No newline at end of file
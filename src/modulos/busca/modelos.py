@@ -0,0 +1,22 @@
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+from src.extensoes import banco_de_dados as db
+
+
+class DocumentoBusca(db.Model):
+    """
+    Texto pesquisável de uma venda (com os itens), despesa ou colaborador, já sem
+    acentos e em minúsculas. Mantido pelo motor de busca a cada escrita nos modelos
+    de origem (ver motor.py); "flask reindexar-busca" reconstrói tudo.
+    """
+    __tablename__ = 'documentos_busca'
+
+    entidade = db.Column(db.String(20), primary_key=True)
+    entidade_id = db.Column(db.Integer, primary_key=True)
+    documento = db.Column(db.Text, nullable=False)
+    # Gerado pelo banco: palavras com radical em português, para busca textual ranqueada
+    vetor = db.Column(TSVECTOR, db.Computed("to_tsvector('portuguese'::regconfig, documento)", persisted=True))
+
+    __table_args__ = (
+        db.Index('ix_documentos_busca_vetor', 'vetor', postgresql_using='gin'),
+    )
@@ -0,0 +1,256 @@
+"""
+Motor de busca do sistema (vendas com seus itens, despesas e colaboradores).
+
+Cada registro pesquisável vira uma linha em documentos_busca com o texto já
+normalizado (minúsculas, sem acentos). A busca casa cada palavra digitada por
+trecho (LIKE, servido pelo índice de trigramas quando o pg_trgm está instalado)
+ou pela forma da palavra em português (tsvector, "pinturas" acha "pintura"), e o
+ranking usa ts_rank_cd mais a similaridade de trigramas.
+
+Os documentos são reconstruídos na mesma transação das escritas (eventos do
+flush). Cargas feitas direto em SQL precisam de "flask reindexar-busca".
+"""
+import re
+from dataclasses import dataclass
+
+from sqlalchemy import event, func, select, literal, literal_column, and_, or_, inspect, text
+from sqlalchemy.orm import Session
+
+from src.extensoes import banco_de_dados as db
+from src.modulos.busca.modelos import DocumentoBusca
+from src.modulos.vendas.modelos import Venda, ItemVenda
+from src.modulos.financeiro.modelos import Despesa
+from src.modulos.rh.modelos import Colaborador
+
+# Mesmo mapeamento em Python e no banco (translate + lower são IMMUTABLE e entram em índices)
+ACENTOS = 'ÁÀÂÃÄÉÈÊËÍÌÎÏÓÒÔÕÖÚÙÛÜÇÑáàâãäéèêëíìîïóòôõöúùûüçñ'
+SEM_ACENTOS = 'AAAAAEEEEIIIIOOOOOUUUUCNaaaaaeeeeiiiiooooouuuucn'
+_TABELA_ACENTOS = str.maketrans(ACENTOS, SEM_ACENTOS)
+
+CONFIGURACAO_TS = 'portuguese'
+LIMITE_PADRAO = 20
+CANDIDATOS_MAXIMOS = 1000
+
+
+def normalizar(texto):
+    return (texto or '').translate(_TABELA_ACENTOS).lower()
+
+
+def normalizar_sql(expressao):
+    """Equivalente SQL de normalizar(); o texto sai igual ao das expressões indexadas"""
+    return func.lower(func.translate(expressao, literal_column(f"'{ACENTOS}'"), literal_column(f"'{SEM_ACENTOS}'")))
+
+
+def palavras_da_busca(termo):
+    return re.findall(r'[a-z0-9]+', normalizar(termo))
+
+
+def _padrao_like(palavra):
+    return f'%{palavra}%' # palavras_da_busca só devolve [a-z0-9], nada a escapar
+
+
+# =========================================================
+# --- ENTIDADES PESQUISÁVEIS ---
+# =========================================================
+@dataclass
+class Entidade:
+    """Como montar o documento de um tipo de registro e quem pode vê-lo na busca"""
+    nome: str
+    coluna_id: object
+    documento: object # função () -> expressão SQL do texto, avaliada por linha de coluna_id
+    permissao: str
+
+
+def _documento_venda():
+    itens = select(func.string_agg(ItemVenda.descricao, literal_column("' '")))\
+        .where(ItemVenda.venda_id == Venda.id).scalar_subquery()
+    return func.concat_ws(literal_column("' '"), Venda.cliente_nome, Venda.descricao_servico, Venda.cor_nome_snapshot, itens)
+
+
+def _documento_despesa():
+    return Despesa.descricao
+
+
+def _documento_colaborador():
+    return func.concat_ws(literal_column("' '"), Colaborador.nome_completo, Colaborador.cpf)
+
+
+ENTIDADES = {
+    'venda': Entidade('venda', Venda.id, _documento_venda, 'gestao_acesso'),
+    'despesa': Entidade('despesa', Despesa.id, _documento_despesa, 'financeiro_acesso'),
+    'colaborador': Entidade('colaborador', Colaborador.id, _documento_colaborador, 'rh_acesso'),
+}
+
+# Modelo -> (colunas que entram no documento, função obj -> [(entidade, id)] afetados)
+_MONITORADOS = {
+    Venda: (('cliente_nome', 'descricao_servico', 'cor_nome_snapshot'), lambda obj, ant: [('venda', obj.id)]),
+    ItemVenda: (('descricao', 'venda_id'), lambda obj, ant: [('venda', v) for v in {obj.venda_id, *ant.get('venda_id', ())} if v]),
+    Despesa: (('descricao',), lambda obj, ant: [('despesa', obj.id)]),
+    Colaborador: (('nome_completo', 'cpf'), lambda obj, ant: [('colaborador', obj.id)]),
+}
+
+
+def reindexar(conexao, entidade, ids=None):
+    """Reconstrói os documentos de uma entidade (todos, ou só os ids dados) em duas instruções"""
+    definicao = ENTIDADES[entidade]
+    tabela = DocumentoBusca.__table__
+
+    apagar = tabela.delete().where(tabela.c.entidade == entidade)
+    documentos = select(literal(entidade), definicao.coluna_id, normalizar_sql(definicao.documento()))
+    if ids is not None:
+        ids = list(ids)
+        apagar = apagar.where(tabela.c.entidade_id.in_(ids))
+        documentos = documentos.where(definicao.coluna_id.in_(ids))
+
+    conexao.execute(apagar)
+    resultado = conexao.execute(tabela.insert().from_select(['entidade', 'entidade_id', 'documento'], documentos))
+    return resultado.rowcount
+
+
+def reindexar_tudo(conexao):
+    return {entidade: reindexar(conexao, entidade) for entidade in ENTIDADES}
+
+
+# =========================================================
+# --- ÍNDICES DE TRIGRAMAS (pg_trgm, OPCIONAL) ---
+# =========================================================
+INDICES_TRIGRAMA = {
+    'ix_documentos_busca_trgm': 'documentos_busca USING gin (documento gin_trgm_ops)',
+}
+
+
+_trigramas_por_banco = {}
+
+
+def trigramas_disponiveis(conexao):
+    """pg_trgm instalado neste banco? (sem ele a busca funciona, só sem índice para os trechos)"""
+    chave = str(conexao.engine.url)
+    if chave not in _trigramas_por_banco:
+        instalado = conexao.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first()
+        _trigramas_por_banco[chave] = instalado is not None
+    return _trigramas_por_banco[chave]
+
+
+def garantir_indices_trigrama(conexao):
+    """
+    Instala o pg_trgm (se o servidor tiver o contrib) e cria os índices de trigramas.
+    Devolve False quando a extensão não existe no servidor.
+    """
+    disponivel = conexao.execute(text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).first()
+    if disponivel is None:
+        return False
+    conexao.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    for nome, definicao in INDICES_TRIGRAMA.items():
+        conexao.execute(text(f'CREATE INDEX IF NOT EXISTS {nome} ON {definicao}'))
+    _trigramas_por_banco.pop(str(conexao.engine.url), None)
+    return True
+
+
+# =========================================================
+# --- CONSULTA ---
+# =========================================================
+def _casamento(palavras):
+    """Todas as palavras aparecem (por trecho) ou a frase casa pela forma das palavras"""
+    por_trecho = and_(*[DocumentoBusca.documento.like(_padrao_like(p)) for p in palavras])
+    return or_(por_trecho, DocumentoBusca.vetor.op('@@')(_consulta_ts(palavras)))
+
+
+def _consulta_ts(palavras):
+    # Prefixo em todas as palavras: a busca funciona enquanto se digita
+    return func.to_tsquery(literal_column(f"'{CONFIGURACAO_TS}'::regconfig"), ' & '.join(f'{p}:*' for p in palavras))
+
+
+def condicao(entidade, termo, coluna_id=None):
+    """
+    Filtro para as telas: "coluna_id está entre os registros da entidade que casam
+    com o termo". Termo sem nenhuma letra/número não casa com nada.
+    """
+    palavras = palavras_da_busca(termo)
+    coluna_id = coluna_id if coluna_id is not None else ENTIDADES[entidade].coluna_id
+    if not palavras:
+        return literal(False)
+    encontrados = select(DocumentoBusca.entidade_id)\
+        .where(DocumentoBusca.entidade == entidade, _casamento(palavras))
+    return coluna_id.in_(encontrados)
+
+
+def buscar(termo, entidades=None, limite=LIMITE_PADRAO):
+    """
+    Busca unificada e ranqueada. Devolve [(entidade, entidade_id, relevancia)], mais
+    relevantes primeiro (empate: registro mais novo primeiro). Termos muito comuns
+    ("peça") casam com boa parte da base: o ranking considera as CANDIDATOS_MAXIMOS
+    ocorrências mais recentes, para o custo não crescer com o tamanho da base.
+    """
+    palavras = palavras_da_busca(termo)
+    entidades = list(ENTIDADES) if entidades is None else list(entidades)
+    if not palavras or not entidades:
+        return []
+
+    candidatos = db.session.query(
+        DocumentoBusca.entidade, DocumentoBusca.entidade_id, DocumentoBusca.documento, DocumentoBusca.vetor
+    ).filter(DocumentoBusca.entidade.in_(entidades), _casamento(palavras))\
+        .order_by(DocumentoBusca.entidade_id.desc()).limit(CANDIDATOS_MAXIMOS).subquery()
+
+    relevancia = func.ts_rank_cd(candidatos.c.vetor, _consulta_ts(palavras))
+    if trigramas_disponiveis(db.session.connection()):
+        relevancia = relevancia + func.similarity(candidatos.c.documento, ' '.join(palavras))
+
+    linhas = db.session.query(candidatos.c.entidade, candidatos.c.entidade_id, relevancia.label('relevancia'))\
+        .order_by(relevancia.desc(), candidatos.c.entidade_id.desc())\
+        .limit(limite).all()
+    return [(e, i, float(r)) for e, i, r in linhas]
+
+
+# =========================================================
+# --- MANUTENÇÃO PELAS ESCRITAS ---
+# =========================================================
+def _afetados(session):
+    afetados = set()
+    for colecao, alterados in ((session.new, False), (session.dirty, True), (session.deleted, False)):
+        for obj in colecao:
+            regra = _MONITORADOS.get(type(obj))
+            if regra is None:
+                continue
+            colunas, alvos = regra
+            estado = inspect(obj)
+            anteriores = {}
+            if alterados:
+                mudou = False
+                for coluna in colunas:
+                    historico = estado.attrs[coluna].history
+                    if historico.has_changes():
+                        mudou = True
+                        anteriores[coluna] = [v for v in historico.deleted if v is not None]
+                if not mudou:
+                    continue
+            afetados.update(alvos(obj, anteriores))
+    return afetados
+
+
+def _apos_flush(session, flush_context):
+    session.info.setdefault('busca_afetados', set()).update(_afetados(session))
+
+
+def _apos_flush_executado(session, flush_context):
+    afetados = session.info.pop('busca_afetados', None)
+    if not afetados:
+        return
+    por_entidade = {}
+    for entidade, entidade_id in afetados:
+        por_entidade.setdefault(entidade, set()).add(entidade_id)
+    conexao = session.connection()
+    for entidade, ids in por_entidade.items():
+        reindexar(conexao, entidade, ids)
+
+
+def _carregar_valor_antigo(alvo, valor, anterior, iniciador):
+    return valor
+
+
+def monitorar_escritas():
+    """Liga a reconstrução dos documentos ao flush de qualquer sessão (idempotente)"""
+    if not event.contains(Session, 'after_flush', _apos_flush):
+        event.listen(Session, 'after_flush', _apos_flush)
+        event.listen(Session, 'after_flush_postexec', _apos_flush_executado)
+        # Item trocado de venda com o atributo expirado: sem isso a venda antiga não seria reindexada
+        event.listen(ItemVenda.venda_id, 'set', _carregar_valor_antigo, active_history=True, retval=True)
@@ -0,0 +1,66 @@
+from flask import request, jsonify, url_for
+from flask_login import login_required, current_user
+
+from src.modulos.busca import bp_busca
+from src.modulos.busca import motor
+from src.modulos.vendas.modelos import Venda
+from src.modulos.financeiro.modelos import Despesa
+from src.modulos.rh.modelos import Colaborador
+
+LIMITE_MAXIMO = 50
+
+
+def _resultados_vendas(ids):
+    vendas = Venda.query.with_entities(Venda.id, Venda.cliente_nome, Venda.status).filter(Venda.id.in_(ids))
+    return {v.id: {'titulo': f'#{v.id} - {v.cliente_nome}', 'detalhe': v.status,
+                   'url': url_for('vendas.listar_vendas', q=v.id)} for v in vendas}
+
+
+def _resultados_despesas(ids):
+    despesas = Despesa.query.with_entities(Despesa.id, Despesa.descricao, Despesa.status).filter(Despesa.id.in_(ids))
+    return {d.id: {'titulo': d.descricao, 'detalhe': d.status,
+                   'url': url_for('financeiro.painel', destaque_id=d.id)} for d in despesas}
+
+
+def _resultados_colaboradores(ids):
+    colaboradores = Colaborador.query.with_entities(Colaborador.id, Colaborador.nome_completo, Colaborador.cpf)\
+        .filter(Colaborador.id.in_(ids))
+    return {c.id: {'titulo': c.nome_completo, 'detalhe': c.cpf,
+                   'url': url_for('rh.perfil_colaborador', id=c.id)} for c in colaboradores}
+
+
+RESULTADOS = {
+    'venda': _resultados_vendas,
+    'despesa': _resultados_despesas,
+    'colaborador': _resultados_colaboradores,
+}
+
+
+@bp_busca.route('/api')
+@login_required
+def api_busca():
+    """
+    Busca unificada: ?q=termo&tipos=venda,despesa,colaborador&limite=20.
+    Só entram os tipos que o usuário pode acessar; resultados em ordem de relevância.
+    """
+    termo = request.args.get('q', '').strip()
+    pedidos = [t for t in request.args.get('tipos', '').split(',') if t] or list(motor.ENTIDADES)
+    if any(t not in motor.ENTIDADES for t in pedidos):
+        return jsonify({'erro': 'Tipo de busca inválido.'}), 400
+    limite = max(1, min(request.args.get('limite', motor.LIMITE_PADRAO, type=int), LIMITE_MAXIMO))
+
+    permitidos = [t for t in pedidos if current_user.tem_permissao(motor.ENTIDADES[t].permissao)]
+    encontrados = motor.buscar(termo, permitidos, limite) if len(termo) >= 2 else []
+
+    # Uma consulta por tipo para montar título/link, mantendo a ordem do ranking
+    ids_por_tipo = {}
+    for entidade, entidade_id, _ in encontrados:
+        ids_por_tipo.setdefault(entidade, []).append(entidade_id)
+    dados = {entidade: RESULTADOS[entidade](ids) for entidade, ids in ids_por_tipo.items()}
+
+    resultados = []
+    for entidade, entidade_id, relevancia in encontrados:
+        item = dados[entidade].get(entidade_id)
+        if item:
+            resultados.append({'tipo': entidade, 'id': entidade_id, 'relevancia': round(relevancia, 4), **item})
+    return jsonify({'resultados': resultados})
@@ -4,7 +4,7 @@ from sqlalchemy import func # <--- IMPORTANTE: Usado para checar maiúsculas/min
 from src.extensoes import banco_de_dados as db
 from src.modulos.autenticacao.permissoes import cargo_exigido
 from src.modulos.corporativo.modelos import Setor, Cargo
-from src.modulos.autenticacao.modelos import Modulo
+from src.modulos.autenticacao.modelos import Modulo, invalidar_permissoes
 from src.modulos.corporativo.formularios import FormularioSetor, FormularioCargo
 from . import bp_corporativo
 
@@ -133,6 +133,7 @@ def editar_cargo(id):
             cargo.permissoes = []
 
         db.session.commit()
+        invalidar_permissoes() # Nível/permissões do cargo mudaram para todos que o usam
         flash('Cargo atualizado com sucesso!', 'success')
     else:
         flash('Erro ao atualizar cargo. Verifique os campos.', 'error')
@@ -0,0 +1,187 @@
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from dateutil.relativedelta import relativedelta
+from decimal import Decimal
+import calendar
+
+from sqlalchemy import func, select
+
+from src.extensoes import banco_de_dados as db
+from src.periodos import periodo_dia, periodo_mes, periodo_meses, hoje_brasilia
+from src.modulos.vendas.modelos import Venda, Pagamento
+from src.modulos.financeiro.modelos import Despesa
+from src.modulos.metas.modelos import MetaMensal
+
+NOMES_MESES = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
+MESES_GRAFICO = 6
+DIAS_AVISO_VENCIMENTO = 5
+
+
+@dataclass
+class AlertaDespesa:
+    """Só o que o modal de alertas exibe (sem objeto ORM, pode ir para o cache)"""
+    id: int
+    descricao: str
+    valor: Decimal
+    data_vencimento: date
+
+
+@dataclass
+class SnapshotDashboard:
+    """Todos os indicadores financeiros do painel, calculados de uma vez"""
+    recebido_mes: float = 0.0
+    recebido_ate_ontem: float = 0.0
+    recebido_hoje: float = 0.0
+    vendido_hoje: float = 0.0
+    a_receber: float = 0.0
+    a_pagar_mes: float = 0.0
+    qtd_vendas_mes: int = 0
+    faturamento_mes: float = 0.0
+
+    meta_valor_mes: float = 1.0
+    meta_diaria_alvo: float = 0.0
+
+    lista_vencidos: list = field(default_factory=list)
+    lista_proximos: list = field(default_factory=list)
+
+    chart_labels: list = field(default_factory=list)
+    chart_vendas: list = field(default_factory=list)
+    chart_despesas: list = field(default_factory=list)
+    doughnut_labels: list = field(default_factory=list)
+    doughnut_data: list = field(default_factory=list)
+
+    @property
+    def ticket_medio(self):
+        return (self.faturamento_mes / self.qtd_vendas_mes) if self.qtd_vendas_mes > 0 else 0
+
+    @property
+    def atingimento_dia_perc(self):
+        return (self.recebido_hoje / self.meta_diaria_alvo) * 100 if self.meta_diaria_alvo > 0 else 0
+
+    @property
+    def perc_meta_mes(self):
+        return (self.recebido_mes / self.meta_valor_mes) * 100 if self.meta_valor_mes > 0 else 0
+
+
+def _dias_uteis_restantes(meta, hoje):
+    """Conta os dias úteis do mês a partir de HOJE (incluindo hoje)"""
+    dias_trabalho = [int(d) for d in meta.config_semana.split(',')] if meta.config_semana else []
+    feriados = []
+    if meta.config_feriados:
+        try:
+            feriados = [int(d) for d in meta.config_feriados.replace('.', ',').split(',') if d.strip().isdigit()]
+        except:
+            pass
+
+    restantes = 0
+    for semana in calendar.monthcalendar(hoje.year, hoje.month):
+        for dia_idx, dia_numero in enumerate(semana):
+            if dia_numero != 0 and dia_numero >= hoje.day:
+                if dia_idx in dias_trabalho and dia_numero not in feriados:
+                    restantes += 1
+    return restantes
+
+
+def calcular_snapshot(hoje=None):
+    """
+    Calcula os KPIs do painel em 6 consultas agrupadas (antes eram ~20),
+    sempre com filtros de intervalo (>= início AND < fim) nas colunas de data.
+    """
+    hoje = hoje or hoje_brasilia()
+    snap = SnapshotDashboard()
+
+    intervalo_dia = periodo_dia(hoje)
+    intervalo_mes = periodo_mes(hoje.month, hoje.year)
+    janela = periodo_meses(hoje.month, hoje.year, MESES_GRAFICO)
+
+    venda_ativa = (Venda.status != 'cancelado', Venda.status != 'orcamento')
+
+    # 1. Escalares: vendas do mês/hoje + A Receber + A Pagar (uma ida ao banco)
+    sub_a_receber = select(func.coalesce(func.sum(Venda.valor_restante), 0))\
+        .where(Venda.valor_restante > 0, *venda_ativa).scalar_subquery()
+    sub_a_pagar = select(func.coalesce(func.sum(Despesa.valor), 0))\
+        .where(Despesa.status == 'pendente', intervalo_mes.antes_de(Despesa.data_vencimento)).scalar_subquery()
+
+    qtd_mes, fat_mes, vendido_hoje, a_receber, a_pagar = db.session.query(
+        func.count(Venda.id),
+        func.coalesce(func.sum(Venda.valor_final), 0),
+        func.coalesce(func.sum(Venda.valor_final).filter(intervalo_dia.filtro(Venda.criado_em)), 0),
+        sub_a_receber,
+        sub_a_pagar
+    ).filter(
+        intervalo_mes.filtro(Venda.criado_em),
+        *venda_ativa
+    ).one()
+
+    snap.qtd_vendas_mes = int(qtd_mes or 0)
+    snap.faturamento_mes = float(fat_mes)
+    snap.vendido_hoje = float(vendido_hoje)
+    snap.a_receber = float(a_receber)
+    snap.a_pagar_mes = float(a_pagar)
+
+    # 2. Recebimentos por mês da janela do gráfico (inclui mês atual, até ontem e hoje)
+    mes_p = func.date_trunc('month', Pagamento.data_pagamento).label('mes')
+    recebimentos = db.session.query(
+        mes_p,
+        func.sum(Pagamento.valor),
+        func.sum(Pagamento.valor).filter(Pagamento.data_pagamento < intervalo_dia.inicio),
+        func.sum(Pagamento.valor).filter(intervalo_dia.filtro(Pagamento.data_pagamento))
+    ).join(Venda, Pagamento.venda_id == Venda.id).filter(
+        janela.filtro(Pagamento.data_pagamento),
+        *venda_ativa
+    ).group_by(mes_p).all()
+    mapa_recebido = {(m.year, m.month): float(total or 0) for m, total, _, _ in recebimentos}
+
+    for mes, total, ate_ontem, do_dia in recebimentos:
+        if (mes.year, mes.month) == (hoje.year, hoje.month):
+            snap.recebido_mes = float(total or 0)
+            snap.recebido_ate_ontem = float(ate_ontem or 0)
+            snap.recebido_hoje = float(do_dia or 0)
+
+    # 3. Despesas pagas por mês da janela do gráfico
+    mes_d = func.date_trunc('month', Despesa.data_pagamento).label('mes')
+    despesas_pagas = db.session.query(mes_d, func.sum(Despesa.valor)).filter(
+        Despesa.status == 'pago',
+        janela.filtro(Despesa.data_pagamento)
+    ).group_by(mes_d).all()
+    mapa_pago = {(m.year, m.month): float(total or 0) for m, total in despesas_pagas}
+
+    for i in range(MESES_GRAFICO - 1, -1, -1):
+        data_ref = hoje - relativedelta(months=i)
+        chave = (data_ref.year, data_ref.month)
+        snap.chart_labels.append(NOMES_MESES[data_ref.month - 1])
+        snap.chart_vendas.append(mapa_recebido.get(chave, 0.0))
+
+        soma_d = mapa_pago.get(chave, 0.0)
+        if chave == (hoje.year, hoje.month):
+            soma_d += snap.a_pagar_mes # Pendentes que vencem até o fim do mês atual
+        snap.chart_despesas.append(soma_d)
+
+    # 4. Custos do mês por categoria (gráfico de rosca)
+    categorias = db.session.query(Despesa.categoria, func.sum(Despesa.valor)).filter(
+        intervalo_mes.filtro(Despesa.data_vencimento)
+    ).group_by(Despesa.categoria).all()
+    snap.doughnut_labels = [c[0].title() for c in categorias]
+    snap.doughnut_data = [float(c[1]) for c in categorias]
+
+    # 5. Alertas: vencidas + que vencem nos próximos dias (uma consulta, separadas em memória)
+    limite_aviso = hoje + timedelta(days=DIAS_AVISO_VENCIMENTO)
+    alertas = db.session.query(
+        Despesa.id, Despesa.descricao, Despesa.valor, Despesa.data_vencimento
+    ).filter(
+        Despesa.status == 'pendente',
+        Despesa.data_vencimento <= limite_aviso
+    ).order_by(Despesa.data_vencimento.asc()).all()
+    alertas = [AlertaDespesa(*a) for a in alertas]
+    snap.lista_vencidos = [d for d in alertas if d.data_vencimento < hoje]
+    snap.lista_proximos = [d for d in alertas if d.data_vencimento >= hoje]
+
+    # 6. Meta do mês e meta diária dinâmica (redistribui o rombo ou superávit)
+    meta = MetaMensal.query.filter_by(mes=hoje.month, ano=hoje.year).first()
+    if meta:
+        snap.meta_valor_mes = float(meta.valor_loja)
+        dias_restantes = _dias_uteis_restantes(meta, hoje)
+        if dias_restantes > 0:
+            snap.meta_diaria_alvo = max(0.0, (snap.meta_valor_mes - snap.recebido_ate_ontem) / dias_restantes)
+
+    return snap
@@ -1,16 +1,14 @@
 from flask import render_template
 from flask_login import login_required, current_user
-from sqlalchemy import func, extract, desc
-from sqlalchemy.orm import joinedload
-from datetime import date, timedelta, datetime
-from dateutil.relativedelta import relativedelta
-import calendar
+from sqlalchemy import func, desc
+from datetime import timedelta
 
-from src.extensoes import banco_de_dados as db
-from src.modulos.vendas.modelos import Venda, Pagamento, ItemVenda
-from src.modulos.financeiro.modelos import Despesa
-from src.modulos.metas.modelos import MetaMensal
+from src.extensoes import banco_de_dados as db, cache_agregados
+from src.modulos.vendas.modelos import Venda, ItemVenda
 from src.modulos.dashboard import bp_dashboard
+from src.modulos.dashboard.metricas import SnapshotDashboard, calcular_snapshot
+from src.modulos.operacional.servicos import contar_tarefas, listar_tarefas, tarefas_atrasadas
+from src.periodos import hoje_brasilia
 from src.modulos.estoque.modelos import ProdutoEstoque
 
 def fmt_moeda(valor):
@@ -20,32 +18,9 @@ def fmt_moeda(valor):
 @bp_dashboard.route('/')
 @login_required
 def painel():
-    hoje = date.today()
-    mes_atual = hoje.month
-    ano_atual = hoje.year
+    hoje = hoje_brasilia()
 
-    # Inicialização segura de todas as variáveis
-    recebido_mes = 0
-    a_receber = 0
-    vendas_hoje = 0
-    recebido_hoje = 0
-    vendido_hoje = 0
-    meta_diaria_alvo = 0
-    atingimento_dia_perc = 0
-    a_pagar_mes = 0
-    qtd_vencidos = 0
-    qtd_proximos = 0
-    lista_vencidos = []
-    lista_proximos = []
-    ticket_medio = 0
-    meta_valor_mes = 0
-    perc_meta_mes = 0
-    
-    chart_labels = []
-    chart_data_vendas = []
-    chart_data_despesas = []
-    doughnut_labels = []
-    doughnut_data = []
+    snap = SnapshotDashboard(meta_valor_mes=0)
 
     # Verifica permissões individuais
     pode_ver_fluxo = current_user.tem_permissao('dash_graf_fluxo')
@@ -64,226 +39,25 @@ def painel():
     #pode_ver_graficos = current_user.tem_permissao('dash_graficos')
 
     if pode_ver_dados_financeiros:
-        recebido_mes = db.session.query(func.sum(Pagamento.valor))\
-            .join(Venda, Pagamento.venda_id == Venda.id)\
-            .filter(
-                extract('month', Pagamento.data_pagamento) == mes_atual, 
-                extract('year', Pagamento.data_pagamento) == ano_atual,
-                Venda.status != 'cancelado',
-                Venda.status != 'orcamento'
-            ).scalar() or 0
-
-        # 2. A Receber Geral (Soma estrita do saldo restante apenas de vendas ativas)
-        vendas_ativas_dash = Venda.query.filter(
-            Venda.status != 'cancelado', 
-            Venda.status != 'orcamento'
-        ).all()
-        a_receber = sum(float(v.valor_restante) for v in vendas_ativas_dash)
-
-        # =======================================================
-        # MUDANÇA: CÁLCULO DA META DIÁRIA DINÂMICA
-        # =======================================================
-        meta_config = MetaMensal.query.filter_by(mes=mes_atual, ano=ano_atual).first()
-        meta_valor_mes = float(meta_config.valor_loja) if meta_config else 1
-        
-        if meta_config:
-            dias_trabalho = [int(d) for d in meta_config.config_semana.split(',')] if meta_config.config_semana else []
-            feriados = []
-            if meta_config.config_feriados:
-                try:
-                    feriados = [int(d) for d in meta_config.config_feriados.replace('.',',').split(',') if d.strip().isdigit()]
-                except:
-                    pass
-
-            cal = calendar.monthcalendar(ano_atual, mes_atual)
-            dias_uteis_restantes = 0
-            
-            # Conta os dias úteis a partir de HOJE (incluindo hoje)
-            for semana in cal:
-                for dia_idx, dia_numero in enumerate(semana):
-                    if dia_numero != 0 and dia_numero >= hoje.day:
-                        if dia_idx in dias_trabalho and dia_numero not in feriados:
-                            dias_uteis_restantes += 1
-
-            # Soma tudo que foi recebido ATÉ ONTEM
-            recebido_ate_ontem = db.session.query(func.sum(Pagamento.valor))\
-                .join(Venda, Pagamento.venda_id == Venda.id)\
-                .filter(
-                    extract('month', Pagamento.data_pagamento) == mes_atual, 
-                    extract('year', Pagamento.data_pagamento) == ano_atual,
-                    func.date(Pagamento.data_pagamento) < hoje,
-                    Venda.status != 'cancelado',
-                    Venda.status != 'orcamento'
-                ).scalar() or 0
-
-            # Calcula o alvo do dia redistribuindo o rombo (ou superávit)
-            if dias_uteis_restantes > 0:
-                meta_diaria_alvo = (meta_valor_mes - float(recebido_ate_ontem)) / dias_uteis_restantes
-            else:
-                meta_diaria_alvo = 0
-                
-            if meta_diaria_alvo < 0:
-                meta_diaria_alvo = 0 # Meta batida, folga!
-        else:
-            meta_diaria_alvo = 0
-
-        # 3. Recebido Hoje (Ignorando pagamentos de vendas canceladas)
-        recebido_hoje = db.session.query(func.sum(Pagamento.valor))\
-            .join(Venda, Pagamento.venda_id == Venda.id)\
-            .filter(
-                func.date(Pagamento.data_pagamento) == hoje,
-                Venda.status != 'cancelado',
-                Venda.status != 'orcamento'
-            ).scalar() or 0
-
-        # 4. Vendido Hoje (Isso já estava ignorando canceladas corretamente)
-        vendido_hoje = db.session.query(func.sum(Venda.valor_final))\
-            .filter(
-                func.date(Venda.criado_em) == hoje,
-                Venda.status != 'cancelado', 
-                Venda.status != 'orcamento'
-            ).scalar() or 0
-        
-        atingimento_dia_perc = (float(recebido_hoje) / meta_diaria_alvo) * 100 if meta_diaria_alvo > 0 else 0
-
-        ultimo_dia_mes_atual = date(ano_atual, mes_atual, calendar.monthrange(ano_atual, mes_atual)[1])
-        a_pagar_mes = db.session.query(func.sum(Despesa.valor))\
-            .filter(Despesa.data_vencimento <= ultimo_dia_mes_atual,
-                    Despesa.status == 'pendente').scalar() or 0
-
-        lista_vencidos = Despesa.query.filter(Despesa.status == 'pendente', Despesa.data_vencimento < hoje).order_by(Despesa.data_vencimento.asc()).all()
-        limite_aviso = hoje + timedelta(days=5)
-        lista_proximos = Despesa.query.filter(Despesa.status == 'pendente', Despesa.data_vencimento >= hoje, Despesa.data_vencimento <= limite_aviso).order_by(Despesa.data_vencimento.asc()).all()
-        qtd_vencidos = len(lista_vencidos)
-        qtd_proximos = len(lista_proximos)
-
-        qtd_vendas_mes = db.session.query(func.count(Venda.id))\
-            .filter(extract('month', Venda.criado_em) == mes_atual, 
-                    extract('year', Venda.criado_em) == ano_atual,
-                    Venda.status != 'cancelado', Venda.status != 'orcamento').scalar() or 0
-        
-        faturamento_mes = db.session.query(func.sum(Venda.valor_final))\
-            .filter(extract('month', Venda.criado_em) == mes_atual, 
-                    extract('year', Venda.criado_em) == ano_atual,
-                    Venda.status != 'cancelado', Venda.status != 'orcamento').scalar() or 0
-        
-        ticket_medio = (float(faturamento_mes) / qtd_vendas_mes) if qtd_vendas_mes > 0 else 0
-        perc_meta_mes = (float(recebido_mes) / meta_valor_mes) * 100 if meta_valor_mes > 0 else 0
+        # Números da loja inteira: iguais para todos, então vêm do cache compartilhado
+        chave = cache_agregados.chave('dashboard', hoje.year, hoje.month, hoje.day)
+        snap = cache_agregados.obter_ou_calcular(chave, lambda: calcular_snapshot(hoje))
 
-        # Processa os gráficos apenas se tiver a permissão dash_graficos
-        # Processa Gráfico de Linhas (Fluxo)
-        if pode_ver_fluxo:
-            for i in range(5, -1, -1):
-                data_ref = hoje - relativedelta(months=i)
-                mes_iter = data_ref.month
-                ano_iter = data_ref.year
-                nome_mes = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez'][mes_iter-1]
-                chart_labels.append(nome_mes)
-
-                soma_v = db.session.query(func.sum(Pagamento.valor))\
-                    .join(Venda, Pagamento.venda_id == Venda.id)\
-                    .filter(
-                        extract('month', Pagamento.data_pagamento) == mes_iter, 
-                        extract('year', Pagamento.data_pagamento) == ano_iter,
-                        Venda.status != 'cancelado',
-                        Venda.status != 'orcamento'
-                    ).scalar() or 0
-                chart_data_vendas.append(float(soma_v))
-
-                soma_d_pago = db.session.query(func.sum(Despesa.valor))\
-                    .filter(Despesa.status == 'pago',
-                            extract('month', Despesa.data_pagamento) == mes_iter, 
-                            extract('year', Despesa.data_pagamento) == ano_iter).scalar() or 0
-                
-                soma_d_pendente = 0
-                if mes_iter == mes_atual and ano_iter == ano_atual:
-                    ultimo_dia_iter = date(ano_iter, mes_iter, calendar.monthrange(ano_iter, mes_iter)[1])
-                    soma_d_pendente = db.session.query(func.sum(Despesa.valor))\
-                        .filter(Despesa.status == 'pendente',
-                                Despesa.data_vencimento <= ultimo_dia_iter).scalar() or 0
-
-                soma_d = float(soma_d_pago) + float(soma_d_pendente)
-                chart_data_despesas.append(soma_d)
-
-        # Processa Gráfico de Rosca (Custos)
-        if pode_ver_custos:
-            cats_db = db.session.query(Despesa.categoria, func.sum(Despesa.valor))\
-                .filter(extract('month', Despesa.data_vencimento) == mes_atual,
-                        extract('year', Despesa.data_vencimento) == ano_atual)\
-                .group_by(Despesa.categoria).all()
-            doughnut_labels = [c[0].title() for c in cats_db]
-            doughnut_data = [float(c[1]) for c in cats_db]
+    # Os gráficos só são enviados para quem tem a permissão correspondente
+    chart_labels = snap.chart_labels if pode_ver_fluxo else []
+    chart_vendas = snap.chart_vendas if pode_ver_fluxo else []
+    chart_despesas = snap.chart_despesas if pode_ver_fluxo else []
+    doughnut_labels = snap.doughnut_labels if pode_ver_custos else []
+    doughnut_data = snap.doughnut_data if pode_ver_custos else []
 
     # =================================================================
     # --- INDICADORES OPERACIONAIS ---
     # =================================================================
     
-    def formatar_tarefa(obj, tipo):
-        if tipo == 'item': 
-            return {
-                'id': obj.id,
-                'descricao': obj.descricao,
-                'venda_id': obj.venda_id,
-                'cliente_nome': obj.venda.cliente_nome,
-                'quantidade': obj.quantidade,
-                'data_criacao': obj.venda.criado_em
-            }
-        else: 
-            return {
-                'id': obj.id,
-                'descricao': obj.descricao_servico,
-                'venda_id': obj.id,
-                'cliente_nome': obj.cliente_nome,
-                'quantidade': obj.quantidade_pecas,
-                'data_criacao': obj.criado_em
-            }
-
-    itens_multi = db.session.query(ItemVenda).join(Venda).filter(
-        Venda.status != 'cancelado', 
-        Venda.status != 'orcamento',
-        Venda.modo == 'multipla'
-    ).options(joinedload(ItemVenda.venda)).all()
-
-    vendas_simples = Venda.query.filter(
-        Venda.modo == 'simples',
-        Venda.status != 'cancelado', 
-        Venda.status != 'orcamento'
-    ).all()
-
-    op_fila = []
-    op_execucao = []
-    op_retrabalho = []
-    op_prontos = []
-    op_finalizados = []
-
-    for i in itens_multi:
-        tarefa = formatar_tarefa(i, 'item')
-        if i.status == 'pendente': op_fila.append(tarefa)
-        elif i.status == 'producao': op_execucao.append(tarefa)
-        elif i.status == 'retrabalho': op_retrabalho.append(tarefa)
-        elif i.status == 'pronto': op_prontos.append(tarefa)
-        elif i.status == 'entregue': 
-            if i.data_entregue and i.data_entregue.month == mes_atual and i.data_entregue.year == ano_atual:
-                op_finalizados.append(tarefa)
-
-    for v in vendas_simples:
-        tarefa = formatar_tarefa(v, 'venda')
-        if v.status == 'pendente': op_fila.append(tarefa)
-        elif v.status == 'producao': op_execucao.append(tarefa)
-        elif v.status == 'retrabalho': op_retrabalho.append(tarefa)
-        elif v.status == 'pronto': op_prontos.append(tarefa)
-        elif v.status == 'entregue':
-            if v.data_entrega and v.data_entrega.month == mes_atual and v.data_entrega.year == ano_atual:
-                op_finalizados.append(tarefa)
-
-    op_atrasados = []
-    limite_atraso = datetime.utcnow() - timedelta(days=5)
-    
-    for tarefa in op_fila + op_execucao + op_retrabalho:
-        if tarefa['data_criacao'] and tarefa['data_criacao'] <= limite_atraso:
-            op_atrasados.append(tarefa)
-            
-    qtd_atrasados = len(op_atrasados)
+    # Fila de produção: contagens numa consulta agrupada; listas só das tarefas em aberto e das entregues no mês
+    contagem = contar_tarefas(hoje)
+    listas = listar_tarefas(hoje)
+    op_atrasados = tarefas_atrasadas()
 
     data_limite_30_dias = hoje - timedelta(days=30)
     
@@ -299,40 +73,40 @@ def painel():
             .limit(5).all()
 
     return render_template('dashboard/painel.html',
-                           kpi_recebido=fmt_moeda(recebido_mes),
-                           kpi_receber=fmt_moeda(a_receber),
-                           vendas_hoje=fmt_moeda(recebido_hoje), 
-                           valor_vendido_hoje=fmt_moeda(vendido_hoje), 
-                           meta_diaria_alvo=fmt_moeda(meta_diaria_alvo),
-                           atingimento_dia_perc=round(atingimento_dia_perc, 2),
-                           kpi_pagar=fmt_moeda(a_pagar_mes),
-                           qtd_vencidos=qtd_vencidos,
-                           qtd_proximos=qtd_proximos,
-                           lista_vencidos=lista_vencidos,
-                           lista_proximos=lista_proximos,
+                           kpi_recebido=fmt_moeda(snap.recebido_mes),
+                           kpi_receber=fmt_moeda(snap.a_receber),
+                           vendas_hoje=fmt_moeda(snap.recebido_hoje), 
+                           valor_vendido_hoje=fmt_moeda(snap.vendido_hoje), 
+                           meta_diaria_alvo=fmt_moeda(snap.meta_diaria_alvo),
+                           atingimento_dia_perc=round(snap.atingimento_dia_perc, 2),
+                           kpi_pagar=fmt_moeda(snap.a_pagar_mes),
+                           qtd_vencidos=len(snap.lista_vencidos),
+                           qtd_proximos=len(snap.lista_proximos),
+                           lista_vencidos=snap.lista_vencidos,
+                           lista_proximos=snap.lista_proximos,
                            
-                           op_fila=op_fila,
-                           op_execucao=op_execucao,
-                           op_retrabalho=op_retrabalho,
-                           op_prontos=op_prontos,
-                           op_finalizados=op_finalizados,
+                           op_fila=listas['pendente'],
+                           op_execucao=listas['producao'],
+                           op_retrabalho=listas['retrabalho'],
+                           op_prontos=listas['pronto'],
+                           op_finalizados=listas['entregue'],
                            op_atrasados=op_atrasados, 
-                           qtd_atrasados=qtd_atrasados,
+                           qtd_atrasados=contagem.atrasados,
                            
-                           qtd_fila=len(op_fila),
-                           qtd_execucao=len(op_execucao),
-                           qtd_retrabalho=len(op_retrabalho),
-                           qtd_prontos=len(op_prontos),
-                           qtd_finalizados=len(op_finalizados),
+                           qtd_fila=contagem.pendente,
+                           qtd_execucao=contagem.producao,
+                           qtd_retrabalho=contagem.retrabalho,
+                           qtd_prontos=contagem.pronto,
+                           qtd_finalizados=contagem.entregues_mes,
 
-                           ticket_medio=fmt_moeda(ticket_medio),
+                           ticket_medio=fmt_moeda(snap.ticket_medio),
                            top_produtos=top_produtos,
 
                            chart_labels=chart_labels,
-                           chart_vendas=chart_data_vendas,
-                           chart_despesas=chart_data_despesas,
+                           chart_vendas=chart_vendas,
+                           chart_despesas=chart_despesas,
                            doughnut_labels=doughnut_labels,
                            doughnut_data=doughnut_data,
-                           meta_valor=fmt_moeda(meta_valor_mes),
-                           perc_meta=round(perc_meta_mes, 2),
+                           meta_valor=fmt_moeda(snap.meta_valor_mes),
+                           perc_meta=round(snap.perc_meta_mes, 2),
                            fmt_moeda=fmt_moeda)
\ No newline at end of file
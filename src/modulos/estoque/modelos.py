@@ -40,4 +40,27 @@ class MovimentacaoEstoque(db.Model):
     data_movimentacao = db.Column(db.DateTime, default=datetime.utcnow)
     observacao = db.Column(db.String(255))
     
-    usuario = db.relationship('Usuario')
\ No newline at end of file
+    usuario = db.relationship('Usuario')
+
+    __table_args__ = (
+        db.Index('ix_mov_estoque_produto_data', 'produto_id', 'data_movimentacao'),
+        db.Index('ix_mov_estoque_referencia', 'referencia_id', 'origem', 'tipo'),
+    )
+
+class FechamentoEstoque(db.Model):
+    """
+    Saldo de cada produto num corte mensal (1º dia do mês, 00:00), gravado por
+    "flask fechar-estoque". Saldo numa data e conciliação partem do corte mais
+    próximo em vez de refazer o histórico inteiro.
+    """
+    __tablename__ = 'fechamentos_estoque'
+
+    id = db.Column(db.Integer, primary_key=True)
+    produto_id = db.Column(db.Integer, db.ForeignKey('produtos_estoque.id', ondelete='CASCADE'), nullable=False)
+    data_corte = db.Column(db.DateTime, nullable=False) # saldo antes de qualquer movimentação a partir daqui
+    saldo = db.Column(db.Numeric(10, 3), nullable=False)
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('produto_id', 'data_corte', name='ux_fechamentos_estoque_produto_corte'),
+    )
\ No newline at end of file
@@ -1,11 +1,19 @@
 from flask import render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
+from datetime import date, datetime, time, timedelta
 from src.extensoes import banco_de_dados as db
+from src.paginacao import paginar_keyset
 from src.modulos.estoque import bp_estoque
 from src.modulos.estoque.modelos import ProdutoEstoque, MovimentacaoEstoque
+from src.modulos.autenticacao.modelos import Usuario
+from src.modulos.estoque.servicos import Movimento, movimentar, ajustar_saldo, saldo_em
 from src.modulos.estoque.formularios import FormularioProdutoEstoque, FormularioMovimentacaoManual
 from src.modulos.autenticacao.permissoes import cargo_exigido
 
+HISTORICO_POR_PAGINA = 50
+HISTORICO_POR_PAGINA_MAXIMO = 200
+
 @bp_estoque.route('/', methods=['GET', 'POST'])
 @login_required
 @cargo_exigido('estoque_gerir')
@@ -18,7 +26,7 @@ def painel():
         novo = ProdutoEstoque(
             nome=form_prod.nome.data,
             unidade=form_prod.unidade.data,
-            quantidade_atual=form_prod.quantidade_atual.data or 0,
+            quantidade_atual=0, # o saldo inicial entra como movimentação, abaixo
             quantidade_minima=form_prod.quantidade_minima.data or 0,
             # REMOVIDO CUSTO
             preco_m2=form_prod.preco_m2.data or 0,
@@ -27,6 +35,9 @@ def painel():
             consumo_por_m3=form_prod.consumo_m3.data or 0
         )
         db.session.add(novo)
+        db.session.flush()
+        if form_prod.quantidade_atual.data:
+            ajustar_saldo(novo.id, form_prod.quantidade_atual.data, usuario_id=current_user.id, observacao='Saldo inicial')
         db.session.commit()
         flash('Produto criado com sucesso!', 'success')
         return redirect(url_for('estoque.painel'))
@@ -53,8 +64,10 @@ def editar_produto(id):
         produto.consumo_por_m2 = form.consumo_m2.data
         produto.consumo_por_m3 = form.consumo_m3.data
         
+        # Saldo corrigido na edição vira movimentação de ajuste (o histórico continua fechando)
         if form.quantidade_atual.data is not None:
-             produto.quantidade_atual = form.quantidade_atual.data
+             ajustar_saldo(produto.id, form.quantidade_atual.data, usuario_id=current_user.id,
+                           observacao='Ajuste na edição do produto')
 
         db.session.commit()
         flash('Produto atualizado com sucesso!', 'success')
@@ -73,26 +86,14 @@ def movimentar_manual(id):
     form = FormularioMovimentacaoManual()
     
     if form.validate_on_submit():
-        qtd = form.quantidade.data
-        tipo = form.tipo.data
-        saldo_ant = produto.quantidade_atual
-        
-        if tipo == 'entrada':
-            produto.quantidade_atual += qtd
-        else:
-            produto.quantidade_atual -= qtd
-            
-        mov = MovimentacaoEstoque(
+        movimentar([Movimento(
             produto_id=produto.id,
-            tipo=tipo,
-            quantidade=qtd,
-            saldo_anterior=saldo_ant,
-            saldo_novo=produto.quantidade_atual,
+            tipo=form.tipo.data,
+            quantidade=form.quantidade.data,
             origem='manual',
             usuario_id=current_user.id,
             observacao=form.observacao.data
-        )
-        db.session.add(mov)
+        )])
         db.session.commit()
         flash('Estoque atualizado.', 'success')
         
@@ -102,11 +103,31 @@ def movimentar_manual(id):
 @login_required
 @cargo_exigido('estoque_gerir')
 def api_historico_produto(id):
-    # ATENÇÃO: Verifique se o campo no banco é 'data' ou 'data_movimentacao'
-    # No modelo novo acima, usei 'data_movimentacao'
-    movimentacoes = MovimentacaoEstoque.query.filter_by(produto_id=id).order_by(MovimentacaoEstoque.data_movimentacao.desc()).all()
+    """
+    Movimentações do produto, mais recentes primeiro, paginadas por chave
+    (data_movimentacao, id). `depois` é o cursor devolvido em `proximo`.
+    Com `data` (AAAA-MM-DD), devolve também o saldo ao fim desse dia, calculado
+    a partir do fechamento mensal mais próximo.
+    """
+    por_pagina = request.args.get('por_pagina', HISTORICO_POR_PAGINA, type=int)
+    por_pagina = max(1, min(por_pagina, HISTORICO_POR_PAGINA_MAXIMO))
+
+    dia = None
+    if request.args.get('data'):
+        try:
+            dia = date.fromisoformat(request.args['data'])
+        except ValueError:
+            return jsonify({'erro': 'Data inválida (use AAAA-MM-DD)'}), 400
+
+    pagina = paginar_keyset(
+        MovimentacaoEstoque.query.filter_by(produto_id=id)
+            .options(joinedload(MovimentacaoEstoque.usuario).joinedload(Usuario.colaborador)),
+        [(MovimentacaoEstoque.data_movimentacao, False), (MovimentacaoEstoque.id, False)],
+        lambda mov: [mov.data_movimentacao, mov.id],
+        por_pagina, depois=request.args.get('depois') or None
+    )
     dados = []
-    for mov in movimentacoes:
+    for mov in pagina.itens:
         dados.append({
             'id': mov.id,
             'data': mov.data_movimentacao.strftime('%d/%m/%Y %H:%M'),
@@ -117,4 +138,9 @@ def api_historico_produto(id):
             'observacao': mov.observacao or '-',
             'usuario': mov.usuario.nome if mov.usuario else 'Sistema'
         })
-    return jsonify(dados)
\ No newline at end of file
+    resposta = {'movimentacoes': dados, 'proximo': pagina.proximo}
+
+    if dia is not None:
+        saldo = saldo_em(id, datetime.combine(dia + timedelta(days=1), time.min))
+        resposta['saldo_na_data'] = {'data': dia.isoformat(), 'saldo': float(saldo) if saldo is not None else None}
+    return jsonify(resposta)
\ No newline at end of file
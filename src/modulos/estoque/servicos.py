@@ -0,0 +1,307 @@
+"""
+Razão de estoque: única porta de escrita de ProdutoEstoque.quantidade_atual.
+
+Os saldos nunca são lidos, alterados em Python e regravados (duas requisições
+simultâneas perderiam uma das baixas). Cada chamada soma os deltas no próprio
+banco, num UPDATE ... RETURNING para todos os produtos envolvidos, e grava as
+movimentações em lote com saldo_anterior/saldo_novo tirados do saldo devolvido.
+
+Fechamentos mensais (FechamentoEstoque) guardam o saldo de cada produto no 1º dia
+do mês: saldo numa data passada e conciliação somam só as movimentações desde o
+corte mais próximo.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import select, update, insert, delete, values, column, func, case, literal, true, or_, and_, \
+    Integer, Numeric, DateTime
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+from src.extensoes import banco_de_dados as db
+from src.modulos.estoque.modelos import ProdutoEstoque, MovimentacaoEstoque, FechamentoEstoque
+
+SINAL = {'entrada': 1, 'saida': -1}
+_CASAS = Decimal('0.001') # mesma escala de Numeric(10, 3) dos saldos e movimentações
+
+# Efeito de uma movimentação no saldo, em SQL (mesma regra de SINAL)
+DELTA = case((MovimentacaoEstoque.tipo == 'entrada', MovimentacaoEstoque.quantidade),
+             (MovimentacaoEstoque.tipo == 'saida', -MovimentacaoEstoque.quantidade), else_=0)
+
+
+@dataclass
+class Movimento:
+    """Uma entrada ou saída a lançar; saldo_anterior/saldo_novo são preenchidos por movimentar()"""
+    produto_id: int
+    tipo: str # 'entrada' ou 'saida'
+    quantidade: Decimal
+    origem: str
+    referencia_id: int = None
+    usuario_id: int = None
+    observacao: str = None
+    saldo_anterior: Decimal = None
+    saldo_novo: Decimal = None
+
+    def __post_init__(self):
+        if self.tipo not in SINAL:
+            raise ValueError(f"Tipo de movimentação inválido: {self.tipo}")
+        # Arredonda antes: o saldo calculado aqui bate com o que o banco grava
+        self.quantidade = Decimal(str(self.quantidade)).quantize(_CASAS)
+
+    @property
+    def delta(self):
+        return SINAL[self.tipo] * self.quantidade
+
+    def linha(self):
+        return {
+            'produto_id': self.produto_id, 'tipo': self.tipo, 'quantidade': self.quantidade,
+            'saldo_anterior': self.saldo_anterior, 'saldo_novo': self.saldo_novo, 'origem': self.origem,
+            'referencia_id': self.referencia_id, 'usuario_id': self.usuario_id, 'observacao': self.observacao,
+        }
+
+
+def _aplicar_deltas(deltas):
+    """
+    Soma {produto_id: delta} aos saldos numa instrução só e devolve {produto_id: saldo_novo}
+    (produtos inexistentes ficam de fora). As linhas são travadas em ordem de id antes do
+    UPDATE: transações que mexem nos mesmos produtos esperam uma pela outra em vez de se
+    travarem mutuamente, e cada uma soma sobre o saldo já gravado pela anterior.
+    """
+    deltas = {p: d for p, d in deltas.items() if d}
+    if not deltas:
+        return {}
+    tabela = ProdutoEstoque.__table__
+    travados = select(tabela.c.id).where(tabela.c.id.in_(list(deltas)))\
+        .order_by(tabela.c.id).with_for_update().cte('travados')
+    parcelas = values(column('produto_id', Integer), column('delta', Numeric(10, 3)), name='parcelas')\
+        .data(sorted(deltas.items()))
+
+    saldos = dict(db.session.execute(
+        update(tabela)
+        .where(tabela.c.id == travados.c.id, tabela.c.id == parcelas.c.produto_id)
+        .values(quantidade_atual=func.coalesce(tabela.c.quantidade_atual, 0) + parcelas.c.delta)
+        .returning(tabela.c.id, tabela.c.quantidade_atual)
+    ).all())
+
+    # Produtos já carregados na sessão passam a enxergar o saldo gravado
+    for produto_id, saldo in saldos.items():
+        produto = db.session.identity_map.get(identity_key(ProdutoEstoque, produto_id))
+        if produto is not None:
+            set_committed_value(produto, 'quantidade_atual', saldo)
+    return saldos
+
+
+def movimentar(movimentos):
+    """
+    Aplica os movimentos (vários por produto, se for o caso, na ordem dada) e grava o
+    histórico num INSERT só. Movimentos de produto inexistente são descartados.
+    Devolve os movimentos aplicados, com os saldos preenchidos.
+    """
+    movimentos = list(movimentos)
+    deltas = defaultdict(Decimal)
+    for movimento in movimentos:
+        deltas[movimento.produto_id] += movimento.delta
+    saldos = _aplicar_deltas(deltas)
+
+    # Do saldo final volta-se ao saldo de antes do 1º movimento e refaz-se a sequência
+    correntes = {p: saldos[p] - deltas[p] for p in saldos}
+    aplicados = []
+    for movimento in movimentos:
+        if movimento.produto_id not in correntes:
+            continue
+        movimento.saldo_anterior = correntes[movimento.produto_id]
+        movimento.saldo_novo = correntes[movimento.produto_id] = movimento.saldo_anterior + movimento.delta
+        aplicados.append(movimento)
+
+    if aplicados:
+        db.session.execute(insert(MovimentacaoEstoque), [m.linha() for m in aplicados])
+    return aplicados
+
+
+def ajustar_saldo(produto_id, saldo, usuario_id=None, observacao=None):
+    """
+    Leva o saldo a um valor contado (inventário, correção na edição do produto) e lança a
+    diferença como movimentação de origem 'ajuste'. A linha fica travada entre a leitura e
+    o lançamento. Devolve o Movimento, ou None se o saldo já era esse.
+    """
+    tabela = ProdutoEstoque.__table__
+    atual = db.session.execute(
+        select(tabela.c.quantidade_atual).where(tabela.c.id == produto_id).with_for_update()
+    ).scalar()
+    diferenca = Decimal(str(saldo)).quantize(_CASAS) - (atual or 0)
+    if not diferenca:
+        return None
+    aplicados = movimentar([Movimento(
+        produto_id=produto_id, tipo='entrada' if diferenca > 0 else 'saida', quantidade=abs(diferenca),
+        origem='ajuste', usuario_id=usuario_id, observacao=observacao
+    )])
+    return aplicados[0] if aplicados else None
+
+
+def estornar(*criterios):
+    """
+    Desfaz as movimentações que atendem aos critérios: apaga os lançamentos e devolve ao
+    saldo o que cada um tirou (ou tira o que pôs). O DELETE ... RETURNING decide quem
+    estorna: se duas requisições estornarem o mesmo lançamento, só a primeira mexe no
+    saldo. Fechamentos posteriores a um lançamento apagado deixam de contá-lo.
+    Devolve quantas movimentações foram desfeitas.
+    """
+    tabela = MovimentacaoEstoque.__table__
+    apagadas = db.session.execute(
+        delete(tabela).where(*criterios)
+        .returning(tabela.c.produto_id, tabela.c.tipo, tabela.c.quantidade, tabela.c.data_movimentacao)
+    ).all()
+
+    deltas = defaultdict(Decimal)
+    for produto_id, tipo, quantidade, _ in apagadas:
+        deltas[produto_id] -= SINAL.get(tipo, 0) * quantidade
+    _aplicar_deltas(deltas)
+    if apagadas:
+        _corrigir_fechamentos([(p, d, -SINAL.get(t, 0) * q) for p, t, q, d in apagadas if d is not None])
+    return len(apagadas)
+
+
+# =========================================================
+# --- FECHAMENTOS, SALDO NUMA DATA E CONCILIAÇÃO ---
+# =========================================================
+def _corrigir_fechamentos(correcoes):
+    """Soma cada correção (produto_id, data, delta) aos fechamentos com corte depois da data"""
+    if not correcoes:
+        return
+    fechamentos = FechamentoEstoque.__table__
+    lista = values(column('produto_id', Integer), column('data', DateTime), column('delta', Numeric(10, 3)),
+                   name='correcoes').data(correcoes)
+    ajuste = select(fechamentos.c.id, func.sum(lista.c.delta).label('delta'))\
+        .join(lista, and_(lista.c.produto_id == fechamentos.c.produto_id, lista.c.data < fechamentos.c.data_corte))\
+        .group_by(fechamentos.c.id).subquery()
+    db.session.execute(
+        update(fechamentos).where(fechamentos.c.id == ajuste.c.id)
+        .values(saldo=fechamentos.c.saldo + ajuste.c.delta)
+    )
+
+
+def _movimentado(produto_id, inicio=None, fim=None):
+    """Soma dos deltas do produto em [inicio, fim)"""
+    consulta = db.session.query(func.coalesce(func.sum(DELTA), 0))\
+        .filter(MovimentacaoEstoque.produto_id == produto_id)
+    if inicio is not None:
+        consulta = consulta.filter(MovimentacaoEstoque.data_movimentacao >= inicio)
+    if fim is not None:
+        consulta = consulta.filter(MovimentacaoEstoque.data_movimentacao < fim)
+    return consulta.scalar()
+
+
+def _fechar_corte(corte):
+    """Um INSERT para todos os produtos: saldo no corte a partir do fechamento anterior"""
+    produtos = ProdutoEstoque.__table__
+    mov = MovimentacaoEstoque
+    anterior = select(FechamentoEstoque.saldo, FechamentoEstoque.data_corte)\
+        .where(FechamentoEstoque.produto_id == produtos.c.id, FechamentoEstoque.data_corte < corte)\
+        .order_by(FechamentoEstoque.data_corte.desc()).limit(1).lateral('anterior')
+
+    def movimentado(*condicoes):
+        return select(func.coalesce(func.sum(DELTA), 0))\
+            .where(mov.produto_id == produtos.c.id, *condicoes).scalar_subquery()
+
+    # Sem fechamento anterior, parte do saldo atual e desconta o que veio depois do corte:
+    # saldos iniciais lançados fora do histórico entram no primeiro fechamento
+    saldo = case(
+        (anterior.c.saldo.isnot(None),
+         anterior.c.saldo + movimentado(mov.data_movimentacao >= anterior.c.data_corte, mov.data_movimentacao < corte)),
+        else_=func.coalesce(produtos.c.quantidade_atual, 0) - movimentado(mov.data_movimentacao >= corte)
+    )
+    linhas = select(produtos.c.id, literal(corte, DateTime), saldo, literal(datetime.utcnow(), DateTime))\
+        .select_from(produtos.outerjoin(anterior, true()))
+    resultado = db.session.execute(
+        pg_insert(FechamentoEstoque).from_select(['produto_id', 'data_corte', 'saldo', 'criado_em'], linhas)
+        .on_conflict_do_nothing(constraint='ux_fechamentos_estoque_produto_corte')
+    )
+    return resultado.rowcount
+
+
+def fechar_meses(ate=None):
+    """
+    Grava os fechamentos que faltam, mês a mês, do mês seguinte ao último fechado (ou à
+    primeira movimentação) até o início do mês de `ate` (padrão: agora, no relógio de
+    data_movimentacao). Devolve [(corte, produtos fechados)].
+    """
+    ate = ate or datetime.utcnow()
+    limite = datetime(ate.year, ate.month, 1)
+    ultimo = db.session.query(func.max(FechamentoEstoque.data_corte)).scalar()
+    if ultimo is None:
+        primeira = db.session.query(func.min(MovimentacaoEstoque.data_movimentacao)).scalar()
+        if primeira is None:
+            return []
+        ultimo = datetime(primeira.year, primeira.month, 1)
+
+    fechados = []
+    corte = ultimo + relativedelta(months=1)
+    while corte <= limite:
+        fechados.append((corte, _fechar_corte(corte)))
+        corte += relativedelta(months=1)
+    return fechados
+
+
+def saldo_em(produto_id, momento):
+    """
+    Saldo do produto no instante `momento` (efeito das movimentações anteriores a ele).
+    Parte do fechamento anterior mais próximo; antes do primeiro fechamento, volta a
+    partir do seguinte (ou do saldo atual). Custa só as movimentações entre o corte e a
+    data. None se o produto não existe.
+    """
+    fechamento = FechamentoEstoque.query.filter(
+        FechamentoEstoque.produto_id == produto_id, FechamentoEstoque.data_corte <= momento
+    ).order_by(FechamentoEstoque.data_corte.desc()).first()
+    if fechamento is not None:
+        return fechamento.saldo + _movimentado(produto_id, fechamento.data_corte, momento)
+
+    fechamento = FechamentoEstoque.query.filter(
+        FechamentoEstoque.produto_id == produto_id, FechamentoEstoque.data_corte > momento
+    ).order_by(FechamentoEstoque.data_corte.asc()).first()
+    if fechamento is not None:
+        return fechamento.saldo - _movimentado(produto_id, momento, fechamento.data_corte)
+
+    atual = db.session.query(ProdutoEstoque.quantidade_atual).filter(ProdutoEstoque.id == produto_id).first()
+    if atual is None:
+        return None
+    return (atual[0] or 0) - _movimentado(produto_id, momento)
+
+
+def conciliar():
+    """
+    Confere o razão a partir do último fechamento de cada produto: saldo do corte +
+    movimentações desde então tem que dar quantidade_atual. Sem fechamento não há saldo
+    de partida confiável (estornos apagam lançamentos, inclusive o primeiro, e o
+    saldo_anterior das linhas seguintes continua contando com eles), então só o saldo do
+    corte é conferido; rode "flask fechar-estoque" antes para cobrir os meses fechados.
+    Em todos os casos cada movimentação conferida tem que ter saldo_novo =
+    saldo_anterior ± quantidade. Devolve só os produtos com divergência:
+    [(produto_id, nome, saldo_atual, saldo_calculado, linhas_inconsistentes)].
+    """
+    mov = MovimentacaoEstoque
+    ultimo = select(FechamentoEstoque.produto_id, FechamentoEstoque.saldo, FechamentoEstoque.data_corte)\
+        .distinct(FechamentoEstoque.produto_id)\
+        .order_by(FechamentoEstoque.produto_id, FechamentoEstoque.data_corte.desc()).subquery('ultimo')
+    desde_o_corte = select(
+        mov.produto_id,
+        func.sum(DELTA).label('movimentado'),
+        func.count().filter(mov.saldo_novo != mov.saldo_anterior + DELTA).label('inconsistentes'),
+    ).outerjoin(ultimo, ultimo.c.produto_id == mov.produto_id)\
+        .where(or_(ultimo.c.data_corte.is_(None), mov.data_movimentacao >= ultimo.c.data_corte))\
+        .group_by(mov.produto_id).subquery('desde_o_corte')
+
+    atual = func.coalesce(ProdutoEstoque.quantidade_atual, 0)
+    calculado = case(
+        (ultimo.c.saldo.isnot(None), ultimo.c.saldo + func.coalesce(desde_o_corte.c.movimentado, 0)),
+        else_=atual # sem fechamento: só as linhas são conferidas
+    )
+    inconsistentes = func.coalesce(desde_o_corte.c.inconsistentes, 0)
+    return db.session.query(ProdutoEstoque.id, ProdutoEstoque.nome, atual, calculado, inconsistentes)\
+        .outerjoin(ultimo, ultimo.c.produto_id == ProdutoEstoque.id)\
+        .outerjoin(desde_o_corte, desde_o_corte.c.produto_id == ProdutoEstoque.id)\
+        .filter(or_(atual != calculado, inconsistentes > 0))\
+        .order_by(ProdutoEstoque.id).all()
@@ -66,6 +66,14 @@ class Despesa(db.Model):
     
     criado_em = db.Column(db.DateTime, default=db.func.now())
 
+    __table_args__ = (
+        db.Index('ix_despesas_vencimento', 'data_vencimento'),
+        # Contas em aberto (alertas, "A Pagar", lista do financeiro) são uma fração pequena da tabela
+        db.Index('ix_despesas_pendentes_vencimento', 'data_vencimento', postgresql_where=db.text("status = 'pendente'")),
+        db.Index('ix_despesas_pagas_pagamento', 'data_pagamento', postgresql_where=db.text("status = 'pago'")),
+        db.Index('ix_despesas_grupo_parcelamento', 'grupo_parcelamento', postgresql_where=db.text('grupo_parcelamento IS NOT NULL')),
+    )
+
     @property
     def dias_atraso(self):
         if self.status in ['pago', 'cancelado']:
@@ -75,18 +83,38 @@ class Despesa(db.Model):
             return (hoje - self.data_vencimento).days
         return 0
     
+    @staticmethod
+    def carregar_parcelas(despesas):
+        """
+        Posição e total de parcelas de cada despesa da lista numa consulta só
+        (row_number/count sobre o grupo, na mesma ordem de vencimento da edição)
+        """
+        ids = [d.id for d in despesas if d.grupo_parcelamento]
+        posicoes = {}
+        if ids:
+            grupo = Despesa.grupo_parcelamento
+            numeradas = db.session.query(
+                Despesa.id,
+                db.func.row_number().over(partition_by=grupo, order_by=(Despesa.data_vencimento, Despesa.id)).label('indice'),
+                db.func.count().over(partition_by=grupo).label('total')
+            ).filter(grupo.in_({d.grupo_parcelamento for d in despesas if d.grupo_parcelamento})).subquery()
+            posicoes = {i: (indice, total) for i, indice, total in
+                        db.session.query(numeradas).filter(numeradas.c.id.in_(ids))}
+        for d in despesas:
+            d._parcela = posicoes.get(d.id)
+
+    @property
+    def parcela(self):
+        """(posição, total) no parcelamento, ou None; listas carregam de uma vez com carregar_parcelas"""
+        if '_parcela' not in self.__dict__:
+            Despesa.carregar_parcelas([self])
+        return self._parcela
+
     @property
     def parcelamento_info(self):
-        """Calcula dinamicamente ' - Parc. 1/3' lendo do banco de dados na hora de exibir"""
-        if self.grupo_parcelamento:
-            parcelas = Despesa.query.filter_by(grupo_parcelamento=self.grupo_parcelamento).order_by(Despesa.data_vencimento.asc(), Despesa.id.asc()).all()
-            total = len(parcelas)
-            if total > 1:
-                try:
-                    indice = parcelas.index(self) + 1
-                    return f" - Parc. {indice}/{total}"
-                except ValueError:
-                    return ""
+        """Texto ' - Parc. 1/3' exibido ao lado da descrição"""
+        if self.parcela and self.parcela[1] > 1:
+            return f" - Parc. {self.parcela[0]}/{self.parcela[1]}"
         return ""
 
     @property
@@ -4,7 +4,8 @@ from datetime import date
 from src.modulos.autenticacao.permissoes import cargo_exigido
 from src.extensoes import banco_de_dados as db
 from src.modulos.financeiro.modelos import Despesa
-from src.modulos.estoque.modelos import MovimentacaoEstoque, ProdutoEstoque
+from src.modulos.estoque.modelos import MovimentacaoEstoque
+from src.modulos.estoque.servicos import estornar
 from . import bp_financeiro
 
 @bp_financeiro.route('/pagar/<int:id>', methods=['GET', 'POST'])
@@ -46,24 +47,15 @@ def excluir_despesa(id):
         # Conta única
         despesas_para_excluir = [despesa_alvo]
 
-    msg_estoque = ""
-    
-    # Processa a exclusão e o estorno para todas as contas vinculadas
-    for despesa in despesas_para_excluir:
-        # Verifica se alguma delas gerou entrada no estoque
-        movimentacao = MovimentacaoEstoque.query.filter_by(
-            referencia_id=despesa.id, 
-            origem='compra'
-        ).first()
-        
-        if movimentacao:
-            produto = ProdutoEstoque.query.get(movimentacao.produto_id)
-            if produto:
-                produto.quantidade_atual -= movimentacao.quantidade
-                msg_estoque = f" (O Estoque vinculado foi revertido automaticamente)"
-            db.session.delete(movimentacao)
+    # Desfaz de uma vez as entradas de estoque de todas as contas vinculadas (compras com vários produtos inclusive)
+    estornadas = estornar(
+        MovimentacaoEstoque.referencia_id.in_([d.id for d in despesas_para_excluir]),
+        MovimentacaoEstoque.origem == 'compra'
+    )
+    msg_estoque = " (O Estoque vinculado foi revertido automaticamente)" if estornadas else ""
 
-        # Exclui a despesa da tabela
+    # Exclui as despesas da tabela
+    for despesa in despesas_para_excluir:
         db.session.delete(despesa)
         
     db.session.commit()
@@ -10,6 +10,7 @@ from src.modulos.autenticacao.modelos import Usuario
 from src.modulos.rh.modelos import Colaborador
 from . import bp_financeiro
 from src.modulos.estoque.modelos import ProdutoEstoque, MovimentacaoEstoque
+from src.modulos.estoque.servicos import Movimento, movimentar, estornar
 from decimal import Decimal
 import uuid
 
@@ -122,26 +123,18 @@ def nova_despesa():
 
             # LOOP ESTOQUE (Apenas se for compra de estoque e só 1 vez)
             if is_estoque and primeira_despesa_id:
-                for p_id_str, qtd_str in zip(produtos_ids, quantidades):
-                    if p_id_str and qtd_str:
-                        prod = ProdutoEstoque.query.get(int(p_id_str))
-                        qtd = Decimal(qtd_str)
-                        
-                        saldo_ant = prod.quantidade_atual
-                        prod.quantidade_atual += qtd
-                        
-                        mov = MovimentacaoEstoque(
-                            produto_id=prod.id,
-                            tipo='entrada',
-                            quantidade=qtd,
-                            saldo_anterior=saldo_ant,
-                            saldo_novo=prod.quantidade_atual,
-                            origem='compra',
-                            referencia_id=primeira_despesa_id, # Vincula à 1ª parcela
-                            usuario_id=current_user.id,
-                            observacao=f"Compra/Entrada em Lote (Ref: Despesa #{primeira_despesa_id})"
-                        )
-                        db.session.add(mov)
+                movimentar(
+                    Movimento(
+                        produto_id=int(p_id_str),
+                        tipo='entrada',
+                        quantidade=Decimal(qtd_str),
+                        origem='compra',
+                        referencia_id=primeira_despesa_id, # Vincula à 1ª parcela
+                        usuario_id=current_user.id,
+                        observacao=f"Compra/Entrada em Lote (Ref: Despesa #{primeira_despesa_id})"
+                    )
+                    for p_id_str, qtd_str in zip(produtos_ids, quantidades) if p_id_str and qtd_str
+                )
 
             db.session.commit()
             flash('Lançamento realizado com sucesso!', 'success')
@@ -235,43 +228,27 @@ def editar_despesa(id):
 
         # --- 4. ATUALIZAÇÃO DO ESTOQUE (ESTORNO E RE-ENTRADA) ---
         # Este é o bloco que garante que o seu 2º Ponto funcione perfeitamente!
+        if eh_compra_estoque:
+            estornar(MovimentacaoEstoque.referencia_id == despesa.id, MovimentacaoEstoque.origem == 'compra')
+
         if is_estoque:
             produtos_ids = request.form.getlist('produtos_ids[]')
             quantidades = request.form.getlist('quantidades[]')
-
-            for mov in movimentacoes_antigas:
-                prod = ProdutoEstoque.query.get(mov.produto_id)
-                if prod: prod.quantidade_atual -= mov.quantidade
-                db.session.delete(mov)
-            db.session.flush()
-
-            for p_id_str, qtd_str in zip(produtos_ids, quantidades):
-                if p_id_str and qtd_str:
-                    prod = ProdutoEstoque.query.get(int(p_id_str))
-                    qtd = Decimal(str(qtd_str).replace(',', '.'))
-                    
-                    saldo_ant = prod.quantidade_atual
-                    prod.quantidade_atual += qtd
-                    
-                    nova_mov = MovimentacaoEstoque(
-                        produto_id=prod.id, tipo='entrada', quantidade=qtd,
-                        saldo_anterior=saldo_ant, saldo_novo=prod.quantidade_atual, origem='compra',
-                        referencia_id=despesa.id, usuario_id=current_user.id, observacao=f"Compra Editada (Ref: Despesa #{despesa.id})"
-                    )
-                    db.session.add(nova_mov)
-                    
-        elif eh_compra_estoque and not is_estoque:
-            for mov in movimentacoes_antigas:
-                prod = ProdutoEstoque.query.get(mov.produto_id)
-                if prod: prod.quantidade_atual -= mov.quantidade
-                db.session.delete(mov)
+            movimentar(
+                Movimento(
+                    produto_id=int(p_id_str), tipo='entrada', quantidade=Decimal(str(qtd_str).replace(',', '.')),
+                    origem='compra', referencia_id=despesa.id, usuario_id=current_user.id,
+                    observacao=f"Compra Editada (Ref: Despesa #{despesa.id})"
+                )
+                for p_id_str, qtd_str in zip(produtos_ids, quantidades) if p_id_str and qtd_str
+            )
 
         # --- 5. ATUALIZAÇÃO DAS PARCELAS ---
         import uuid
         
         if despesa.grupo_parcelamento:
             grupo_id = despesa.grupo_parcelamento
-            todas_parcelas = Despesa.query.filter_by(grupo_parcelamento=grupo_id).order_by(Despesa.data_vencimento.asc()).all()
+            todas_parcelas = Despesa.query.filter_by(grupo_parcelamento=grupo_id).order_by(Despesa.data_vencimento.asc(), Despesa.id.asc()).all()
             qtd_atual = len(todas_parcelas)
             parcelas_ativas = todas_parcelas.copy()
             
@@ -1,15 +1,28 @@
 from flask import render_template, request
 from flask_login import login_required, current_user
 from sqlalchemy import extract, desc, and_
+from sqlalchemy.orm import joinedload
 from datetime import date
-import calendar
 from src.modulos.autenticacao.permissoes import cargo_exigido
 
 from src.extensoes import banco_de_dados as db
+from src.periodos import periodo_mes, hoje_brasilia
+from src.paginacao import paginar_keyset, urls_da_pagina
+from src.modulos.busca import motor as busca
 from src.modulos.financeiro.modelos import Despesa, Fornecedor
 from . import bp_financeiro
 from sqlalchemy import extract, desc, and_, or_
 
+POR_PAGINA = 50
+
+# Ordem da lista: status (alfabética), vencimento e id (desempate do keyset)
+CHAVES_LISTA = [(Despesa.status, True), (Despesa.data_vencimento, True), (Despesa.id, True)]
+
+
+def _chave_despesa(d):
+    return [d.status, d.data_vencimento, d.id]
+
+
 @bp_financeiro.route('/', methods=['GET'])
 @login_required
 @cargo_exigido('financeiro_acesso')
@@ -18,7 +31,7 @@ def painel():
         if not valor: return "0,00"
         return f"{float(valor):,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
     
-    hoje = date.today()
+    hoje = hoje_brasilia()
     # ============================================================
     # 1. PREPARAÇÃO DOS FILTROS (PERIODOS E LISTAS)
     # ============================================================
@@ -65,6 +78,7 @@ def painel():
     
     # --- NOVA LÓGICA: FORÇA O MÊS/ANO DA CONTA DESTACADA ---
     destaque_id = request.args.get('destaque_id', type=int)
+    despesa_destaque = None
     if destaque_id:
         despesa_destaque = Despesa.query.get(destaque_id)
         if despesa_destaque:
@@ -84,18 +98,17 @@ def painel():
     # ============================================================
     # 3. QUERY PRINCIPAL (LISTA)
     # ============================================================
-    ultimo_dia_filtro = date(ano, mes, calendar.monthrange(ano, mes)[1])
+    periodo = periodo_mes(mes, ano)
+    if periodo is None: # mês/ano inválido na URL: volta para o mês atual
+        mes, ano = mes_padrao, ano_padrao
+        periodo = periodo_mes(mes, ano)
 
-    cond_pago = and_(
-        Despesa.status == 'pago',
-        extract('month', Despesa.data_pagamento) == mes,
-        extract('year', Despesa.data_pagamento) == ano
-    )
+    cond_pago = and_(Despesa.status == 'pago', periodo.filtro(Despesa.data_pagamento))
 
     if ano == hoje.year and mes == hoje.month:
-        cond_pendente = and_(Despesa.status == 'pendente', Despesa.data_vencimento <= ultimo_dia_filtro)
+        cond_pendente = and_(Despesa.status == 'pendente', periodo.antes_de(Despesa.data_vencimento))
     elif ano > hoje.year or (ano == hoje.year and mes > hoje.month):
-        cond_pendente = and_(Despesa.status == 'pendente', extract('month', Despesa.data_vencimento) == mes, extract('year', Despesa.data_vencimento) == ano)
+        cond_pendente = and_(Despesa.status == 'pendente', periodo.filtro(Despesa.data_vencimento))
     else:
         cond_pendente = False
 
@@ -106,9 +119,9 @@ def painel():
     
     if f_busca:
         if f_busca.isdigit():
-            query = query.filter(or_(Despesa.id == int(f_busca), Despesa.descricao.ilike(f'%{f_busca}%')))
+            query = query.filter(or_(Despesa.id == int(f_busca), busca.condicao('despesa', f_busca, Despesa.id)))
         else:
-            query = query.filter(Despesa.descricao.ilike(f'%{f_busca}%'))
+            query = query.filter(busca.condicao('despesa', f_busca, Despesa.id))
             
     if f_status:
         if f_status == 'vencido':
@@ -139,16 +152,29 @@ def painel():
         except ValueError:
             pass
 
-    despesas = query.order_by(Despesa.status.asc(), Despesa.data_vencimento.asc()).all()
+    # Lista paginada por chave; a conta destacada abre a página que começa nela
+    depois = request.args.get('depois') or None
+    antes = request.args.get('antes') or None
+    a_partir_de = _chave_despesa(despesa_destaque) if despesa_destaque and not (depois or antes) else None
+    pagina = query.options(joinedload(Despesa.fornecedor_rel), joinedload(Despesa.colaborador))
+    paginacao = paginar_keyset(pagina, CHAVES_LISTA, _chave_despesa, POR_PAGINA,
+                               depois=depois, antes=antes, a_partir_de=a_partir_de)
+    despesas = paginacao.itens
+    Despesa.carregar_parcelas(despesas) # "Parc. 2/5" da página inteira numa consulta
+    url_anterior, url_proxima = urls_da_pagina(paginacao)
     
     # ============================================================
     # 4. CÁLCULO DE TOTAIS (KPIS)
     # ============================================================
-    total_pendente = sum(d.valor for d in despesas if d.status == 'pendente')
-    total_pago = sum(d.valor for d in despesas if d.status == 'pago')
-
-    # NOVA LÓGICA: Calcula o vencido APENAS dentro dos itens originais deste mês, ignorando rollover
-    total_vencido_mes = sum(d.valor for d in despesas if d.status == 'pendente' and d.data_vencimento < hoje and d.data_vencimento.month == mes and d.data_vencimento.year == ano)
+    # Somados no banco sobre o filtro inteiro, não só sobre a página exibida
+    pendente = Despesa.status == 'pendente'
+    total_pendente, total_pago, total_vencido_mes = query.with_entities(
+        db.func.coalesce(db.func.sum(Despesa.valor).filter(pendente), 0),
+        db.func.coalesce(db.func.sum(Despesa.valor).filter(Despesa.status == 'pago'), 0),
+        # NOVA LÓGICA: Calcula o vencido APENAS dentro dos itens originais deste mês, ignorando rollover
+        db.func.coalesce(db.func.sum(Despesa.valor).filter(
+            pendente, Despesa.data_vencimento < hoje, periodo.filtro(Despesa.data_vencimento)), 0),
+    ).order_by(None).one()
     
     total_vencido_geral = db.session.query(db.func.sum(Despesa.valor))\
         .filter(Despesa.status == 'pendente', Despesa.data_vencimento < hoje)\
@@ -158,6 +184,8 @@ def painel():
 
     return render_template('financeiro/painel.html', 
                            despesas=despesas, 
+                           url_anterior=url_anterior,
+                           url_proxima=url_proxima,
                            periodos=periodos, 
                            periodo_selecionado=f"{mes}-{ano}",
                            fornecedores=fornecedores,
@@ -3,13 +3,17 @@
 from flask import render_template, request, jsonify
 from flask_login import login_required
 from src.modulos.autenticacao.permissoes import cargo_exigido
-from datetime import date
-from sqlalchemy import func, extract
+from sqlalchemy import func
+from collections import defaultdict
+from decimal import Decimal
 import calendar
 
-from src.extensoes import banco_de_dados as db
+from src.extensoes import banco_de_dados as db, cache_agregados
+from src.periodos import periodo_mes, hoje_brasilia
 from src.modulos.metas.modelos import MetaMensal, MetaVendedor
 from src.modulos.vendas.modelos import Venda, Pagamento
+from src.modulos.autenticacao.modelos import Usuario
+from src.modulos.rh.modelos import Colaborador
 from . import bp_metas
 
 def fmt_moeda(valor):
@@ -17,11 +21,86 @@ def fmt_moeda(valor):
         valor = 0.0
     return f"{float(valor):,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
 
+def _agregados_do_mes(meta_config, mes_atual, ano_atual, hoje, dias_uteis_lista):
+    """
+    Recebimentos da loja (total e por dia) e ranking de vendedores do mês, em duas
+    consultas fixas (não importa o tamanho da equipe): os pagamentos do mês somados
+    por vendedor e dia, e as metas dos vendedores com o nome de cada um.
+    """
+    eh_mes_atual = (ano_atual == hoje.year and mes_atual == hoje.month)
+    periodo = periodo_mes(mes_atual, ano_atual)
+
+    # 1. RECEBIMENTOS DO MÊS POR VENDEDOR E DIA (base do calendário e do ranking)
+    dia = func.extract('day', Pagamento.data_pagamento)
+    recebimentos = db.session.query(
+        Venda.vendedor_id, dia.label('dia'), func.sum(Pagamento.valor).label('total')
+    ).join(Venda, Pagamento.venda_id == Venda.id)\
+        .filter(periodo.filtro(Pagamento.data_pagamento))\
+        .group_by(Venda.vendedor_id, dia).all()
+
+    por_dia = defaultdict(Decimal)
+    por_vendedor = defaultdict(Decimal)
+    ate_ontem_por_vendedor = defaultdict(Decimal)
+    for r in recebimentos:
+        por_dia[int(r.dia)] += r.total
+        por_vendedor[r.vendedor_id] += r.total
+        if int(r.dia) < hoje.day:
+            ate_ontem_por_vendedor[r.vendedor_id] += r.total
+
+    total_recebido_loja = sum(por_dia.values())
+    mapa_vendas = {d: float(total) for d, total in por_dia.items()}
+
+    # =======================================================
+    # 2. RANKING DE VENDEDORES COM META DINÂMICA
+    # =======================================================
+    metas_vendedores = db.session.query(
+        MetaVendedor.usuario_id, MetaVendedor.valor_meta, Usuario.usuario, Colaborador.nome_completo
+    ).join(Usuario, Usuario.id == MetaVendedor.usuario_id)\
+        .outerjoin(Colaborador, Colaborador.id == Usuario.colaborador_id)\
+        .filter(MetaVendedor.meta_mensal_id == meta_config.id).all()
+    ranking = []
+    
+    for mv in metas_vendedores:
+        recebido_total = por_vendedor.get(mv.usuario_id, 0)
+            
+        perc = (float(recebido_total) / float(mv.valor_meta)) * 100 if mv.valor_meta > 0 else 0
+        
+        # O vendedor também ganha uma meta dinâmica pessoal para correr atrás do prejuízo
+        if eh_mes_atual:
+            recebido_ate_ontem = ate_ontem_por_vendedor.get(mv.usuario_id, 0)
+                
+            dias_restantes_hoje = len([d for d in dias_uteis_lista if d >= hoje.day])
+            if dias_restantes_hoje > 0:
+                m_diaria = (float(mv.valor_meta) - float(recebido_ate_ontem)) / dias_restantes_hoje
+            else:
+                m_diaria = 0
+        else:
+            m_diaria = float(mv.valor_meta) / len(dias_uteis_lista) if dias_uteis_lista else 0
+            
+        if m_diaria < 0: m_diaria = 0
+        
+        ranking.append({
+            'id': mv.usuario_id,
+            'nome': mv.nome_completo or mv.usuario, # mesmo critério de Usuario.nome
+            'meta': float(mv.valor_meta),
+            'vendido': float(recebido_total),
+            'perc': perc,
+            'meta_diaria': m_diaria
+        })
+        
+    ranking.sort(key=lambda x: x['perc'], reverse=True)
+
+    return {
+        'total_recebido_loja': total_recebido_loja,
+        'mapa_vendas': mapa_vendas,
+        'ranking': ranking
+    }
+
 @bp_metas.route('/', methods=['GET'])
 @login_required
 @cargo_exigido('metas_acesso')
 def painel():
-    hoje = date.today()
+    hoje = hoje_brasilia()
     
     try:
         mes_atual = int(request.args.get('mes', hoje.month))
@@ -35,19 +114,8 @@ def painel():
     if not meta_config:
         return render_template('metas/sem_meta.html', mes_filtro=mes_atual, ano_filtro=ano_atual)
 
-    # 1. DADOS GERAIS
-    # Antes: Filtrava Venda.criado_em
-    # Novo:
-    total_recebido_loja = db.session.query(func.sum(Pagamento.valor))\
-        .filter(
-            extract('month', Pagamento.data_pagamento) == mes_atual,
-            extract('year', Pagamento.data_pagamento) == ano_atual
-        ).scalar() or 0
-        
-    perc_loja = (float(total_recebido_loja) / float(meta_config.valor_loja)) * 100
-    
     # =======================================================
-    # 2. CALENDÁRIO COM META DINÂMICA
+    # CALENDÁRIO COM META DINÂMICA
     # =======================================================
     dias_trabalho = [int(d) for d in meta_config.config_semana.split(',')]
     feriados = []
@@ -57,15 +125,6 @@ def painel():
         except:
             pass
 
-    recebimentos_diarios = db.session.query(
-        func.extract('day', Pagamento.data_pagamento).label('dia'),
-        func.sum(Pagamento.valor).label('total')
-    ).filter(
-        func.extract('month', Pagamento.data_pagamento) == mes_atual,
-        func.extract('year', Pagamento.data_pagamento) == ano_atual
-    ).group_by('dia').all()
-
-    mapa_vendas = {int(p.dia): float(p.total) for p in recebimentos_diarios}
     cal = calendar.monthcalendar(ano_atual, mes_atual)
     
     # Levanta o total de dias úteis no mês
@@ -78,6 +137,15 @@ def painel():
                     
     meta_total_loja = float(meta_config.valor_loja)
     meta_diaria_hoje = meta_total_loja / len(dias_uteis_lista) if dias_uteis_lista else 0
+
+    # Números da loja inteira (iguais para todos os usuários) vêm do cache compartilhado
+    chave = cache_agregados.chave('metas', ano_atual, mes_atual, hoje.isoformat())
+    agregados = cache_agregados.obter_ou_calcular(
+        chave, lambda: _agregados_do_mes(meta_config, mes_atual, ano_atual, hoje, dias_uteis_lista)
+    )
+    total_recebido_loja = agregados['total_recebido_loja']
+    mapa_vendas = agregados['mapa_vendas']
+    perc_loja = (float(total_recebido_loja) / float(meta_config.valor_loja)) * 100
     
     calendario_dados = []
     eh_mes_passado = (ano_atual < hoje.year) or (ano_atual == hoje.year and mes_atual < hoje.month)
@@ -146,54 +214,7 @@ def painel():
             semana_dados.append(info)
         calendario_dados.append(semana_dados)
 
-    # =======================================================
-    # 3. RANKING DE VENDEDORES COM META DINÂMICA
-    # =======================================================
-    metas_vendedores = MetaVendedor.query.filter_by(meta_mensal_id=meta_config.id).all()
-    ranking = []
-    
-    for mv in metas_vendedores:
-        recebido_total = db.session.query(func.sum(Pagamento.valor))\
-            .join(Venda, Pagamento.venda_id == Venda.id)\
-            .filter(
-                Venda.vendedor_id == mv.usuario_id,
-                extract('month', Pagamento.data_pagamento) == mes_atual,
-                extract('year', Pagamento.data_pagamento) == ano_atual
-            ).scalar() or 0
-            
-        perc = (float(recebido_total) / float(mv.valor_meta)) * 100 if mv.valor_meta > 0 else 0
-        
-        # O vendedor também ganha uma meta dinâmica pessoal para correr atrás do prejuízo
-        if eh_mes_atual:
-            recebido_ate_ontem = db.session.query(func.sum(Pagamento.valor))\
-                .join(Venda, Pagamento.venda_id == Venda.id)\
-                .filter(
-                    Venda.vendedor_id == mv.usuario_id,
-                    extract('month', Pagamento.data_pagamento) == mes_atual,
-                    extract('year', Pagamento.data_pagamento) == ano_atual,
-                    func.date(Pagamento.data_pagamento) < hoje
-                ).scalar() or 0
-                
-            dias_restantes_hoje = len([d for d in dias_uteis_lista if d >= hoje.day])
-            if dias_restantes_hoje > 0:
-                m_diaria = (float(mv.valor_meta) - float(recebido_ate_ontem)) / dias_restantes_hoje
-            else:
-                m_diaria = 0
-        else:
-            m_diaria = float(mv.valor_meta) / len(dias_uteis_lista) if dias_uteis_lista else 0
-            
-        if m_diaria < 0: m_diaria = 0
-        
-        ranking.append({
-            'id': mv.usuario_id,
-            'nome': mv.usuario.nome,
-            'meta': float(mv.valor_meta),
-            'vendido': float(recebido_total),
-            'perc': perc,
-            'meta_diaria': m_diaria
-        })
-        
-    ranking.sort(key=lambda x: x['perc'], reverse=True)
+    ranking = agregados['ranking']
 
     return render_template('metas/painel.html', 
                            meta_loja=meta_config,
@@ -216,10 +237,13 @@ def api_vendas_usuario(usuario_id):
         
         # BUSCA NOS PAGAMENTOS: 
         # Filtramos pela data_pagamento e não mais pela data da venda
+        periodo = periodo_mes(mes, ano)
+        if periodo is None:
+            return jsonify({'vendas': []})
+
         pagamentos = Pagamento.query.join(Venda).filter(
             Venda.vendedor_id == usuario_id,
-            extract('month', Pagamento.data_pagamento) == mes,
-            extract('year', Pagamento.data_pagamento) == ano
+            periodo.filtro(Pagamento.data_pagamento)
         ).order_by(Pagamento.data_pagamento.desc()).all()
         
         dados = []
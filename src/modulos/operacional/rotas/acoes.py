@@ -4,28 +4,20 @@ from src.extensoes import banco_de_dados as db
 from src.modulos.vendas.modelos import ItemVenda, Venda, ItemVendaHistorico, hora_brasilia
 from src.modulos.autenticacao.permissoes import cargo_exigido
 from src.modulos.estoque.modelos import ProdutoEstoque, MovimentacaoEstoque
+from src.modulos.estoque.servicos import Movimento, movimentar, estornar
 from decimal import Decimal
 from . import bp_operacional
 
 # --- FUNÇÃO AUXILIAR PARA ESTORNO GARANTIDO ---
-def estornar_estoque_producao(referencia_id):
-    """Remove a movimentação de saída e devolve a quantidade ao saldo do produto"""
-    movimentacoes = MovimentacaoEstoque.query.filter_by(
-        referencia_id=referencia_id,
-        origem='producao',
-        tipo='saida'
-    ).all()
-    
-    qtd_estornada = 0
-    for mov in movimentacoes:
-        prod = ProdutoEstoque.query.get(mov.produto_id)
-        if prod:
-            prod.quantidade_atual += mov.quantidade
-            db.session.add(prod) # Força a atualização do saldo
-        db.session.delete(mov)   # Exclui o lançamento do histórico
-        qtd_estornada += 1
-        
-    return qtd_estornada
+def estornar_estoque_producao(*referencias):
+    """Remove as movimentações de saída dos itens e devolve as quantidades ao saldo dos produtos"""
+    if not referencias:
+        return 0
+    return estornar(
+        MovimentacaoEstoque.referencia_id.in_(referencias),
+        MovimentacaoEstoque.origem == 'producao',
+        MovimentacaoEstoque.tipo == 'saida'
+    )
 
 # --- ROTA PARA ENVIAR PARA RETRABALHO (ITEM) ---
 @bp_operacional.route('/item/<int:id>/retrabalho')
@@ -78,13 +70,13 @@ def retrabalho_venda(id):
     venda.status = 'retrabalho'
     
     if venda.itens:
+        # CORREÇÃO: Se estava pronto, estorna o estoque antes de voltar
+        prontos = [item for item in venda.itens if status_anterior == 'pronto' or item.status == 'pronto']
+        estornar_estoque_producao(*[item.id for item in prontos])
+        for item in prontos:
+            item.data_pronto = None
+            item.usuario_pronto_id = None
         for item in venda.itens:
-            # CORREÇÃO: Se estava pronto, estorna o estoque antes de voltar
-            if status_anterior == 'pronto' or item.status == 'pronto':
-                estornar_estoque_producao(item.id)
-                item.data_pronto = None
-                item.usuario_pronto_id = None
-                
             item.status = 'retrabalho'
     
     if venda.itens:
@@ -137,8 +129,8 @@ def avancar_item(id):
         )
         db.session.add(log)
 
-    todos_itens = ItemVenda.query.filter_by(venda_id=venda_pai.id).all()
-    status_set = set(i.status for i in todos_itens)
+    db.session.flush() # atualiza os contadores de status da venda com a mudança do item
+    status_set = venda_pai.status_itens
 
     if all(s in ['pronto', 'entregue'] for s in status_set):
         if venda_pai.status not in ['pronto', 'entregue']:
@@ -194,8 +186,8 @@ def voltar_item(id):
         )
         db.session.add(log)
 
-    todos_itens = ItemVenda.query.filter_by(venda_id=venda_pai.id).all()
-    status_set = set(i.status for i in todos_itens)
+    db.session.flush() # atualiza os contadores de status da venda com a mudança do item
+    status_set = venda_pai.status_itens
 
     if 'producao' in status_set or 'retrabalho' in status_set:
         venda_pai.status = 'producao'
@@ -252,19 +244,15 @@ def avancar_venda(id):
                 qtd_baixa = metragem * fator_consumo
                 
                 if qtd_baixa > 0:
-                    mov = MovimentacaoEstoque(
+                    movimentar([Movimento(
                         produto_id=produto.id,
                         tipo='saida',
                         quantidade=qtd_baixa,
-                        saldo_anterior=produto.quantidade_atual,
-                        saldo_novo=produto.quantidade_atual - qtd_baixa,
                         origem='producao',
                         referencia_id=venda.itens[0].id if venda.itens else None, 
                         usuario_id=current_user.id,
                         observacao=f"Baixa Auto ({'Retrabalho' if venda.status=='retrabalho' else 'Normal'}) - #{venda.id}"
-                    )
-                    produto.quantidade_atual -= qtd_baixa
-                    db.session.add(mov)
+                    )])
                     flash(f'Finalizado! Baixa de {qtd_baixa:.3f} {produto.unidade} registrada.', 'success')
 
         venda.status = 'pronto'
@@ -307,8 +295,8 @@ def voltar_venda(id):
                 item.data_pronto = None
                 item.usuario_pronto_id = None
                 
-                # ESTORNO GARANTIDO
-                qtd_estornada += estornar_estoque_producao(item.id)
+            # ESTORNO GARANTIDO
+            qtd_estornada = estornar_estoque_producao(*[item.id for item in venda.itens])
 
     db.session.commit()
     
@@ -336,6 +324,7 @@ def finalizar_com_baixa(id):
     consumo_texto = []
     total_debitado = 0
 
+    baixas = []
     for p_id, qtd_str in zip(produtos_ids, quantidades):
         if p_id and qtd_str:
             try:
@@ -343,31 +332,26 @@ def finalizar_com_baixa(id):
                 qtd = Decimal(qtd_str_limpa)
                 
                 if qtd > 0:
-                    prod = ProdutoEstoque.query.get(int(p_id))
-                    if prod:
-                        qtd_baixa = qtd
-                        unidade_log = prod.unidade
-                        
-                        mov = MovimentacaoEstoque(
-                            produto_id=prod.id,
-                            tipo='saida',
-                            quantidade=qtd_baixa,
-                            saldo_anterior=prod.quantidade_atual,
-                            saldo_novo=prod.quantidade_atual - qtd_baixa,
-                            origem='producao', 
-                            referencia_id=item.id, 
-                            usuario_id=current_user.id,
-                            observacao=f"Consumo Item #{item.id} ({'Retrabalho' if status_anterior == 'retrabalho' else 'Produção'})"
-                        )
-                        
-                        prod.quantidade_atual -= qtd_baixa
-                        db.session.add(mov)
-                        
-                        consumo_texto.append(f"{qtd:.3f} {unidade_log} de {prod.nome}")
-                        total_debitado += 1
+                    baixas.append(Movimento(
+                        produto_id=int(p_id),
+                        tipo='saida',
+                        quantidade=qtd,
+                        origem='producao', 
+                        referencia_id=item.id, 
+                        usuario_id=current_user.id,
+                        observacao=f"Consumo Item #{item.id} ({'Retrabalho' if status_anterior == 'retrabalho' else 'Produção'})"
+                    ))
             except ValueError:
                 continue 
 
+    # Uma instrução para todos os saldos e outra para o histórico; produtos inexistentes ficam de fora
+    if baixas:
+        produtos = {p.id: p for p in ProdutoEstoque.query.filter(ProdutoEstoque.id.in_({b.produto_id for b in baixas}))}
+        for baixa in movimentar(baixas):
+            prod = produtos[baixa.produto_id]
+            consumo_texto.append(f"{baixa.quantidade:.3f} {prod.unidade} de {prod.nome}")
+            total_debitado += 1
+
     acao_msg = "Finalizou Produção"
     if status_anterior == 'retrabalho':
         acao_msg = "Finalizou Retrabalho"
@@ -390,9 +374,9 @@ def finalizar_com_baixa(id):
     db.session.add(log)
     
     venda_pai = Venda.query.get(item.venda_id)
-    todos_itens = ItemVenda.query.filter_by(venda_id=venda_pai.id).all()
+    db.session.flush() # atualiza os contadores de status da venda com a mudança do item
     
-    if all(i.status in ['pronto', 'entregue'] for i in todos_itens):
+    if venda_pai.status_itens <= {'pronto', 'entregue'}:
         if venda_pai.status not in ['pronto', 'entregue']:
             venda_pai.status = 'pronto'
             venda_pai.data_pronto = hora_brasilia()
@@ -4,6 +4,7 @@ from sqlalchemy.orm import joinedload # <--- NOVA IMPORTAÇÃO
 from src.modulos.vendas.modelos import ItemVenda, Venda, hora_brasilia
 from src.modulos.autenticacao.permissoes import cargo_exigido
 from src.modulos.estoque.modelos import ProdutoEstoque
+from src.modulos.operacional.servicos import contar_tarefas
 from . import bp_operacional
 
 def calcular_tempo_decorrido(data_inicio):
@@ -24,6 +25,13 @@ def calcular_tempo_decorrido(data_inicio):
     elif horas > 0: return f"{horas}h {minutos}m"
     else: return f"{minutos}m"
 
+def _urls_foto(foto):
+    """Galeria mostra a versão média; o clique abre o original"""
+    return {
+        'previa': url_for('vendas.imagem_db', foto_id=foto.id, tamanho='media'),
+        'original': url_for('vendas.imagem_db', foto_id=foto.id)
+    }
+
 @bp_operacional.route('/painel')
 @login_required
 @cargo_exigido('producao_operar')
@@ -81,7 +89,7 @@ def painel():
 
         fotos_urls = []
         if i.fotos:
-            fotos_urls = [url_for('vendas.imagem_db', foto_id=f.id) for f in i.fotos]
+            fotos_urls = [_urls_foto(f) for f in i.fotos]
             
         tarefas.append({
             'tipo': 'item',
@@ -135,7 +143,7 @@ def painel():
 
         fotos_urls = []
         if v.itens and v.itens[0].fotos:
-            fotos_urls = [url_for('vendas.imagem_db', foto_id=f.id) for f in v.itens[0].fotos]
+            fotos_urls = [_urls_foto(f) for f in v.itens[0].fotos]
             
         tarefas.append({
             'tipo': 'venda',
@@ -160,18 +168,15 @@ def painel():
     # Ordenação
     tarefas.sort(key=lambda x: (not x['prioridade'], not x['is_producao'], x['criado_em']))
 
-    # Contadores
-    qtd_fila = sum(1 for t in tarefas if t['status'] == 'pendente')
-    qtd_producao = sum(1 for t in tarefas if t['status'] == 'producao')
-    qtd_retrabalho = sum(1 for t in tarefas if t['status'] == 'retrabalho')
-    qtd_pronto = sum(1 for t in tarefas if t['status'] == 'pronto')
+    # Contadores (mesma contagem do painel inicial e da gestão de serviços)
+    contagem = contar_tarefas()
     
     produtos_estoque = ProdutoEstoque.query.filter_by(ativo=True).order_by(ProdutoEstoque.nome).all()
 
     return render_template('operacional/painel.html', 
                            tarefas=tarefas,
-                           qtd_fila=qtd_fila, 
-                           qtd_producao=qtd_producao,
-                           qtd_retrabalho=qtd_retrabalho,
-                           qtd_pronto=qtd_pronto,
+                           qtd_fila=contagem.pendente, 
+                           qtd_producao=contagem.producao,
+                           qtd_retrabalho=contagem.retrabalho,
+                           qtd_pronto=contagem.pronto,
                            produtos_estoque=produtos_estoque)
\ No newline at end of file
@@ -0,0 +1,109 @@
+"""
+Contadores e listas da fila de produção, os mesmos para o painel inicial, a gestão
+de serviços e o painel operacional.
+
+Uma tarefa é um item de venda múltipla ou uma venda simples inteira (vendas
+canceladas e orçamentos ficam de fora). Só são lidas as tarefas em aberto e as
+entregues no mês, pelos índices parciais de cada caso: o custo acompanha o
+tamanho da fila, não o histórico de entregas.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, union_all, literal, func, and_, or_
+
+from src.extensoes import banco_de_dados as db
+from src.periodos import periodo_mes, hoje_brasilia
+from src.modulos.vendas.modelos import Venda, ItemVenda
+
+STATUS_ABERTOS = ('pendente', 'producao', 'retrabalho', 'pronto')
+STATUS_ATRASO = ('pendente', 'producao', 'retrabalho') # pronto só aguarda a retirada
+DIAS_ATRASO = 5
+
+
+@dataclass
+class ContagemTarefas:
+    pendente: int = 0
+    producao: int = 0
+    retrabalho: int = 0
+    pronto: int = 0
+    entregues_mes: int = 0
+    atrasados: int = 0
+
+
+@dataclass
+class Tarefa:
+    """Só o que as listas dos modais exibem (sem objeto ORM)"""
+    tipo: str # 'item' ou 'venda'
+    id: int
+    venda_id: int
+    descricao: str
+    cliente_nome: str
+    quantidade: int
+    data_criacao: datetime
+    status: str
+
+
+def _limite_atraso(agora=None):
+    return (agora or datetime.utcnow()) - timedelta(days=DIAS_ATRASO)
+
+
+def _tarefas(mes=None):
+    """Tarefas em aberto e, se `mes` for dado, as entregues dentro dele"""
+    item_entregue = and_(ItemVenda.status == 'entregue', mes.filtro(ItemVenda.data_entregue)) if mes else False
+    venda_entregue = and_(Venda.status == 'entregue', mes.filtro(Venda.data_entrega)) if mes else False
+
+    itens = select(
+        literal('item').label('tipo'), ItemVenda.id, ItemVenda.venda_id, ItemVenda.descricao, Venda.cliente_nome,
+        ItemVenda.quantidade, Venda.criado_em.label('data_criacao'), ItemVenda.status
+    ).join(Venda, Venda.id == ItemVenda.venda_id).where(
+        Venda.modo == 'multipla',
+        Venda.status != 'cancelado',
+        Venda.status != 'orcamento',
+        or_(ItemVenda.status.in_(STATUS_ABERTOS), item_entregue)
+    )
+    simples = select(
+        literal('venda'), Venda.id, Venda.id, Venda.descricao_servico, Venda.cliente_nome,
+        Venda.quantidade_pecas, Venda.criado_em, Venda.status
+    ).where(
+        Venda.modo == 'simples',
+        or_(Venda.status.in_(STATUS_ABERTOS), venda_entregue)
+    )
+    return union_all(itens, simples).subquery('tarefas')
+
+
+def contar_tarefas(hoje=None, agora=None):
+    """Tarefas por status, entregues no mês de `hoje` e atrasadas, numa consulta agrupada"""
+    hoje = hoje or hoje_brasilia()
+    tarefas = _tarefas(periodo_mes(hoje.month, hoje.year))
+    atrasada = and_(tarefas.c.status.in_(STATUS_ATRASO), tarefas.c.data_criacao <= _limite_atraso(agora))
+
+    contagem = ContagemTarefas()
+    for status, total, atrasadas in db.session.query(
+        tarefas.c.status, func.count(), func.count().filter(atrasada)
+    ).group_by(tarefas.c.status):
+        if status == 'entregue':
+            contagem.entregues_mes = total
+        else:
+            setattr(contagem, status, total)
+        contagem.atrasados += atrasadas
+    return contagem
+
+
+def listar_tarefas(hoje=None):
+    """{status: [Tarefa]} das tarefas em aberto e das entregues no mês de `hoje`, mais antigas primeiro"""
+    hoje = hoje or hoje_brasilia()
+    tarefas = _tarefas(periodo_mes(hoje.month, hoje.year))
+    por_status = {status: [] for status in STATUS_ABERTOS + ('entregue',)}
+    for linha in db.session.query(tarefas).order_by(tarefas.c.data_criacao, tarefas.c.id):
+        por_status[linha.status].append(Tarefa(*linha))
+    return por_status
+
+
+def tarefas_atrasadas(agora=None):
+    """Tarefas paradas (fila, produção ou retrabalho) há mais de DIAS_ATRASO dias desde a venda"""
+    tarefas = _tarefas()
+    return [Tarefa(*linha) for linha in db.session.query(tarefas).filter(
+        tarefas.c.status.in_(STATUS_ATRASO),
+        tarefas.c.data_criacao <= _limite_atraso(agora)
+    ).order_by(tarefas.c.data_criacao, tarefas.c.id)]
\ No newline at end of file
@@ -0,0 +1,248 @@
+"""
+Consultas do relatório de serviços, usadas pela tela (cards), pela API paginada
+e pela exportação para Excel. Tudo sai de consultas de colunas: nenhum objeto
+ORM por linha e nenhum lazy load.
+"""
+from dataclasses import dataclass
+
+from sqlalchemy import func, true, select
+from sqlalchemy.orm import aliased
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+from src.extensoes import banco_de_dados as db
+from src.periodos import Periodo, periodo_mes, periodo_datas, hoje_brasilia
+from src.paginacao import paginar_keyset
+from src.modulos.vendas.modelos import Venda, ItemVenda, Pagamento, CorServico
+from src.modulos.estoque.modelos import ProdutoEstoque
+from src.modulos.autenticacao.modelos import Usuario
+from src.modulos.rh.modelos import Colaborador
+
+DETALHES = ('item', 'venda')
+POR_PAGINA_PADRAO = 10
+POR_PAGINA_MAXIMO = 100
+
+# Ordenações aceitas pela API: nome -> coluna (rótulo da linha) em cada nível de detalhe
+ORDENACOES = {
+    'data': {'item': 'criado_em', 'venda': 'criado_em'},
+    'cliente': {'item': 'cliente', 'venda': 'cliente'},
+    'valor': {'item': 'valor_total_item', 'venda': 'valor_final'},
+    'a_receber': {'item': 'a_receber', 'venda': 'a_receber'},
+}
+
+
+@dataclass
+class FiltrosServicos:
+    """Filtros da tela de serviços, lidos uma vez da query string"""
+    periodo: Periodo = None
+    tipo_data_filtro: str = 'criacao'
+    status_pagamento: str = 'todos'
+    status_servico: str = 'todos'
+    mes: int = None
+    ano: int = None
+
+    @classmethod
+    def da_requisicao(cls, args):
+        hoje = hoje_brasilia()
+        tipo_periodo = args.get('tipo_periodo', 'mes')
+        mes = args.get('mes', hoje.month, type=int)
+        ano = args.get('ano', hoje.year, type=int)
+        data_inicio = args.get('data_inicio')
+        data_fim = args.get('data_fim')
+
+        if tipo_periodo == 'mes' and mes and ano:
+            periodo = periodo_mes(mes, ano)
+        elif tipo_periodo == 'periodo' and data_inicio and data_fim:
+            periodo = periodo_datas(data_inicio, data_fim)
+        else:
+            periodo = None
+
+        return cls(
+            periodo=periodo,
+            tipo_data_filtro=args.get('tipo_data_filtro', 'criacao'),
+            status_pagamento=args.get('status_pagamento', 'todos'),
+            status_servico=args.get('status_servico', 'todos'),
+            mes=mes,
+            ano=ano,
+        )
+
+    @property
+    def por_recebimento(self):
+        return self.tipo_data_filtro == 'recebimento'
+
+    def condicoes_venda(self):
+        condicoes = [Venda.status != 'orcamento']
+        if self.periodo is not None:
+            if self.por_recebimento:
+                subq = select(Pagamento.venda_id).where(self.periodo.filtro(Pagamento.data_pagamento))
+                condicoes.append(Venda.id.in_(subq))
+            else:
+                condicoes.append(self.periodo.filtro(Venda.criado_em))
+        if self.status_pagamento != 'todos':
+            condicoes.append(Venda.status_pagamento == self.status_pagamento)
+        if self.status_servico == 'cancelado':
+            condicoes.append(Venda.status == 'cancelado')
+        elif self.status_servico != 'todos':
+            condicoes.append(Venda.status != 'cancelado')
+        return condicoes
+
+    def condicoes_item(self):
+        if self.status_servico not in ('todos', 'cancelado'):
+            return [ItemVenda.status == self.status_servico]
+        return []
+
+
+def _pagamentos_da_venda(filtros):
+    """
+    LATERAL com os pagamentos da venda de cada linha agregados em dois arrays (datas e
+    valores, em ordem de data). Por recebimento, o que está fora do período fica de fora.
+    """
+    ordem_pgto = Pagamento.data_pagamento.asc()
+    pgtos = select(
+        func.array_agg(aggregate_order_by(Pagamento.data_pagamento, ordem_pgto)).label('datas'),
+        func.array_agg(aggregate_order_by(Pagamento.valor, ordem_pgto)).label('valores'),
+        func.sum(Pagamento.valor).label('total'),
+    ).where(Pagamento.venda_id == Venda.id)
+    if filtros.por_recebimento and filtros.periodo is not None:
+        pgtos = pgtos.where(filtros.periodo.filtro(Pagamento.data_pagamento))
+    return pgtos.lateral('pgtos')
+
+
+def _qtd_itens_da_venda():
+    """Subconsulta com o total de itens da venda de cada linha (independe dos filtros de item)"""
+    outro_item = aliased(ItemVenda)
+    return select(func.count(outro_item.id)).where(outro_item.venda_id == Venda.id).scalar_subquery()
+
+
+def _com_venda(consulta, pgtos):
+    """Pagamentos agregados e nome do vendedor (Usuario -> Colaborador) na mesma consulta"""
+    return consulta.outerjoin(pgtos, true())\
+        .outerjoin(Usuario, Usuario.id == Venda.vendedor_id)\
+        .outerjoin(Colaborador, Colaborador.id == Usuario.colaborador_id)
+
+
+def _colunas_venda(pgtos):
+    return [
+        Venda.id.label('venda_id'), Venda.criado_em.label('criado_em'),
+        pgtos.c.datas.label('datas'), pgtos.c.valores.label('valores'),
+        Venda.cliente_nome.label('cliente'),
+        func.coalesce(Colaborador.nome_completo, Usuario.usuario, 'N/D').label('vendedor'),
+        Venda.valor_acrescimo.label('acrescimo'), Venda.valor_desconto_aplicado.label('desconto'),
+        Venda.valor_final.label('valor_final'), Venda.valor_restante.label('a_receber'),
+        Venda.status.label('status_venda'), Venda.status_pagamento.label('status_pgto'),
+    ]
+
+
+def consulta_itens(filtros):
+    """Uma linha por item de venda (nível "detalhado" da tela e a exportação)"""
+    pgtos = _pagamentos_da_venda(filtros)
+    consulta = db.session.query(
+        *_colunas_venda(pgtos),
+        ItemVenda.id.label('item_id'), ItemVenda.descricao.label('item_desc'),
+        func.coalesce(ProdutoEstoque.nome, CorServico.nome, 'Diversos').label('produto'),
+        ItemVenda.quantidade.label('qtd'), ItemVenda.valor_unitario.label('valor_unit'),
+        ItemVenda.valor_total.label('valor_total_item'), ItemVenda.status.label('status_item'),
+        _qtd_itens_da_venda().label('qtd_itens_venda'),
+    ).select_from(ItemVenda).join(Venda, ItemVenda.venda_id == Venda.id)\
+        .filter(*filtros.condicoes_venda(), *filtros.condicoes_item())
+    return _com_venda(consulta, pgtos)\
+        .outerjoin(ProdutoEstoque, ProdutoEstoque.id == ItemVenda.produto_id)\
+        .outerjoin(CorServico, CorServico.id == ItemVenda.cor_id)
+
+
+def consulta_vendas(filtros):
+    """Uma linha por venda (nível "agrupado"); qtd soma só os itens que passam nos filtros"""
+    pgtos = _pagamentos_da_venda(filtros)
+    itens_filtrados = (ItemVenda.venda_id == Venda.id, *filtros.condicoes_item())
+    qtd = select(func.sum(ItemVenda.quantidade)).where(*itens_filtrados).scalar_subquery()
+    tem_item = select(ItemVenda.id).where(*itens_filtrados).exists()
+
+    consulta = db.session.query(*_colunas_venda(pgtos), qtd.label('qtd'))\
+        .select_from(Venda).filter(*filtros.condicoes_venda(), tem_item)
+    return _com_venda(consulta, pgtos)
+
+
+def _chaves(detalhe, ordenar, ascendente):
+    """Ordenação completa e única para o keyset: coluna escolhida + venda (+ item)"""
+    rotulo = ORDENACOES[ordenar][detalhe]
+    coluna = {
+        'criado_em': Venda.criado_em, 'cliente': Venda.cliente_nome, 'valor_final': Venda.valor_final,
+        'valor_total_item': ItemVenda.valor_total, 'a_receber': Venda.valor_restante,
+    }[rotulo]
+    chaves = [(coluna, ascendente), (Venda.id, ascendente)]
+    rotulos = [rotulo, 'venda_id']
+    if detalhe == 'item':
+        chaves.append((ItemVenda.id, True))
+        rotulos.append('item_id')
+    return chaves, lambda linha: [getattr(linha, r) for r in rotulos]
+
+
+def pagina(filtros, detalhe='item', ordenar='data', ascendente=False, por_pagina=POR_PAGINA_PADRAO,
+           depois=None, antes=None):
+    consulta = consulta_itens(filtros) if detalhe == 'item' else consulta_vendas(filtros)
+    chaves, chave_da_linha = _chaves(detalhe, ordenar, ascendente)
+    return paginar_keyset(consulta, chaves, chave_da_linha, por_pagina, depois=depois, antes=antes)
+
+
+def totais(filtros):
+    """Cards do topo em uma consulta: serviços, itens, faturamento, recebido no filtro e a receber"""
+    por_venda = db.session.query(
+        ItemVenda.venda_id.label('venda_id'), func.count(ItemVenda.id).label('itens')
+    ).join(Venda, ItemVenda.venda_id == Venda.id)\
+        .filter(*filtros.condicoes_venda(), *filtros.condicoes_item())\
+        .group_by(ItemVenda.venda_id).subquery()
+    pgtos = _pagamentos_da_venda(filtros)
+    ativa = Venda.status != 'cancelado'
+
+    qtd_servicos, qtd_itens, total_valor, total_pago, total_restante = db.session.query(
+        func.count(por_venda.c.venda_id),
+        func.coalesce(func.sum(por_venda.c.itens), 0),
+        func.coalesce(func.sum(Venda.valor_final).filter(ativa), 0),
+        func.coalesce(func.sum(pgtos.c.total).filter(ativa), 0),
+        func.coalesce(func.sum(Venda.valor_restante).filter(ativa), 0),
+    ).select_from(por_venda).join(Venda, Venda.id == por_venda.c.venda_id)\
+        .outerjoin(pgtos, true()).one()
+
+    return {
+        'qtd_servicos': qtd_servicos,
+        'qtd_itens': int(qtd_itens),
+        'total_valor': float(total_valor),
+        'total_pago': float(total_pago),
+        'total_restante': float(total_restante),
+    }
+
+
+def pagamentos_da_linha(linha):
+    return [(d, float(v)) for d, v in zip(linha.datas or [], linha.valores or [])]
+
+
+def linha_json(linha, detalhe):
+    """Linha da API no formato que static/js/relatorios.js desenha"""
+    pagamentos = pagamentos_da_linha(linha)
+    saldo = float(linha.acrescimo or 0) - float(linha.desconto or 0)
+    dados = {
+        'venda_id': linha.venda_id,
+        'data_fmt': linha.criado_em.strftime('%d/%m/%Y'),
+        'pagamentos_detalhados': [{'data': d.strftime('%d/%m/%Y'), 'valor': v} for d, v in pagamentos],
+        'cliente': linha.cliente,
+        'vendedor': linha.vendedor,
+        'qtd': float(linha.qtd or 0),
+        'valor_pago_venda': sum((v for _, v in pagamentos), 0.0), # Soma apenas o valor do filtro
+        'a_receber_venda': float(linha.a_receber),
+        'status_pgto': linha.status_pgto,
+    }
+    if detalhe == 'item':
+        dados.update({
+            'item_desc': linha.item_desc,
+            'produto': linha.produto,
+            'valor_unit': float(linha.valor_unit),
+            'valor_total': float(linha.valor_total_item),
+            'acresc_desc': saldo / (linha.qtd_itens_venda or 1),
+            'status_prod': linha.status_item,
+        })
+    else:
+        dados.update({
+            'valor_total': float(linha.valor_final),
+            'acresc_desc': saldo,
+            'status_prod': linha.status_venda,
+        })
+    return dados
@@ -1,13 +1,15 @@
-from flask import render_template, request, send_file
+from flask import render_template, request
 from flask_login import login_required
-from sqlalchemy import func, extract
+from sqlalchemy import func
 from datetime import date
-import io
-import openpyxl
 
 from src.extensoes import banco_de_dados as db
+from src.periodos import periodo_mes, periodo_datas, hoje_brasilia
+from src.exportacao import linhas_em_lotes, resposta_planilha
 from src.modulos.vendas.modelos import Venda, ItemVenda
 from src.modulos.estoque.modelos import MovimentacaoEstoque, ProdutoEstoque
+from src.modulos.autenticacao.modelos import Usuario
+from src.modulos.rh.modelos import Colaborador
 from src.modulos.autenticacao.permissoes import cargo_exigido
 from src.modulos.relatorios import bp_relatorios
 
@@ -16,8 +18,8 @@ from src.modulos.relatorios import bp_relatorios
 @cargo_exigido('relatorios_consumo')
 def relatorio_consumo():
     tipo_periodo = request.args.get('tipo_periodo', 'mes')
-    mes = request.args.get('mes', date.today().month, type=int)
-    ano = request.args.get('ano', date.today().year, type=int)
+    mes = request.args.get('mes', hoje_brasilia().month, type=int)
+    ano = request.args.get('ano', hoje_brasilia().year, type=int)
     data_inicio = request.args.get('data_inicio')
     data_fim = request.args.get('data_fim')
     produto_id = request.args.get('produto_id', 'todos')
@@ -43,42 +45,47 @@ def relatorio_consumo():
     )
 
     # Filtros
+    periodo = None
     if tipo_periodo == 'mes' and mes and ano:
-        base_query = base_query.filter(extract('month', MovimentacaoEstoque.data_movimentacao) == mes, 
-                                     extract('year', MovimentacaoEstoque.data_movimentacao) == ano)
+        periodo = periodo_mes(mes, ano)
     elif tipo_periodo == 'periodo' and data_inicio and data_fim:
-        base_query = base_query.filter(func.date(MovimentacaoEstoque.data_movimentacao) >= data_inicio, 
-                                     func.date(MovimentacaoEstoque.data_movimentacao) <= data_fim)
+        periodo = periodo_datas(data_inicio, data_fim)
+    if periodo is not None:
+        base_query = base_query.filter(periodo.filtro(MovimentacaoEstoque.data_movimentacao))
 
     if produto_id != 'todos':
         base_query = base_query.filter(ProdutoEstoque.id == int(produto_id))
 
+    # EXPORTAÇÃO EXCEL: Aqui ignoramos a paginação e exportamos tudo (em lotes, direto do cursor)
+    if request.args.get('exportar') == 'excel':
+        colunas = base_query.outerjoin(
+            Usuario, MovimentacaoEstoque.usuario_id == Usuario.id
+        ).outerjoin(
+            Colaborador, Usuario.colaborador_id == Colaborador.id
+        ).with_entities(
+            MovimentacaoEstoque.data_movimentacao, ProdutoEstoque.nome, ProdutoEstoque.unidade,
+            MovimentacaoEstoque.quantidade, MovimentacaoEstoque.origem, Venda.id,
+            func.coalesce(ItemVenda.descricao, MovimentacaoEstoque.observacao), Venda.cliente_nome,
+            func.coalesce(Colaborador.nome_completo, Usuario.usuario, 'Sistema')
+        ).order_by(MovimentacaoEstoque.data_movimentacao.desc())
+
+        linhas = (
+            [
+                data.strftime('%d/%m/%Y %H:%M'), nome, unidade, float(qtd), (origem or '').upper(),
+                venda_id or '-', item_desc, cliente or 'Uso Interno / Manual', responsavel
+            ]
+            for data, nome, unidade, qtd, origem, venda_id, item_desc, cliente, responsavel in linhas_em_lotes(colunas)
+        )
+        return resposta_planilha(
+            f'relatorio_consumo_{date.today().strftime("%d%m%Y")}.xlsx', "Consumo de Materiais",
+            ["Data/Hora", "Material", "Unidade", "Qtd Consumida", "Origem", "ID Serviço", "Item Solicitado", "Cliente", "Responsável"],
+            linhas
+        )
+
     # CÁLCULO GERAL RÁPIDO (Acontece antes de paginar para mostrar os KPIs no topo da tela)
     qtd_registros = base_query.count()
     total_consumido = base_query.with_entities(func.sum(MovimentacaoEstoque.quantidade)).scalar() or 0
 
-    # EXPORTAÇÃO EXCEL: Aqui ignoramos a paginação e exportamos tudo.
-    if request.args.get('exportar') == 'excel':
-        resultados = base_query.order_by(MovimentacaoEstoque.data_movimentacao.desc()).all()
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Consumo de Materiais"
-        ws.append(["Data/Hora", "Material", "Unidade", "Qtd Consumida", "Origem", "ID Serviço", "Item Solicitado", "Cliente", "Responsável"])
-        
-        for mov, prod, item, venda in resultados:
-            ws.append([
-                mov.data_movimentacao.strftime('%d/%m/%Y %H:%M'), 
-                prod.nome, prod.unidade, float(mov.quantidade), mov.origem.upper(),
-                venda.id if venda else '-', item.descricao if item else mov.observacao, 
-                venda.cliente_nome if venda else 'Uso Interno / Manual', 
-                mov.usuario.nome if mov.usuario else 'Sistema'
-            ])
-            
-        out = io.BytesIO()
-        wb.save(out)
-        out.seek(0)
-        return send_file(out, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', as_attachment=True, download_name=f'relatorio_consumo_{date.today().strftime("%d%m%Y")}.xlsx')
-
     # EXECUÇÃO COM PAGINAÇÃO NO BANCO (Só carrega as x linhas da página)
     paginacao = base_query.order_by(MovimentacaoEstoque.data_movimentacao.desc()).paginate(page=page, per_page=per_page, error_out=False)
 
@@ -62,7 +62,10 @@ class DocumentoColaborador(db.Model):
     tipo_arquivo = db.Column(db.String(10), nullable=False)
     tamanho_kb = db.Column(db.Float, nullable=False)
     nome_arquivo = db.Column(db.String(255))
-    dados_binarios = db.Column(db.LargeBinary)
+    # Legado: documentos antigos no banco. Os novos ficam no armazenamento de mídia (src/midia.py).
+    # deferred: a lista de documentos do perfil não traz os bytes; só visualizar/baixar leem
+    dados_binarios = db.deferred(db.Column(db.LargeBinary))
+    hash_sha256 = db.Column(db.String(64)) # endereço no armazenamento de mídia e ETag (304 sem ler os bytes)
     descricao = db.Column(db.String(100))
 
     criado_em = db.Column(db.DateTime, default=hora_brasilia)
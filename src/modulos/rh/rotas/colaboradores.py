@@ -11,6 +11,7 @@ from src.modulos.rh import bp_rh
 # Modelos
 from src.modulos.rh.modelos import Colaborador
 from src.modulos.corporativo.modelos import Cargo
+from src.modulos.autenticacao.modelos import invalidar_permissoes
 from src.modulos.financeiro.modelos import Despesa
 
 # Formulários
@@ -262,6 +263,10 @@ def editar_colaborador(id):
             
             msg_sync = sincronizar_financeiro_rh(colab)
             db.session.commit()
+            
+            # Trocou de cargo -> as permissões herdadas mudam
+            if colab.cargo_id != valor_antigo_cargo and colab.usuario_acesso:
+                invalidar_permissoes(colab.usuario_acesso.id)
             flash(f'Dados atualizados. {msg_sync}', 'success')
             return redirect(url_for('rh.listar_colaboradores'))
 
@@ -1,9 +1,10 @@
-from flask import render_template, redirect, url_for, flash, send_file
+from flask import render_template, redirect, url_for, flash, abort
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from io import BytesIO
 
-from src.extensoes import banco_de_dados as db
+from src.extensoes import banco_de_dados as db, armazenamento_midia
+from src.midia import enviar_arquivo
 from src.modulos.autenticacao.permissoes import cargo_exigido
 from src.modulos.rh import bp_rh
 
@@ -22,14 +23,15 @@ def documentos_colaborador(colaborador_id):
     if form.validate_on_submit():
         arquivo = form.arquivo.data
         filename = secure_filename(arquivo.filename)
-        dados = arquivo.read()
+        # O upload já chegou no disco com hash e tamanho: só é movido para o armazenamento de mídia
+        hash_sha256, tamanho = armazenamento_midia.salvar(arquivo.stream)
         
         novo_doc = DocumentoColaborador(
             colaborador_id=colab.id,
             nome_original=filename,
             tipo_arquivo=filename.rsplit('.', 1)[1].lower() if '.' in filename else 'bin',
-            tamanho_kb=len(dados)/1024,
-            dados_binarios=dados,
+            tamanho_kb=tamanho/1024,
+            hash_sha256=hash_sha256,
             descricao=form.descricao.data,
             enviado_por_id=current_user.id
         )
@@ -40,35 +42,48 @@ def documentos_colaborador(colaborador_id):
         
     return render_template('rh/documentos.html', colab=colab, form=form)
 
+def _etag_documento(doc):
+    return f"doc-{doc.id}-{doc.hash_sha256 or 'sem-hash'}"
+
+def _abrir_documento(doc):
+    """Documentos novos estão no armazenamento de mídia; os antigos, no banco (dados_binarios é deferred)"""
+    if doc.hash_sha256 is None:
+        return BytesIO(doc.dados_binarios)
+    if not armazenamento_midia.existe(doc.hash_sha256):
+        abort(404)
+    return armazenamento_midia.caminho(doc.hash_sha256)
+
 @bp_rh.route('/documentos/visualizar/<int:doc_id>')
 @login_required
 def visualizar_documento_rh(doc_id):
-    doc = DocumentoColaborador.query.get_or_404(doc_id)
-    
     if not current_user.tem_permissao('rh_documentos'):
         return "Acesso Negado", 403
+
+    # Os bytes (coluna deferred) só são lidos se o navegador ainda não tiver o arquivo
+    doc = DocumentoColaborador.query.get_or_404(doc_id)
         
     # Define mimetype correto
     tipo_mime = 'application/pdf' if doc.tipo_arquivo == 'pdf' else f'image/{doc.tipo_arquivo}'
     if doc.tipo_arquivo == 'jpg': tipo_mime = 'image/jpeg'
 
-    return send_file(
-        BytesIO(doc.dados_binarios),
+    return enviar_arquivo(
+        _etag_documento(doc),
+        lambda: _abrir_documento(doc),
         mimetype=tipo_mime,
-        as_attachment=False,
         download_name=doc.nome_original
     )
 
 @bp_rh.route('/documentos/baixar/<int:doc_id>')
 @login_required
 def baixar_documento_rh(doc_id):
-    doc = DocumentoColaborador.query.get_or_404(doc_id)
-    
     if not current_user.tem_permissao('rh_documentos'):
         return "Acesso Negado", 403
+
+    doc = DocumentoColaborador.query.get_or_404(doc_id)
         
-    return send_file(
-        BytesIO(doc.dados_binarios),
+    return enviar_arquivo(
+        _etag_documento(doc),
+        lambda: _abrir_documento(doc),
         download_name=doc.nome_original,
         as_attachment=True
     )
@@ -79,7 +94,9 @@ def baixar_documento_rh(doc_id):
 def deletar_documento_rh(doc_id):
     doc = DocumentoColaborador.query.get_or_404(doc_id)
     colab_id = doc.colaborador_id
+    hash_sha256 = doc.hash_sha256
     db.session.delete(doc)
     db.session.commit()
+    armazenamento_midia.remover_sem_uso(db.session, [hash_sha256])
     flash('Documento removido.', 'success')
     return redirect(url_for('rh.documentos_colaborador', colaborador_id=colab_id))
\ No newline at end of file
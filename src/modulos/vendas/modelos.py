@@ -1,11 +1,22 @@
 from src.extensoes import banco_de_dados as db
+from sqlalchemy import func
 from datetime import datetime
+from decimal import Decimal
 import pytz
 
 def hora_brasilia():
     tz = pytz.timezone('America/Sao_Paulo')
     return datetime.now(tz)
 
+# Status de item contados em Venda (itens cancelados não entram: só existem em venda cancelada)
+CONTADORES_STATUS_ITENS = {
+    'pendente': 'itens_pendentes',
+    'producao': 'itens_producao',
+    'retrabalho': 'itens_retrabalho',
+    'pronto': 'itens_prontos',
+    'entregue': 'itens_entregues',
+}
+
 # --- MODELOS AUXILIARES ---
 class CorServico(db.Model):
     __tablename__ = 'cores_servico'
@@ -38,6 +49,12 @@ class Pagamento(db.Model):
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
     usuario = db.relationship('Usuario')
 
+    __table_args__ = (
+        db.Index('ix_pagamentos_venda_id', 'venda_id'),
+        # Somas por período (painel, metas) saem só do índice, sem visitar a tabela
+        db.Index('ix_pagamentos_data_pagamento', 'data_pagamento', postgresql_include=['venda_id', 'valor']),
+    )
+
 # --- ITEM DA VENDA (ATUALIZADO) ---
 class ItemVenda(db.Model):
     __tablename__ = 'venda_itens'
@@ -83,6 +100,59 @@ class ItemVenda(db.Model):
     # Relacionamento com as Fotos
     fotos = db.relationship('FotoItemVenda', backref='item', cascade='all, delete-orphan')
 
+    __table_args__ = (
+        db.Index('ix_venda_itens_venda_status', 'venda_id', 'status'),
+        # Fila da produção e contagens por status: itens entregues são a maioria e ficam de fora
+        db.Index('ix_venda_itens_em_aberto', 'status', 'venda_id', postgresql_where=db.text("status <> 'entregue'")),
+        # Entregues no mês (operacional/servicos.py): só a faixa de datas, não o histórico todo
+        db.Index('ix_venda_itens_entregues', 'data_entregue', postgresql_where=db.text("status = 'entregue'")),
+    )
+
+# --- CLIENTES (UM REGISTRO POR CLIENTE, DEDUPLICADO) ---
+class Cliente(db.Model):
+    """
+    Cadastro único de clientes, alimentado pelas vendas (vendas/servicos.py:
+    sincronizar_cliente). A identidade é o documento só com dígitos; sem documento,
+    o nome normalizado (sem acento/caixa, espaços simples). A venda continua
+    guardando a cópia dos dados do cliente no momento da venda.
+    """
+    __tablename__ = 'clientes'
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(2), nullable=False)
+    nome = db.Column(db.String(150), nullable=False)
+    # Collation "C": os btree servem tanto o LIKE 'abc%' quanto a ordem alfabética do autocomplete
+    nome_normalizado = db.Column(db.String(150, collation='C'), nullable=False)
+    documento = db.Column(db.String(20, collation='C'), nullable=True) # só dígitos
+    solicitante = db.Column(db.String(100), nullable=True)
+    contato = db.Column(db.String(50), nullable=True)
+    email = db.Column(db.String(100), nullable=True)
+    endereco = db.Column(db.String(255), nullable=True)
+    criado_em = db.Column(db.DateTime, default=hora_brasilia)
+    atualizado_em = db.Column(db.DateTime, default=hora_brasilia, onupdate=hora_brasilia)
+
+    __table_args__ = (
+        db.Index('ux_clientes_documento', 'documento', unique=True, postgresql_where=db.text('documento IS NOT NULL')),
+        db.Index('ux_clientes_nome_sem_documento', 'nome_normalizado', unique=True,
+                 postgresql_where=db.text('documento IS NULL')),
+        # Autocomplete pelo começo do nome (pelo documento, serve o ux_clientes_documento)
+        db.Index('ix_clientes_nome_prefixo', 'nome_normalizado'),
+    )
+
+class PalavraCliente(db.Model):
+    """
+    Cada palavra do nome normalizado de um cliente: o autocomplete acha pelo sobrenome
+    ("silv" -> "joao silva") com uma faixa da chave primária, que para no LIMIT por
+    mais comum que seja o prefixo (um GIN montaria o bitmap de todos antes).
+    """
+    __tablename__ = 'clientes_palavras'
+    palavra = db.Column(db.String(150, collation='C'), primary_key=True)
+    cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.id', ondelete='CASCADE'), primary_key=True)
+
+    __table_args__ = (
+        # Conferir as outras palavras digitadas de um candidato sem ir à tabela
+        db.Index('ix_clientes_palavras_cliente', 'cliente_id', 'palavra'),
+    )
+
 # --- VENDA PAI (MANTIDO) ---
 class Venda(db.Model):
     __tablename__ = 'vendas'
@@ -98,6 +168,8 @@ class Venda(db.Model):
     cliente_contato = db.Column(db.String(50), nullable=False)
     cliente_email = db.Column(db.String(100), nullable=True)
     cliente_endereco = db.Column(db.String(255), nullable=True)
+    cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.id'), nullable=True)
+    cliente = db.relationship('Cliente')
 
     # Detalhes (Venda Simples)
     descricao_servico = db.Column(db.Text, nullable=True) 
@@ -156,16 +228,51 @@ class Venda(db.Model):
     itens = db.relationship('ItemVenda', backref='venda', lazy=True, cascade="all, delete-orphan")
     prioridade = db.Column(db.Boolean, default=False)
 
-    @property
-    def valor_pago(self):
-        if not self.pagamentos: return 0.0
-        return sum(p.valor for p in self.pagamentos)
+    # Totais materializados (mantidos por recalcular_totais a cada escrita em pagamentos)
+    valor_pago = db.Column(db.Numeric(10, 2), nullable=False, default=0, server_default='0')
+    valor_restante = db.Column(db.Numeric(10, 2), nullable=False, default=0, server_default='0')
+
+    # Itens por status (mantidos no flush por vendas/servicos.py: monitorar_status_itens)
+    itens_pendentes = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    itens_producao = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    itens_retrabalho = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    itens_prontos = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    itens_entregues = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        # "A Receber": SUM(valor_restante) só varre as vendas ainda em aberto
+        db.Index('ix_vendas_em_aberto', 'status', 'valor_restante', postgresql_where=db.text('valor_restante > 0')),
+        db.Index('ix_vendas_status_modo', 'status', 'modo'),
+        db.Index('ix_vendas_entregues', 'data_entrega', postgresql_where=db.text("status = 'entregue'")),
+        db.Index('ix_vendas_canceladas', 'data_cancelamento', postgresql_where=db.text("status = 'cancelado'")),
+        db.Index('ix_vendas_criado_em', 'criado_em'),
+        db.Index('ix_vendas_vendedor_id', 'vendedor_id'),
+        db.Index('ix_vendas_cliente_id', 'cliente_id'),
+    )
+
+    def recalcular_totais(self):
+        """
+        Atualiza valor_pago/valor_restante a partir da tabela de pagamentos.
+        Deve ser chamado na mesma transação que insere/edita/exclui um Pagamento.
+        """
+        if self.id is not None:
+            # Trava a linha da venda: dois pagamentos simultâneos não perdem a soma um do outro
+            db.session.query(Venda.id).filter(Venda.id == self.id).with_for_update().scalar()
+            pago = db.session.query(func.coalesce(func.sum(Pagamento.valor), 0))\
+                .filter(Pagamento.venda_id == self.id).scalar()
+        else:
+            pago = Decimal(0)
+
+        self.valor_pago = Decimal(pago)
+        self.valor_restante = max(Decimal(0), Decimal(self.valor_final or 0) - self.valor_pago)
 
     @property
-    def valor_restante(self):
-        pago = self.valor_pago
-        restante = float(self.valor_final) - float(pago)
-        return max(0.0, restante)
+    def status_itens(self):
+        """
+        Status presentes entre os itens, pelos contadores (sem carregar os itens).
+        Alterações ainda não enviadas ao banco só aparecem depois de um flush.
+        """
+        return {status for status, coluna in CONTADORES_STATUS_ITENS.items() if getattr(self, coluna)}
 
 class ItemVendaHistorico(db.Model):
     __tablename__ = 'item_venda_historico'
@@ -182,17 +289,28 @@ class ItemVendaHistorico(db.Model):
     usuario = db.relationship('Usuario')
     item = db.relationship('ItemVenda', backref=db.backref('historico_acoes', lazy=True, cascade="all, delete-orphan"))
 
-# --- TABELA DE FOTOS (ALTERADA PARA BINÁRIO) ---
+# --- TABELA DE FOTOS (METADADOS; CONTEÚDO NO ARMAZENAMENTO DE MÍDIA) ---
 class FotoItemVenda(db.Model):
     __tablename__ = 'fotos_itens_venda'
     
     id = db.Column(db.Integer, primary_key=True)
     item_venda_id = db.Column(db.Integer, db.ForeignKey('venda_itens.id'), nullable=False)
     
-    # SALVANDO NO BANCO (BLOB)
     nome_arquivo = db.Column(db.String(255), nullable=False)
     tipo_mime = db.Column(db.String(50), nullable=False) # ex: image/jpeg
-    dados_binarios = db.Column(db.LargeBinary, nullable=False) # Arquivo real
+
+    # Arquivo real fica no armazenamento de mídia (src/midia.py), endereçado pelo hash
+    hash_sha256 = db.Column(db.String(64), index=True) # 'original' (WebP normalizado depois de processada)
+    tamanho_bytes = db.Column(db.Integer)
+    hash_media = db.Column(db.String(64), index=True)
+    hash_miniatura = db.Column(db.String(64), index=True)
+    # 'pendente' (arquivo como enviado, aguardando o processador de mídia) | 'pronto' (versões geradas)
+    # | 'ignorado' (não é imagem) | 'erro' (falhou; o "flask gerar-versoes-fotos" tenta de novo)
+    status_midia = db.Column(db.String(20), nullable=False, default='pendente', server_default='pendente')
+
+    # Legado: fotos antigas ainda no banco até rodar "flask migrar-fotos-disco".
+    # deferred: listagens (joinedload das fotos) não trazem os bytes; só imagem_db lê
+    dados_binarios = db.deferred(db.Column(db.LargeBinary, nullable=True))
     
     etapa = db.Column(db.String(20), nullable=False) # 'recebimento' ou 'gestao'
     
@@ -1,9 +1,11 @@
-from flask import redirect, url_for, flash, request, jsonify, send_file
+from flask import redirect, url_for, flash, request, jsonify, abort
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
-from src.extensoes import banco_de_dados as db
+from src.extensoes import banco_de_dados as db, armazenamento_midia
+from src.midia import enviar_arquivo
 from src.modulos.vendas.modelos import Venda,  hora_brasilia, ItemVenda, ItemVendaHistorico, FotoItemVenda
 from src.modulos.autenticacao.permissoes import cargo_exigido  # <--- IMPORTAR
+from src.modulos.vendas.servicos import agendar_processamento
 from io import BytesIO # Necessário para converter bytes em arquivo
 from . import bp_vendas
 
@@ -79,8 +81,8 @@ def mudar_status_item(id, novo_status):
             item.data_entregue = agora
             item.usuario_entrega_id = current_user.id
             
-        todos_itens = ItemVenda.query.filter_by(venda_id=venda_pai.id).all()
-        status_set = set(i.status for i in todos_itens)
+        db.session.flush() # atualiza os contadores de status da venda com a mudança do item
+        status_set = venda_pai.status_itens
         
         if status_set == {'entregue'}:
             if venda_pai.status != 'entregue':
@@ -126,6 +128,9 @@ def cancelar_venda(id):
     venda.usuario_cancelamento_id = current_user.id
     
     # PERCORRE E CANCELA TODOS OS ITENS DA VENDA (Simples ou Múltipla)
+    # Mantém os totais coerentes com os pagamentos já registrados
+    venda.recalcular_totais()
+    
     for item in venda.itens:
         if item.status != 'cancelado':
             status_antigo = item.status
@@ -153,12 +158,25 @@ def cancelar_venda(id):
 @login_required
 def imagem_db(foto_id):
     foto = FotoItemVenda.query.get_or_404(foto_id)
-    
-    return send_file(
-        BytesIO(foto.dados_binarios),
+
+    # ?tamanho=miniatura|media|original — sem a versão pedida (não processada), vai o original
+    versoes = {'miniatura': foto.hash_miniatura, 'media': foto.hash_media}
+    hash_arquivo = versoes.get(request.args.get('tamanho')) or foto.hash_sha256
+
+    def abrir():
+        # Foto antiga que ainda não passou pelo "flask migrar-fotos-disco" (dados_binarios é deferred)
+        if hash_arquivo is None:
+            return BytesIO(foto.dados_binarios)
+        if not armazenamento_midia.existe(hash_arquivo):
+            abort(404)
+        return armazenamento_midia.caminho(hash_arquivo)
+
+    return enviar_arquivo(
+        f"foto-{foto.id}-{hash_arquivo or 'banco'}",
+        abrir,
         mimetype=foto.tipo_mime,
-        as_attachment=False,
-        download_name=foto.nome_arquivo
+        download_name=foto.nome_arquivo,
+        imutavel=foto.status_midia in ('pronto', 'ignorado')
     )
 # -----------------------------------------
 
@@ -181,18 +199,22 @@ def upload_foto_servico(id):
 
         filename = secure_filename(arquivo.filename)
         mimetype = arquivo.mimetype or 'application/octet-stream'
-        dados = arquivo.read() # Lê o arquivo para memória
+        hash_sha256, tamanho = armazenamento_midia.salvar(arquivo.stream)
+        if tamanho == 0:
+            return jsonify({'erro': 'Arquivo vazio'}), 400
         
-        # Salva no banco
+        # No banco ficam só os metadados
         nova_foto = FotoItemVenda(
             item_venda_id=item_alvo.id,
             nome_arquivo=filename,
             tipo_mime=mimetype,
-            dados_binarios=dados,
+            hash_sha256=hash_sha256,
+            tamanho_bytes=tamanho,
             etapa='gestao',
             enviado_por_id=current_user.id
         )
         db.session.add(nova_foto)
+        agendar_processamento(nova_foto) # versões geradas em segundo plano
         db.session.commit()
         
         return jsonify({
@@ -210,8 +232,11 @@ def upload_foto_servico(id):
 def deletar_foto(foto_id):
     foto = FotoItemVenda.query.get_or_404(foto_id)
     try:
+        hashes = [foto.hash_sha256, foto.hash_media, foto.hash_miniatura]
         db.session.delete(foto)
         db.session.commit()
+        # O mesmo arquivo pode servir a outras fotos (deduplicação): só sai do disco se ficou sem uso
+        armazenamento_midia.remover_sem_uso(db.session, hashes)
         return jsonify({'sucesso': True})
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
@@ -229,17 +254,21 @@ def upload_foto_item_especifico(item_id):
     try:
         filename = secure_filename(arquivo.filename)
         mimetype = arquivo.mimetype or 'application/octet-stream'
-        dados = arquivo.read()
+        hash_sha256, tamanho = armazenamento_midia.salvar(arquivo.stream)
+        if tamanho == 0:
+            return jsonify({'erro': 'Arquivo vazio'}), 400
         
         nova_foto = FotoItemVenda(
             item_venda_id=item.id, # Vincula direto ao item correto
             nome_arquivo=filename,
             tipo_mime=mimetype,
-            dados_binarios=dados,
+            hash_sha256=hash_sha256,
+            tamanho_bytes=tamanho,
             etapa='gestao_extra',
             enviado_por_id=current_user.id
         )
         db.session.add(nova_foto)
+        agendar_processamento(nova_foto) # versões geradas em segundo plano
         db.session.commit()
         
         return jsonify({
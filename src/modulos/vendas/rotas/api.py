@@ -1,7 +1,7 @@
 from flask import jsonify, request, url_for
 from flask_login import login_required
-from src.extensoes import banco_de_dados as db
 from src.modulos.vendas.modelos import Venda, CorServico
+from src.modulos.vendas.servicos import sugerir_clientes, formatar_documento
 
 # Importa o Blueprint da pasta atual
 from . import bp_vendas
@@ -10,27 +10,31 @@ from . import bp_vendas
 @bp_vendas.route('/api/buscar-clientes')
 @login_required
 def buscar_clientes():
-    termo = request.args.get('q', '').lower()
+    termo = request.args.get('q', '').strip()
     
-    # Busca nomes distintos de clientes que já compraram
-    # Filtra por termo se fornecido (mínimo 2 letras)
+    # Sugestões do cadastro de clientes (mínimo 2 letras), pelo começo do nome ou do documento
     if len(termo) < 2:
         return jsonify([])
 
-    # Consulta otimizada: Traz apenas nomes únicos que contém o termo
-    clientes = db.session.query(Venda.cliente_nome, Venda.cliente_documento)\
-        .filter(Venda.cliente_nome.ilike(f'%{termo}%'))\
-        .distinct().limit(10).all()
-
-    # Formata para JSON
     resultados = []
-    for nome, doc in clientes:
+    for cliente in sugerir_clientes(termo):
         resultados.append({
-            'nome': nome,
-            'documento': doc or ''
+            'nome': cliente.nome,
+            'documento': formatar_documento(cliente.documento),
+            'tipo': cliente.tipo,
+            'solicitante': cliente.solicitante or '',
+            'contato': cliente.contato or '',
+            'email': cliente.email or '',
+            'endereco': cliente.endereco or ''
         })
-        
-    return jsonify(resultados)
+
+    # O formulário consulta a cada pausa na digitação: a mesma busca (ex.: apagar uma letra)
+    # sai do cache do navegador por 1 minuto e depois só revalida (304 se nada mudou)
+    resposta = jsonify(resultados)
+    resposta.cache_control.private = True
+    resposta.cache_control.max_age = 60
+    resposta.add_etag()
+    return resposta.make_conditional(request)
 
 # --- API: BUSCAR PRODUTOS/SERVIÇOS (AUTOCOMPLETE) ---
 @bp_vendas.route('/api/buscar-produtos')
@@ -73,6 +77,7 @@ def detalhes_servico(id):
             fotos_item.append({
                 'id': foto.id,
                 'url': url_for('vendas.imagem_db', foto_id=foto.id),
+                'miniatura': url_for('vendas.imagem_db', foto_id=foto.id, tamanho='miniatura'),
                 'nome': foto.nome_arquivo
             })
 
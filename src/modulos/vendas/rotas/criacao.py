@@ -2,12 +2,13 @@ import os
 from werkzeug.utils import secure_filename
 from flask import render_template, redirect, url_for, flash, request, current_app
 from flask_login import login_required, current_user
-from src.extensoes import banco_de_dados as db
+from src.extensoes import banco_de_dados as db, armazenamento_midia
 from src.modulos.vendas.modelos import Venda, CorServico, hora_brasilia, ItemVenda, ItemVendaHistorico, FotoItemVenda
 from src.modulos.vendas.formularios import FormularioVendaWizard
 from src.modulos.estoque.modelos import ProdutoEstoque
 from decimal import Decimal
 from src.modulos.autenticacao.permissoes import cargo_exigido
+from src.modulos.vendas.servicos import agendar_processamento, sincronizar_cliente
 from . import bp_vendas
 
 # ... (Função converter_decimal mantida) ...
@@ -19,7 +20,7 @@ def converter_decimal(valor_str):
     except: return Decimal('0.00')
 
 def salvar_fotos_item(item_id, arquivos):
-    """Salva as fotos diretamente no Banco de Dados (BLOB)"""
+    """Grava as fotos no armazenamento de mídia (e gera as versões); o banco guarda só metadados e hashes"""
     if not arquivos: return
     
     contador = 0
@@ -29,19 +30,21 @@ def salvar_fotos_item(item_id, arquivos):
             filename = secure_filename(arquivo.filename)
             mimetype = arquivo.mimetype or 'application/octet-stream'
             
-            # Lê os bytes do arquivo para a memória
-            dados = arquivo.read()
+            # Copia em blocos para o disco (sem carregar o arquivo inteiro na memória)
+            hash_sha256, tamanho = armazenamento_midia.salvar(arquivo.stream)
             
-            if len(dados) > 0:
+            if tamanho > 0:
                 foto = FotoItemVenda(
                     item_venda_id=item_id,
                     nome_arquivo=filename,
                     tipo_mime=mimetype,
-                    dados_binarios=dados, # Salva aqui!
+                    hash_sha256=hash_sha256,
+                    tamanho_bytes=tamanho,
                     etapa='recebimento',
                     enviado_por_id=current_user.id
                 )
                 db.session.add(foto)
+                agendar_processamento(foto) # versões WebP geradas em segundo plano, após o commit
                 contador += 1
 
 @bp_vendas.route('/nova', methods=['GET', 'POST'])
@@ -103,6 +106,8 @@ def nova_venda():
             
             db.session.add(nova_venda)
             db.session.flush()
+            nova_venda.recalcular_totais()
+            sincronizar_cliente(nova_venda)
 
             novo_item = ItemVenda(
                 venda_id=nova_venda.id,
@@ -260,6 +265,8 @@ def salvar_venda_multipla():
 
         db.session.add(nova_venda)
         db.session.flush() 
+        nova_venda.recalcular_totais()
+        sincronizar_cliente(nova_venda)
 
         # Salva itens e suas respectivas fotos
         for item, original_idx in itens_com_idx:
@@ -49,11 +49,12 @@ def registrar_pagamento(id):
         usuario_id=current_user.id
     )
     db.session.add(novo_pgto)
+    db.session.flush()
     
-    # Atualiza status financeiro da venda
-    db.session.commit() 
+    # Atualiza totais e status financeiro da venda (mesma transação do pagamento)
+    venda.recalcular_totais()
     
-    if venda.valor_restante <= 0.01: # Margem de erro float
+    if venda.valor_restante <= Decimal('0.01'): # Margem de erro de arredondamento
         venda.status_pagamento = 'pago'
     else:
         venda.status_pagamento = 'parcial'
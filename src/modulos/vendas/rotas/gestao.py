@@ -4,9 +4,14 @@ from sqlalchemy import func, or_
 from datetime import timedelta, datetime
 from decimal import Decimal
 
-from src.extensoes import banco_de_dados as db
+from src.extensoes import banco_de_dados as db, cache_agregados
+from src.periodos import periodo_mes, periodo_datas, hoje_brasilia
+from src.paginacao import paginar_keyset, contagem_estimada, urls_da_pagina
+from src.modulos.busca import motor as busca
 from src.modulos.vendas.modelos import Venda, ItemVenda, Pagamento, hora_brasilia
 from src.modulos.vendas.formularios import FormularioPagamento
+from src.modulos.vendas.servicos import sincronizar_cliente
+from src.modulos.operacional.servicos import contar_tarefas
 from src.modulos.autenticacao.modelos import Usuario
 from src.modulos.rh.modelos import Colaborador  # <--- IMPORTANTE: Adicionado para corrigir o erro
 
@@ -33,13 +38,39 @@ def converter_decimal(valor_str):
     except: 
         return Decimal('0.00')
 
+def _kpis_gestao():
+    """Cards do topo da gestão de serviços (saldos e contagens da loja inteira)"""
+    hoje = hoje_brasilia()
+    data_30_dias_atras = hora_brasilia() - timedelta(days=30)
+
+    # KPIS FINANCEIROS SEGUROS (Saldo restante materializado em cada venda)
+    a_receber = db.session.query(func.sum(Venda.valor_restante)).filter(
+        Venda.valor_restante > 0,
+        Venda.status != 'orcamento', 
+        Venda.status != 'cancelado'
+    ).scalar() or 0
+    
+    recebido_mes = db.session.query(func.sum(Pagamento.valor)).filter(Pagamento.data_pagamento >= periodo_mes(hoje.month, hoje.year).inicio).scalar() or 0
+    
+    # Fila de produção (mesma contagem do painel inicial e do operacional)
+    tarefas = contar_tarefas(hoje)
+    
+    return {
+        'a_receber': a_receber,
+        'recebido_mes': recebido_mes,
+        'qtd_pendente': tarefas.pendente,
+        'qtd_producao': tarefas.producao,
+        'qtd_pronto': tarefas.pronto,
+        'qtd_entregues_mes': tarefas.entregues_mes,
+        'qtd_cancelados_30d': Venda.query.filter(Venda.status == 'cancelado', Venda.data_cancelamento >= data_30_dias_atras).count()
+    }
+
 # NOME PADRONIZADO: listar_vendas
 @bp_vendas.route('/lista', methods=['GET'])
 @login_required
 @cargo_exigido('gestao_acesso')
 def listar_vendas():
     # 1. Filtros
-    page = request.args.get('page', 1, type=int)
     per_page = 10
     
     filtro_q = request.args.get('q', '').strip()
@@ -51,16 +82,11 @@ def listar_vendas():
     query = Venda.query.filter(Venda.status != 'orcamento')
 
     if filtro_q:
-        query = query.outerjoin(ItemVenda)
-        condicoes = [
-            Venda.cliente_nome.ilike(f'%{filtro_q}%'),
-            Venda.descricao_servico.ilike(f'%{filtro_q}%'),
-            ItemVenda.descricao.ilike(f'%{filtro_q}%'),
-            Venda.cor_nome_snapshot.ilike(f'%{filtro_q}%')
-        ]
+        # Cliente, descrição, cor e itens vêm do documento da venda no motor de busca (sem acento/caixa)
+        condicoes = [busca.condicao('venda', filtro_q, Venda.id)]
         if filtro_q.isdigit():
             condicoes.append(Venda.id == int(filtro_q))
-        query = query.filter(or_(*condicoes)).distinct()
+        query = query.filter(or_(*condicoes))
 
     if filtro_status:
         query = query.filter(Venda.status == filtro_status)
@@ -72,67 +98,50 @@ def listar_vendas():
                      .filter(Colaborador.nome_completo == filtro_vendedor)
 
     if filtro_data:
-        query = query.filter(func.date(Venda.criado_em) == filtro_data)
+        periodo = periodo_datas(filtro_data, filtro_data)
+        if periodo is not None:
+            query = query.filter(periodo.filtro(Venda.criado_em))
 
-    query = query.order_by(Venda.id.desc())
-    paginacao = query.paginate(page=page, per_page=per_page, error_out=False)
-    servicos = paginacao.items 
+    # Paginação por chave em id DESC (cursores depois/antes): qualquer página custa o mesmo.
+    # O total do rodapé é a estimativa do planejador, não um COUNT(*) da base inteira
+    paginacao = paginar_keyset(query, [(Venda.id, False)], lambda v: [v.id], per_page,
+                               depois=request.args.get('depois') or None, antes=request.args.get('antes') or None)
+    servicos = paginacao.itens
+    total_servicos, total_exato = contagem_estimada(query)
+    url_anterior, url_proxima = urls_da_pagina(paginacao)
     
     # ==========================================
-    # 3. KPIS
+    # 3. KPIS (da loja inteira, vêm do cache compartilhado)
     # ==========================================
-    hoje = hora_brasilia().date()
-    inicio_mes = hoje.replace(day=1)
-    data_30_dias_atras = hora_brasilia() - timedelta(days=30)
-    
-    total_vendido = db.session.query(func.sum(Venda.valor_final)).filter(Venda.status != 'orcamento', Venda.status != 'cancelado').scalar() or 0
-    total_recebido_geral = db.session.query(func.sum(Pagamento.valor)).scalar() or 0
-    
-    # KPIS FINANCEIROS SEGUROS (Calculado item por item para evitar furos matemáticos)
-    vendas_ativas_gestao = Venda.query.filter(
-        Venda.status != 'orcamento', 
-        Venda.status != 'cancelado'
-    ).all()
-    
-    a_receber = sum(float(v.valor_restante) for v in vendas_ativas_gestao)
-    
-    recebido_mes = db.session.query(func.sum(Pagamento.valor)).filter(Pagamento.data_pagamento >= inicio_mes).scalar() or 0
-    
-    # Contagens
-    itens_pendente = ItemVenda.query.join(Venda).filter(ItemVenda.status=='pendente', Venda.status!='cancelado', Venda.modo=='multipla').count()
-    itens_producao = ItemVenda.query.join(Venda).filter(ItemVenda.status=='producao', Venda.status!='cancelado', Venda.modo=='multipla').count()
-    itens_pronto = ItemVenda.query.join(Venda).filter(ItemVenda.status=='pronto', Venda.status!='cancelado', Venda.modo=='multipla').count()
-    
-    vendas_simples_pendente = Venda.query.filter(Venda.modo == 'simples', Venda.status == 'pendente').count()
-    vendas_simples_producao = Venda.query.filter(Venda.modo == 'simples', Venda.status == 'producao').count()
-    vendas_simples_pronto = Venda.query.filter(Venda.modo == 'simples', Venda.status == 'pronto').count()
-    
-    qtd_pendente = itens_pendente + vendas_simples_pendente
-    qtd_producao = itens_producao + vendas_simples_producao
-    qtd_pronto = itens_pronto + vendas_simples_pronto
-    
-    qtd_cancelados_30d = Venda.query.filter(Venda.status == 'cancelado', Venda.data_cancelamento >= data_30_dias_atras).count()
+    hoje = hoje_brasilia()
+    chave = cache_agregados.chave('vendas_kpis', hoje.year, hoje.month, hoje.day)
+    kpis = cache_agregados.obter_ou_calcular(chave, _kpis_gestao)
 
     form_pgto = FormularioPagamento()
     
     # CORREÇÃO: Query para popular o Select de Vendedores (usando Colaborador)
+    # EXISTS por usuário (índice em vendedor_id) em vez de JOIN com todas as vendas + DISTINCT
     vendedores_query = db.session.query(Colaborador.nome_completo)\
         .join(Usuario, Usuario.colaborador_id == Colaborador.id)\
-        .join(Venda, Venda.vendedor_id == Usuario.id)\
+        .filter(db.session.query(Venda.id).filter(Venda.vendedor_id == Usuario.id).exists())\
         .distinct().all()
         
     vendedores = [v[0] for v in vendedores_query]
 
     return render_template('vendas/gestao_servicos.html', 
                            servicos=servicos,
-                           paginacao=paginacao,
+                           total_servicos=total_servicos,
+                           total_exato=total_exato,
+                           url_anterior=url_anterior,
+                           url_proxima=url_proxima,
                            vendedores=vendedores,
-                           kpi_receber=a_receber,
-                           kpi_recebido_mes=recebido_mes,
-                           qtd_pendente=qtd_pendente,
-                           qtd_producao=qtd_producao,
-                           qtd_pronto=qtd_pronto,
-                           qtd_cancelados=qtd_cancelados_30d,
+                           kpi_receber=kpis['a_receber'],
+                           kpi_recebido_mes=kpis['recebido_mes'],
+                           qtd_pendente=kpis['qtd_pendente'],
+                           qtd_producao=kpis['qtd_producao'],
+                           qtd_pronto=kpis['qtd_pronto'],
+                           qtd_entregues_mes=kpis['qtd_entregues_mes'],
+                           qtd_cancelados=kpis['qtd_cancelados_30d'],
                            form_pgto=form_pgto,
                            filtros={
                                'q': filtro_q,
@@ -165,6 +174,7 @@ def editar_venda(id):
             venda.cliente_contato = request.form.get('telefone')
             venda.cliente_email = request.form.get('email')
             venda.cliente_endereco = request.form.get('endereco')
+            sincronizar_cliente(venda)
             
             venda.prioridade = True if request.form.get('prioridade') == 'on' else False
             venda.descricao_servico = request.form.get('descricao_servico')
@@ -272,7 +282,8 @@ def editar_venda(id):
                 if pgto.id not in pgtos_enviados_ids: db.session.delete(pgto)
 
             db.session.flush()
-            if venda.valor_restante <= 0.01: venda.status_pagamento = 'pago'
+            venda.recalcular_totais()
+            if venda.valor_restante <= Decimal('0.01'): venda.status_pagamento = 'pago'
             elif venda.valor_pago > 0: venda.status_pagamento = 'parcial'
             else: venda.status_pagamento = 'pendente'
 
@@ -0,0 +1,500 @@
+import os
+import re
+from collections import defaultdict, Counter
+from io import BytesIO
+from sqlalchemy import func, select, update, or_, text, event, inspect, values, column, Integer
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import aliased, Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+from src.extensoes import banco_de_dados as db, armazenamento_midia, processador_midia
+from src.midia import gerar_derivados
+from src.modulos.vendas.modelos import Venda, ItemVenda, Pagamento, FotoItemVenda, Cliente, PalavraCliente, hora_brasilia, \
+    CONTADORES_STATUS_ITENS
+from src.modulos.busca.motor import normalizar, palavras_da_busca, ACENTOS, SEM_ACENTOS
+
+
+def recalcular_totais_vendas(apenas_verificar=False):
+    """
+    Confere valor_pago/valor_restante de todas as vendas contra a tabela de pagamentos.
+    Retorna a lista de divergências encontradas e, se apenas_verificar=False, corrige-as.
+    """
+    soma = select(Pagamento.venda_id, func.sum(Pagamento.valor).label('pago'))\
+        .group_by(Pagamento.venda_id).subquery()
+    pago_real = func.coalesce(soma.c.pago, 0)
+    restante_real = func.greatest(Venda.valor_final - pago_real, 0)
+
+    divergencias = db.session.query(
+        Venda.id, Venda.valor_pago, pago_real, Venda.valor_restante, restante_real
+    ).outerjoin(soma, soma.c.venda_id == Venda.id).filter(
+        or_(Venda.valor_pago != pago_real, Venda.valor_restante != restante_real)
+    ).order_by(Venda.id).all()
+
+    if divergencias and not apenas_verificar:
+        pago_sq = select(func.coalesce(func.sum(Pagamento.valor), 0))\
+            .where(Pagamento.venda_id == Venda.id).scalar_subquery()
+        ids = [d[0] for d in divergencias]
+
+        # Atualiza em lotes para não montar um IN gigante
+        for i in range(0, len(ids), 1000):
+            db.session.execute(
+                update(Venda)
+                .where(Venda.id.in_(ids[i:i + 1000]))
+                .values(valor_pago=pago_sq, valor_restante=func.greatest(Venda.valor_final - pago_sq, 0))
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+
+    return divergencias
+
+
+def migrar_fotos_para_disco(lote=50):
+    """
+    Move os BLOBs de fotos_itens_venda para o armazenamento de mídia, um lote por vez
+    (só `lote` fotos em memória). Cada lote só zera dados_binarios depois que os arquivos
+    foram gravados e sincronizados no disco, e é confirmado separadamente — se parar no
+    meio, basta rodar de novo. Retorna (fotos movidas, bytes movidos).
+    """
+    movidas, total_bytes = 0, 0
+    ultimo_id = 0
+    while True:
+        fotos = db.session.query(FotoItemVenda.id, FotoItemVenda.dados_binarios).filter(
+            FotoItemVenda.id > ultimo_id,
+            FotoItemVenda.dados_binarios.isnot(None)
+        ).order_by(FotoItemVenda.id).limit(lote).all()
+        if not fotos:
+            break
+
+        for foto_id, dados in fotos:
+            hash_sha256, tamanho = armazenamento_midia.salvar(BytesIO(dados))
+            db.session.execute(
+                update(FotoItemVenda)
+                .where(FotoItemVenda.id == foto_id)
+                .values(hash_sha256=hash_sha256, tamanho_bytes=tamanho, dados_binarios=None)
+                .execution_options(synchronize_session=False)
+            )
+            movidas += 1
+            total_bytes += tamanho
+        db.session.commit()
+        ultimo_id = fotos[-1][0]
+
+    return movidas, total_bytes
+
+
+def processar_foto(foto):
+    """
+    Gera as versões da foto (original normalizado, média e miniatura, em WebP sem EXIF)
+    a partir do arquivo enviado. Não faz commit. Fotos que ainda estão no banco (sem hash)
+    ficam como estão. Retorna o hash do arquivo bruto substituído, para ser apagado com
+    armazenamento_midia.remover_sem_uso() DEPOIS do commit (antes disso a linha ainda aponta para ele).
+    """
+    if foto.hash_sha256 is None:
+        return None
+
+    with armazenamento_midia.abrir(foto.hash_sha256) as arquivo:
+        versoes = gerar_derivados(arquivo)
+    if versoes is None:
+        foto.status_midia = 'ignorado' # não é imagem: serve o arquivo como veio
+        return None
+
+    bruto = foto.hash_sha256
+    gravados = {nome: armazenamento_midia.salvar(conteudo) for nome, conteudo in versoes.items()}
+    foto.hash_sha256, foto.tamanho_bytes = gravados['original']
+    foto.hash_media = gravados['media'][0]
+    foto.hash_miniatura = gravados['miniatura'][0]
+    foto.tipo_mime = 'image/webp'
+    foto.nome_arquivo = os.path.splitext(foto.nome_arquivo)[0] + '.webp'
+    foto.status_midia = 'pronto'
+    return bruto
+
+
+def agendar_processamento(foto):
+    """Manda a foto para o processador de mídia assim que a transação da requisição for confirmada"""
+    db.session.flush() # garante o id
+    processador_midia.apos_commit(db.session, processar_foto_pendente, foto.id)
+
+
+def processar_foto_pendente(foto_id):
+    """
+    Tarefa do processador de mídia. Trava a linha (FOR UPDATE SKIP LOCKED): se outra
+    thread/processo — ex.: o "flask gerar-versoes-fotos" — já a pegou, apenas sai.
+    """
+    foto = FotoItemVenda.query.filter(
+        FotoItemVenda.id == foto_id,
+        FotoItemVenda.status_midia == 'pendente'
+    ).with_for_update(skip_locked=True).first()
+    if foto is None:
+        return
+
+    try:
+        bruto = processar_foto(foto)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        db.session.query(FotoItemVenda).filter(FotoItemVenda.id == foto_id)\
+            .update({'status_midia': 'erro'}, synchronize_session=False)
+        db.session.commit()
+        raise
+    armazenamento_midia.remover_sem_uso(db.session, [bruto])
+
+
+def gerar_versoes_fotos(lote=20):
+    """
+    Processa as fotos já no disco que ainda não têm versões (ou que deram erro), um lote
+    por transação (pode parar e rodar de novo). Linhas travadas pelo processador em
+    segundo plano são puladas. Retorna (processadas, ignoradas, com erro, bytes antes, bytes depois).
+    """
+    processadas, ignoradas, erros, antes, depois = 0, 0, 0, 0, 0
+    ultimo_id = 0
+    while True:
+        fotos = FotoItemVenda.query.filter(
+            FotoItemVenda.id > ultimo_id,
+            FotoItemVenda.status_midia.in_(['pendente', 'erro']),
+            FotoItemVenda.hash_sha256.isnot(None)
+        ).order_by(FotoItemVenda.id).limit(lote).with_for_update(skip_locked=True).all()
+        if not fotos:
+            break
+
+        brutos = []
+        for foto in fotos:
+            tamanho_bruto = foto.tamanho_bytes or 0
+            try:
+                brutos.append(processar_foto(foto))
+            except Exception as e:
+                print(f"Foto #{foto.id}: {e}")
+                foto.status_midia = 'erro'
+                erros += 1
+                continue
+            if foto.status_midia == 'pronto':
+                processadas += 1
+                antes += tamanho_bruto
+                depois += foto.tamanho_bytes or 0
+            else:
+                ignoradas += 1
+        ultimo_id = fotos[-1].id
+        db.session.commit()
+        armazenamento_midia.remover_sem_uso(db.session, brutos)
+
+    return processadas, ignoradas, erros, antes, depois
+
+
+# =========================================================
+# --- CLIENTES ---
+# =========================================================
+SUGESTOES_CLIENTES = 10
+CANDIDATOS_POR_PALAVRA = 100
+
+_CAMPOS_CONTATO = ('solicitante', 'contato', 'email', 'endereco')
+
+
+def normalizar_nome_cliente(nome):
+    """Chave do nome: sem acento/caixa e com espaços simples ("  JOSÉ  da Silva" -> "jose da silva")"""
+    return ' '.join(normalizar(nome).split())[:150]
+
+
+def normalizar_documento(documento):
+    """CPF/CNPJ só com dígitos; vazio vira None"""
+    return re.sub(r'[^0-9]', '', documento or '')[:20] or None
+
+
+def formatar_documento(documento):
+    if documento and len(documento) == 11:
+        return f'{documento[:3]}.{documento[3:6]}.{documento[6:9]}-{documento[9:]}'
+    if documento and len(documento) == 14:
+        return f'{documento[:2]}.{documento[2:5]}.{documento[5:8]}/{documento[8:12]}-{documento[12:]}'
+    return documento or ''
+
+
+def sincronizar_cliente(venda):
+    """
+    Cria ou atualiza o cliente da venda (upsert pela identidade: documento ou, sem ele,
+    nome normalizado) e liga a venda a ele. Os dados de contato mais recentes prevalecem,
+    mas um campo deixado em branco na venda não apaga o que o cadastro já tinha.
+    Não faz commit.
+    """
+    nome = (venda.cliente_nome or '').strip()
+    nome_normalizado = normalizar_nome_cliente(nome)
+    if not nome_normalizado:
+        venda.cliente_id = None
+        return None
+
+    documento = normalizar_documento(venda.cliente_documento)
+    agora = hora_brasilia()
+    dados = {
+        'tipo': venda.tipo_cliente or 'PF',
+        'nome': nome[:150],
+        'nome_normalizado': nome_normalizado,
+        'documento': documento,
+        'solicitante': venda.cliente_solicitante or None,
+        'contato': venda.cliente_contato or None,
+        'email': venda.cliente_email or None,
+        'endereco': venda.cliente_endereco or None,
+        'atualizado_em': agora,
+    }
+    insercao = insert(Cliente).values(criado_em=agora, **dados)
+    tabela = Cliente.__table__
+    atualizar = {
+        'tipo': insercao.excluded.tipo,
+        'nome': insercao.excluded.nome,
+        'nome_normalizado': insercao.excluded.nome_normalizado,
+        'atualizado_em': insercao.excluded.atualizado_em,
+        **{campo: func.coalesce(insercao.excluded[campo], tabela.c[campo]) for campo in _CAMPOS_CONTATO},
+    }
+    # Cada identidade tem o seu índice único parcial (dois clientes "Maria" com CPFs diferentes convivem)
+    if documento:
+        insercao = insercao.on_conflict_do_update(
+            index_elements=['documento'], index_where=tabela.c.documento.isnot(None), set_=atualizar)
+    else:
+        insercao = insercao.on_conflict_do_update(
+            index_elements=['nome_normalizado'], index_where=tabela.c.documento.is_(None), set_=atualizar)
+
+    venda.cliente_id = db.session.execute(insercao.returning(tabela.c.id)).scalar_one()
+    _indexar_palavras(venda.cliente_id, nome_normalizado)
+    return venda.cliente_id
+
+
+def _indexar_palavras(cliente_id, nome_normalizado):
+    palavras = sorted(set(palavras_da_busca(nome_normalizado)))
+    db.session.execute(PalavraCliente.__table__.delete().where(
+        PalavraCliente.cliente_id == cliente_id, PalavraCliente.palavra.notin_(palavras)))
+    if palavras:
+        db.session.execute(insert(PalavraCliente).values(
+            [{'palavra': p, 'cliente_id': cliente_id} for p in palavras]).on_conflict_do_nothing())
+
+
+def _nome_normalizado_sql(coluna):
+    # Mesmo resultado de normalizar_nome_cliente()
+    return (f"left(regexp_replace(btrim(lower(translate({coluna}, '{ACENTOS}', '{SEM_ACENTOS}'))), "
+            f"'\\s+', ' ', 'g'), 150)")
+
+
+def _documento_sql(coluna):
+    # Mesmo resultado de normalizar_documento()
+    return f"nullif(left(regexp_replace(coalesce({coluna}, ''), '[^0-9]', '', 'g'), 20), '')"
+
+
+def deduplicar_clientes():
+    """
+    Monta o cadastro de clientes a partir de todo o histórico de vendas: agrupa as vendas
+    pela identidade do cliente, guarda o valor mais recente de cada campo (ignorando os
+    vazios), religa cada venda ao seu cliente, apaga clientes que ficaram sem vendas
+    (ex.: nome corrigido numa edição) e refaz as palavras do autocomplete. Idempotente. Retorna (clientes, vendas religadas, removidos).
+    """
+    ultimo = "(array_agg({0} ORDER BY criado_em DESC, id DESC) FILTER (WHERE coalesce({0}, '') <> ''))[1]"
+    for com_documento in (True, False):
+        chave = 'documento' if com_documento else 'nome_normalizado'
+        condicao = 'documento IS NOT NULL' if com_documento else 'documento IS NULL'
+        db.session.execute(text(f"""
+            INSERT INTO clientes (tipo, nome, nome_normalizado, documento, solicitante, contato, email,
+                                  endereco, criado_em, atualizado_em)
+            SELECT {ultimo.format('tipo_cliente')}, {ultimo.format('btrim(cliente_nome)')},
+                   {ultimo.format('nome_normalizado')}, documento,
+                   {ultimo.format('cliente_solicitante')}, {ultimo.format('cliente_contato')},
+                   {ultimo.format('cliente_email')}, {ultimo.format('cliente_endereco')},
+                   min(criado_em), max(criado_em)
+            FROM (
+                SELECT id, criado_em, tipo_cliente, cliente_nome, cliente_solicitante, cliente_contato,
+                       cliente_email, cliente_endereco,
+                       {_nome_normalizado_sql('cliente_nome')} AS nome_normalizado,
+                       {_documento_sql('cliente_documento')} AS documento
+                FROM vendas
+            ) v
+            WHERE nome_normalizado <> '' AND {condicao}
+            GROUP BY {'documento' if com_documento else 'nome_normalizado, documento'}
+            ON CONFLICT ({chave}) WHERE {condicao} DO UPDATE SET
+                tipo = EXCLUDED.tipo, nome = EXCLUDED.nome, nome_normalizado = EXCLUDED.nome_normalizado,
+                solicitante = EXCLUDED.solicitante, contato = EXCLUDED.contato, email = EXCLUDED.email,
+                endereco = EXCLUDED.endereco, atualizado_em = EXCLUDED.atualizado_em
+        """))
+
+    religadas = db.session.execute(text(f"""
+        UPDATE vendas v SET cliente_id = coalesce(por_documento.id, por_nome.id)
+        FROM (SELECT id, {_nome_normalizado_sql('cliente_nome')} AS nome_normalizado,
+                     {_documento_sql('cliente_documento')} AS documento
+              FROM vendas) chave
+        LEFT JOIN clientes por_documento ON por_documento.documento = chave.documento
+        LEFT JOIN clientes por_nome ON chave.documento IS NULL AND por_nome.documento IS NULL
+                                   AND por_nome.nome_normalizado = chave.nome_normalizado
+        WHERE chave.id = v.id AND v.cliente_id IS DISTINCT FROM coalesce(por_documento.id, por_nome.id)
+    """)).rowcount
+
+    removidos = db.session.execute(text("""
+        DELETE FROM clientes c WHERE NOT EXISTS (SELECT 1 FROM vendas v WHERE v.cliente_id = c.id)
+    """)).rowcount
+    db.session.execute(text('DELETE FROM clientes_palavras'))
+    db.session.execute(text("""
+        INSERT INTO clientes_palavras (palavra, cliente_id)
+        SELECT DISTINCT palavra, id FROM clientes, regexp_split_to_table(nome_normalizado, '[^a-z0-9]+') AS palavra
+        WHERE palavra <> ''
+    """))
+    total = db.session.query(func.count(Cliente.id)).scalar()
+    db.session.commit()
+    return total, religadas, removidos
+
+
+def sugerir_clientes(termo, limite=SUGESTOES_CLIENTES):
+    """
+    Autocomplete: clientes cujo nome (ou documento, se o termo só tem dígitos e
+    pontuação) começa com o termo, em ordem alfabética, servidos pelos índices
+    de prefixo. Se faltarem sugestões, completa com nomes que tenham uma palavra
+    começando com cada palavra digitada ("silv" acha "joao silva").
+    """
+    if re.fullmatch(r'[0-9.\-/\s]+', termo):
+        documento = normalizar_documento(termo)
+        if not documento:
+            return []
+        return Cliente.query.filter(Cliente.documento.startswith(documento, autoescape=True))\
+            .order_by(Cliente.documento).limit(limite).all()
+
+    inicio = normalizar_nome_cliente(termo)
+    if not inicio:
+        return []
+    clientes = Cliente.query.filter(Cliente.nome_normalizado.startswith(inicio, autoescape=True))\
+        .order_by(Cliente.nome_normalizado).limit(limite).all()
+
+    palavras = palavras_da_busca(termo)
+    if len(clientes) < limite and palavras:
+        # Uma faixa da chave primária por palavra digitada; o planejador começa pela mais rara
+        primeira, *demais = [aliased(PalavraCliente) for _ in palavras]
+        candidatos = select(primeira.cliente_id).where(primeira.palavra.startswith(palavras[0], autoescape=True))
+        for alias, palavra in zip(demais, palavras[1:]):
+            candidatos = candidatos.join(alias, alias.cliente_id == primeira.cliente_id)\
+                .where(alias.palavra.startswith(palavra, autoescape=True))
+        candidatos = candidatos.limit(CANDIDATOS_POR_PALAVRA).scalar_subquery()
+        ja_sugeridos = [c.id for c in clientes]
+        clientes += Cliente.query.filter(Cliente.id.in_(candidatos), Cliente.id.notin_(ja_sugeridos))\
+            .order_by(Cliente.nome_normalizado).limit(limite - len(clientes)).all()
+    return clientes
+
+
+# =========================================================
+# --- CONTADORES DE STATUS DOS ITENS ---
+# =========================================================
+def _gravado(estado, atributo):
+    # Valor que o banco tinha antes deste flush
+    historico = estado.attrs[atributo].history
+    anteriores = historico.deleted or historico.unchanged
+    return anteriores[0] if anteriores else None
+
+
+def _deltas_status_itens(session):
+    """{venda_id: Counter(coluna: delta)} dos itens incluídos, excluídos ou que mudaram de status/venda"""
+    deltas = defaultdict(Counter)
+
+    def contar(venda_id, status, sinal):
+        coluna = CONTADORES_STATUS_ITENS.get(status)
+        if venda_id is not None and coluna:
+            deltas[venda_id][coluna] += sinal
+
+    for item in session.new:
+        if isinstance(item, ItemVenda):
+            contar(item.venda_id, item.status, 1)
+    for item in session.deleted:
+        if isinstance(item, ItemVenda):
+            estado = inspect(item)
+            contar(_gravado(estado, 'venda_id'), _gravado(estado, 'status'), -1)
+    for item in session.dirty:
+        if not isinstance(item, ItemVenda):
+            continue
+        estado = inspect(item)
+        if estado.attrs.status.history.has_changes() or estado.attrs.venda_id.history.has_changes():
+            contar(_gravado(estado, 'venda_id'), _gravado(estado, 'status'), -1)
+            contar(item.venda_id, item.status, 1)
+    return deltas
+
+
+def _aplicar_contadores(conexao, session, deltas):
+    """
+    Soma os deltas aos contadores num UPDATE só. As vendas são travadas em ordem de id
+    (como os saldos de estoque): mudanças simultâneas em itens da mesma venda esperam
+    uma pela outra, e a segunda enxerga os contadores já somados pela primeira.
+    """
+    deltas = {v: d for v, d in deltas.items() if any(d.values())}
+    if not deltas:
+        return
+    tabela = Venda.__table__
+    colunas = list(CONTADORES_STATUS_ITENS.values())
+    travadas = select(tabela.c.id).where(tabela.c.id.in_(list(deltas)))\
+        .order_by(tabela.c.id).with_for_update().cte('travadas')
+    parcelas = values(column('venda_id', Integer), *[column(c, Integer) for c in colunas], name='parcelas')\
+        .data([(venda_id, *[d[c] for c in colunas]) for venda_id, d in sorted(deltas.items())])
+
+    contadores = conexao.execute(
+        update(tabela)
+        .where(tabela.c.id == travadas.c.id, tabela.c.id == parcelas.c.venda_id)
+        .values({c: tabela.c[c] + parcelas.c[c] for c in colunas})
+        .returning(tabela.c.id, *[tabela.c[c] for c in colunas])
+    ).all()
+
+    # Vendas já carregadas na sessão passam a enxergar os contadores gravados
+    for venda_id, *valores in contadores:
+        venda = session.identity_map.get(identity_key(Venda, venda_id))
+        if venda is not None:
+            for coluna, valor in zip(colunas, valores):
+                set_committed_value(venda, coluna, valor)
+
+
+def _apos_flush_itens(session, flush_context):
+    deltas = session.info.setdefault('contadores_itens', defaultdict(Counter))
+    for venda_id, delta in _deltas_status_itens(session).items():
+        deltas[venda_id].update(delta)
+
+
+def _apos_flush_itens_executado(session, flush_context):
+    deltas = session.info.pop('contadores_itens', None)
+    if deltas:
+        _aplicar_contadores(session.connection(), session, deltas)
+
+
+def _carregar_valor_antigo(alvo, valor, anterior, iniciador):
+    return valor
+
+
+def monitorar_status_itens():
+    """Liga a manutenção dos contadores de status de Venda ao flush de qualquer sessão (idempotente)"""
+    if not event.contains(Session, 'after_flush', _apos_flush_itens):
+        event.listen(Session, 'after_flush', _apos_flush_itens)
+        event.listen(Session, 'after_flush_postexec', _apos_flush_itens_executado)
+        # Status trocado com o atributo expirado: sem o valor antigo o contador dele não seria baixado
+        event.listen(ItemVenda.status, 'set', _carregar_valor_antigo, active_history=True, retval=True)
+
+
+def recalcular_contadores_itens(apenas_verificar=False):
+    """
+    Confere os contadores de status de todas as vendas contra os itens. Retorna
+    [(venda_id, {coluna: (gravado, real)})] das divergências e, se apenas_verificar=False,
+    corrige-as. Também serve para preencher contadores de itens gravados fora do ORM.
+    """
+    colunas = list(CONTADORES_STATUS_ITENS.items())
+    contagem = select(ItemVenda.venda_id, *[
+        func.count().filter(ItemVenda.status == status).label(coluna) for status, coluna in colunas
+    ]).group_by(ItemVenda.venda_id).subquery()
+    reais = [func.coalesce(contagem.c[coluna], 0) for _, coluna in colunas]
+    gravados = [getattr(Venda, coluna) for _, coluna in colunas]
+
+    linhas = db.session.query(Venda.id, *gravados, *reais)\
+        .outerjoin(contagem, contagem.c.venda_id == Venda.id)\
+        .filter(or_(*[g != r for g, r in zip(gravados, reais)]))\
+        .order_by(Venda.id).all()
+    divergencias = [
+        (linha[0], {coluna: (linha[1 + i], linha[1 + len(colunas) + i])
+                    for i, (_, coluna) in enumerate(colunas) if linha[1 + i] != linha[1 + len(colunas) + i]})
+        for linha in linhas
+    ]
+
+    if divergencias and not apenas_verificar:
+        contar = {coluna: select(func.count()).where(ItemVenda.venda_id == Venda.id, ItemVenda.status == status)
+                  .scalar_subquery() for status, coluna in colunas}
+        ids = [d[0] for d in divergencias]
+
+        # Atualiza em lotes para não montar um IN gigante
+        for i in range(0, len(ids), 1000):
+            db.session.execute(
+                update(Venda)
+                .where(Venda.id.in_(ids[i:i + 1000]))
+                .values(contar)
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+
+    return divergencias
\ No newline at end of file
@@ -0,0 +1,151 @@
+import json
+import base64
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import request, url_for
+from sqlalchemy import and_, or_
+from werkzeug.exceptions import BadRequest
+
+# Abaixo disso a estimativa do planejador é trocada por um COUNT exato (barato nesse tamanho)
+LIMITE_CONTAGEM_EXATA = 1000
+
+
+@dataclass
+class PaginaKeyset:
+    """Uma página da paginação por chave: as linhas e os cursores opacos para as vizinhas"""
+    itens: list = field(default_factory=list)
+    proximo: str = None
+    anterior: str = None
+
+
+def _serializar(valor):
+    if isinstance(valor, datetime):
+        return {'dt': valor.isoformat()}
+    if isinstance(valor, date):
+        return {'d': valor.isoformat()}
+    if isinstance(valor, Decimal):
+        return {'n': str(valor)}
+    return valor
+
+
+def _desserializar(valor):
+    if isinstance(valor, dict):
+        if 'dt' in valor:
+            return datetime.fromisoformat(valor['dt'])
+        if 'd' in valor:
+            return date.fromisoformat(valor['d'])
+        if 'n' in valor:
+            return Decimal(valor['n'])
+    return valor
+
+
+def codificar_cursor(valores):
+    """Valores da chave da linha -> token opaco para a URL"""
+    bruto = json.dumps([_serializar(v) for v in valores], separators=(',', ':'))
+    return base64.urlsafe_b64encode(bruto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(token, tamanho):
+    """Token -> valores da chave. Token adulterado ou de outra ordenação vira 400"""
+    try:
+        bruto = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        valores = [_desserializar(v) for v in json.loads(bruto)]
+    except (ValueError, TypeError):
+        raise BadRequest('Cursor de paginação inválido.')
+    if len(valores) != tamanho:
+        raise BadRequest('Cursor de paginação inválido.')
+    return valores
+
+
+def _depois_de(chaves, valores, para_tras, inclusivo=False):
+    """
+    Condição "linha vem depois de `valores`" na ordem das chaves [(coluna, ascendente)],
+    expandida em OR para aceitar direções misturadas:
+    (a > x) OR (a = x AND b < y) OR (a = x AND b = y AND c > z) ...
+    Com `inclusivo` a própria linha de `valores` também entra.
+    """
+    alternativas = []
+    for i, (coluna, ascendente) in enumerate(chaves):
+        ultima = inclusivo and i == len(chaves) - 1
+        if ascendente != para_tras:
+            passo = coluna >= valores[i] if ultima else coluna > valores[i]
+        else:
+            passo = coluna <= valores[i] if ultima else coluna < valores[i]
+        iguais = [c == v for (c, _), v in zip(chaves[:i], valores[:i])]
+        alternativas.append(and_(*iguais, passo))
+    return or_(*alternativas)
+
+
+def paginar_keyset(consulta, chaves, chave_da_linha, por_pagina, depois=None, antes=None, a_partir_de=None):
+    """
+    Paginação por chave (seek): em vez de OFFSET, filtra "depois da última linha
+    vista" e usa o índice da ordenação, então a página 1.000 custa o mesmo que a 1.
+    `chaves` é a ordenação completa e única [(coluna, ascendente)], sempre
+    terminando numa chave primária; `chave_da_linha(linha)` devolve os valores
+    dessas colunas para uma linha do resultado. `depois`/`antes` são os cursores
+    recebidos (no máximo um deles). Sem cursor, `a_partir_de` (valores da chave de
+    uma linha) abre a página começando nessa linha, para destacar um registro.
+    """
+    para_tras = antes is not None and depois is None
+    cursor = antes if para_tras else depois
+
+    if cursor:
+        consulta_pagina = consulta.filter(_depois_de(chaves, decodificar_cursor(cursor, len(chaves)), para_tras))
+    elif a_partir_de is not None:
+        consulta_pagina = consulta.filter(_depois_de(chaves, a_partir_de, False, inclusivo=True))
+    else:
+        consulta_pagina = consulta
+
+    ordem = [coluna.asc() if ascendente != para_tras else coluna.desc() for coluna, ascendente in chaves]
+    linhas = consulta_pagina.order_by(*ordem).limit(por_pagina + 1).all()
+
+    tem_mais = len(linhas) > por_pagina
+    linhas = linhas[:por_pagina]
+    if para_tras:
+        linhas.reverse()
+
+    pagina = PaginaKeyset(itens=linhas)
+    if linhas:
+        # Voltando, sempre existe a página seguinte (é de onde viemos); indo, sempre existe a anterior
+        if tem_mais or para_tras:
+            pagina.proximo = codificar_cursor(chave_da_linha(linhas[-1]))
+        if (tem_mais and para_tras) or (cursor and not para_tras):
+            pagina.anterior = codificar_cursor(chave_da_linha(linhas[0]))
+        elif not cursor and a_partir_de is not None:
+            valores = chave_da_linha(linhas[0])
+            if consulta.filter(_depois_de(chaves, valores, True)).limit(1).first() is not None:
+                pagina.anterior = codificar_cursor(valores)
+    return pagina
+
+
+def contagem_estimada(consulta, exata_ate=LIMITE_CONTAGEM_EXATA):
+    """
+    Total de linhas da consulta para o rodapé, sem o COUNT(*) que percorre tudo:
+    usa a estimativa do planejador (EXPLAIN, lê só as estatísticas) e só conta de
+    verdade quando ela é pequena. Devolve (total, exato).
+    """
+    declaracao = consulta.order_by(None).statement
+    conexao = consulta.session.connection()
+    compilado = declaracao.compile(dialect=conexao.dialect, compile_kwargs={'render_postcompile': True})
+    plano = conexao.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {compilado}', compilado.params).scalar()
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    estimativa = int(plano[0]['Plan']['Plan Rows'])
+
+    if estimativa <= exata_ate:
+        return consulta.order_by(None).count(), True
+    return estimativa, False
+
+
+def urls_da_pagina(pagina):
+    """Links Anterior/Próxima da requisição atual, mantendo os filtros da query string"""
+    args = request.args.to_dict()
+    args.pop('depois', None)
+    args.pop('antes', None)
+    endpoint_args = {**(request.view_args or {}), **args}
+
+    anterior = url_for(request.endpoint, **endpoint_args, antes=pagina.anterior) if pagina.anterior else None
+    proximo = url_for(request.endpoint, **endpoint_args, depois=pagina.proximo) if pagina.proximo else None
+    return anterior, proximo
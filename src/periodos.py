@@ -0,0 +1,76 @@
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from dateutil.relativedelta import relativedelta
+import pytz
+
+from sqlalchemy import and_
+
+FUSO_BRASILIA = pytz.timezone('America/Sao_Paulo')
+
+
+@dataclass(frozen=True)
+class Periodo:
+    """
+    Intervalo semiaberto [inicio, fim). Vira "coluna >= inicio AND coluna < fim",
+    que o PostgreSQL resolve com índice B-tree — ao contrário de
+    extract('month', coluna) ou func.date(coluna), que obrigam a ler a tabela toda.
+    """
+    inicio: date
+    fim: date
+
+    def filtro(self, coluna):
+        return and_(coluna >= self.inicio, coluna < self.fim)
+
+    def antes_de(self, coluna):
+        """Tudo que vem antes do fim do período (ex.: pendências acumuladas até o mês)"""
+        return coluna < self.fim
+
+    def contem(self, valor):
+        """Mesma regra do filtro, para checar valores já carregados em Python"""
+        if isinstance(valor, datetime):
+            valor = valor.date()
+        return self.inicio <= valor < self.fim
+
+
+def hoje_brasilia():
+    return datetime.now(FUSO_BRASILIA).date()
+
+
+def periodo_dia(dia):
+    return Periodo(dia, dia + timedelta(days=1))
+
+
+def periodo_hoje():
+    return periodo_dia(hoje_brasilia())
+
+
+def periodo_mes(mes, ano):
+    """O mês inteiro. Retorna None se mês/ano não formarem uma data (ex.: ?mes=13 na URL)."""
+    try:
+        inicio = date(ano, mes, 1)
+        return Periodo(inicio, inicio + relativedelta(months=1))
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def periodo_meses(mes, ano, quantidade):
+    """Os `quantidade` meses terminando em mes/ano (inclusive), ex.: janela de gráficos"""
+    fim = periodo_mes(mes, ano).fim
+    return Periodo(fim - relativedelta(months=quantidade), fim)
+
+
+def periodo_datas(data_inicio, data_fim):
+    """
+    De data_inicio até data_fim, ambos INCLUSIVOS como na tela (aceita date ou 'AAAA-MM-DD').
+    Retorna None se alguma data estiver vazia ou inválida.
+    """
+    try:
+        if isinstance(data_inicio, str):
+            data_inicio = date.fromisoformat(data_inicio.strip())
+        if isinstance(data_fim, str):
+            data_fim = date.fromisoformat(data_fim.strip())
+    except ValueError:
+        return None
+    if not data_inicio or not data_fim:
+        return None
+    return Periodo(data_inicio, data_fim + timedelta(days=1))
@@ -0,0 +1,68 @@
+// src/static/js/clientes.js
+// Autocomplete de clientes nos formulários de venda (nome PF / fantasia PJ).
+// Consulta o cadastro só depois de uma pausa na digitação; respostas iguais vêm do cache do navegador.
+
+(function() {
+    const ESPERA_MS = 250;
+    const URL_BUSCA = '/vendas/api/buscar-clientes';
+
+    function preencherSeVazio(nome, valor) {
+        const campo = document.querySelector(`[name="${nome}"]`);
+        if (campo && !campo.value && valor) campo.value = valor;
+    }
+
+    function ligarAutocomplete(input, campoDocumento) {
+        if (!input) return;
+
+        const lista = document.createElement('datalist');
+        lista.id = `sugestoes-${input.name}`;
+        input.setAttribute('list', lista.id);
+        input.setAttribute('autocomplete', 'off');
+        input.after(lista);
+
+        let sugestoes = [];
+        let espera = null;
+        let controle = null;
+
+        input.addEventListener('input', function() {
+            // Escolheu uma sugestão: completa o resto do formulário sem sobrescrever o que já foi digitado
+            const escolhido = sugestoes.find(c => c.nome === input.value);
+            if (escolhido) {
+                preencherSeVazio(campoDocumento, escolhido.documento);
+                preencherSeVazio('pj_solicitante', escolhido.solicitante);
+                preencherSeVazio('telefone', escolhido.contato);
+                preencherSeVazio('email', escolhido.email);
+                preencherSeVazio('endereco', escolhido.endereco);
+                return;
+            }
+
+            clearTimeout(espera);
+            const termo = input.value.trim();
+            if (termo.length < 2) return;
+
+            espera = setTimeout(async () => {
+                if (controle) controle.abort(); // resposta de uma busca velha não sobrescreve a nova
+                controle = new AbortController();
+                try {
+                    const res = await fetch(`${URL_BUSCA}?q=${encodeURIComponent(termo)}`, { signal: controle.signal });
+                    if (!res.ok) return;
+                    sugestoes = await res.json();
+                    lista.innerHTML = '';
+                    sugestoes.forEach(c => {
+                        const opcao = document.createElement('option');
+                        opcao.value = c.nome;
+                        if (c.documento) opcao.label = c.documento;
+                        lista.appendChild(opcao);
+                    });
+                } catch (e) {
+                    if (e.name !== 'AbortError') console.error('Erro ao buscar clientes:', e);
+                }
+            }, ESPERA_MS);
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function() {
+        ligarAutocomplete(document.querySelector('input[name="pf_nome"]'), 'pf_cpf');
+        ligarAutocomplete(document.querySelector('input[name="pj_fantasia"]'), 'pj_cnpj');
+    });
+})();
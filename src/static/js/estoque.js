@@ -108,25 +108,36 @@ function abrirModalMovimentacao(id, nome, unidade) {
 async function abrirModalHistorico(id, nome) {
     const titulo = document.getElementById('tituloHistorico');
     const tbody = document.getElementById('corpoTabelaHistorico');
-    const loading = document.getElementById('loadingHistorico');
     const vazio = document.getElementById('vazioHistorico');
 
     if(titulo) titulo.innerText = `Histórico: ${nome}`;
     if(tbody) tbody.innerHTML = ''; 
     if(vazio) vazio.classList.add('hidden');
-    if(loading) loading.classList.remove('hidden');
     
     abrirModal('modalHistorico');
+    await carregarHistorico(id, null);
+}
+
+// Uma página de /estoque/api/historico; "Carregar mais" segue o cursor devolvido pela API
+async function carregarHistorico(id, cursor) {
+    const tbody = document.getElementById('corpoTabelaHistorico');
+    const loading = document.getElementById('loadingHistorico');
+    const vazio = document.getElementById('vazioHistorico');
+    const botaoMais = document.getElementById('maisHistorico');
+
+    if(botaoMais) botaoMais.classList.add('hidden');
+    if(loading) loading.classList.remove('hidden');
 
     try {
-        const response = await fetch(`/estoque/api/historico/${id}`);
+        const url = cursor ? `/estoque/api/historico/${id}?depois=${encodeURIComponent(cursor)}` : `/estoque/api/historico/${id}`;
+        const response = await fetch(url);
         const dados = await response.json();
         if(loading) loading.classList.add('hidden');
 
-        if (dados.length === 0) {
+        if (dados.movimentacoes.length === 0 && !cursor) {
             if(vazio) vazio.classList.remove('hidden');
         } else {
-            dados.forEach(mov => {
+            dados.movimentacoes.forEach(mov => {
                 const tr = document.createElement('tr');
                 tr.className = "hover:bg-blue-50 transition-colors";
                 const isEntrada = mov.tipo === 'entrada';
@@ -157,9 +168,14 @@ async function abrirModalHistorico(id, nome) {
             });
             if(typeof lucide !== 'undefined') lucide.createIcons();
         }
+
+        if (dados.proximo && botaoMais) {
+            botaoMais.onclick = () => carregarHistorico(id, dados.proximo);
+            botaoMais.classList.remove('hidden');
+        }
     } catch (error) {
         console.error("Erro histórico:", error);
         if(loading) loading.classList.add('hidden');
-        if(tbody) tbody.innerHTML = `<tr><td colspan="7" class="text-center py-4 text-red-500">Erro ao carregar.</td></tr>`;
+        if(tbody) tbody.insertAdjacentHTML('beforeend', `<tr><td colspan="7" class="text-center py-4 text-red-500">Erro ao carregar.</td></tr>`);
     }
 }
\ No newline at end of file
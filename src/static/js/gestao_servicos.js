@@ -349,7 +349,7 @@ window.carregarDetalhesTecnicos = async function(vendaId) {
 
                     htmlFotos += `
                         <div class="relative group rounded-lg overflow-hidden border border-gray-200 aspect-square bg-gray-50">
-                            <img src="${f.url}" class="w-full h-full object-cover cursor-pointer transition-transform hover:scale-110" onclick="window.open('${f.url}', '_blank')">
+                            <img src="${f.miniatura}" loading="lazy" class="w-full h-full object-cover cursor-pointer transition-transform hover:scale-110" onclick="window.open('${f.url}', '_blank')">
                             ${btnExcluir}
                         </div>`;
                 });
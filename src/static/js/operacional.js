@@ -229,14 +229,15 @@ function abrirModalFotos(listaFotos) {
         container.classList.remove('hidden');
         avisoVazio.classList.add('hidden');
         
-        listaFotos.forEach(url => {
+        listaFotos.forEach(foto => {
             const wrapper = document.createElement('div');
             wrapper.className = 'relative group rounded-lg overflow-hidden border border-gray-200 shadow-sm';
             
             const img = document.createElement('img');
-            img.src = url;
+            img.src = foto.previa; // Versão média (WebP leve)
+            img.loading = 'lazy';
             img.className = 'w-full h-64 object-cover hover:scale-105 transition-transform duration-300 cursor-pointer';
-            img.onclick = () => window.open(url, '_blank'); // Abre original ao clicar
+            img.onclick = () => window.open(foto.original, '_blank'); // Abre original ao clicar
             
             const zoomHint = document.createElement('div');
             zoomHint.className = 'absolute inset-0 bg-black/30 opacity-0 group-hover:opacity-100 transition-opacity flex items-center justify-center pointer-events-none';
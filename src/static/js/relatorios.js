@@ -4,26 +4,28 @@ document.addEventListener('DOMContentLoaded', function() {
     if (typeof lucide !== 'undefined') lucide.createIcons();
     window.togglePeriodo();
 
-    // 1. CARREGAR DADOS DO BACKEND
-    const jsonScript = document.getElementById('dados-relatorio');
-    if (!jsonScript) return;
-    
-    const dadosBrutos = JSON.parse(jsonScript.textContent);
+    // 1. ORIGEM DOS DADOS: a API devolve uma página por vez, já filtrada e ordenada no servidor
+    const container = document.getElementById('relatorioServicos');
+    if (!container) return;
+
+    const urlApi = container.dataset.url;
+    const totalItens = parseInt(container.dataset.totalItens) || 0;
+    const totalServicos = parseInt(container.dataset.totalServicos) || 0;
 
-    // 2. DEFINIÇÃO DAS COLUNAS
+    // 2. DEFINIÇÃO DAS COLUNAS (ordenar = campo aceito pela API para ordenação)
     const defColunas = {
-        id: { label: "Venda / Data", align: "left" },
+        id: { label: "Venda / Data", align: "left", ordenar: "data" },
         dtrecebimento: { label: "Data Receb.", align: "left" }, // <--- LINHA ADICIONADA AQUI
-        cliente: { label: "Cliente", align: "left" },
+        cliente: { label: "Cliente", align: "left", ordenar: "cliente" },
         vendedor: { label: "Vendedor", align: "left" },
         item: { label: "Descrição Item", align: "left", acionaGranular: true },
         produto: { label: "Acabamento", align: "left", acionaGranular: true },
         qtd: { label: "Qtd", align: "center" },
         vunit: { label: "V. Unitário", align: "right", acionaGranular: true },
-        vtotal: { label: "V. Total", align: "right" },
+        vtotal: { label: "V. Total", align: "right", ordenar: "valor" },
         acresc_desc: { label: "Acrésc/Desc", align: "right" },
         vpago: { label: "V. Pago", align: "right" },
-        vareceber: { label: "A Receber", align: "right" },
+        vareceber: { label: "A Receber", align: "right", ordenar: "a_receber" },
         sprod: { label: "Status Prod.", align: "center" },
         spgto: { label: "Status Pgto", align: "center" }
     };
@@ -32,7 +34,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const tabelaBody = document.getElementById('tabelaBody');
     const checkboxes = document.querySelectorAll('.chk-col');
 
-    // VARIÁVEIS DE PAGINAÇÃO
+    // VARIÁVEIS DE PAGINAÇÃO (por cursor: a API só diz se existe página anterior/próxima)
     const selectLinhas = document.getElementById('selectLinhas');
     const btnPrev = document.getElementById('btnPrevPage');
     const btnNext = document.getElementById('btnNextPage');
@@ -40,81 +42,108 @@ document.addEventListener('DOMContentLoaded', function() {
 
     let currentPage = 1;
     let rowsPerPage = parseInt(selectLinhas.value) || 10;
-    let dadosProcessados = []; // Lista que vai para a tabela
+    let linhasPagina = [];
+    let cursorProximo = null;
+    let cursorAnterior = null;
+    let detalheAtual = null; // 'item' (uma linha por item) ou 'venda' (agrupado)
+    let ordenarPor = 'data';
+    let direcao = 'desc';
+    let requisicaoAtual = 0;
+
+    function colunasAtivas() {
+        return Array.from(checkboxes).filter(chk => chk.checked).map(chk => chk.value);
+    }
 
-    // 3. FUNÇÃO PARA PROCESSAR (AGRUPAR OU DETALHAR)
+    // 3. BUSCA UMA PÁGINA NA API (cursor = {depois: ...} ou {antes: ...}; nulo = primeira página)
+    function carregarPagina(cursor) {
+        const params = new URLSearchParams(window.location.search);
+        params.delete('exportar');
+        params.set('detalhe', detalheAtual);
+        params.set('ordenar', ordenarPor);
+        params.set('direcao', direcao);
+        params.set('por_pagina', rowsPerPage);
+        if (cursor) Object.entries(cursor).forEach(([chave, valor]) => params.set(chave, valor));
+
+        const numero = ++requisicaoAtual;
+        if (btnPrev) btnPrev.disabled = true;
+        if (btnNext) btnNext.disabled = true;
+        tabelaBody.innerHTML = `<tr><td colspan="${colunasAtivas().length}" class="text-center py-8 text-gray-400">Carregando...</td></tr>`;
+
+        fetch(`${urlApi}?${params.toString()}`, { headers: { 'Accept': 'application/json' } })
+            .then(resp => {
+                if (!resp.ok) throw new Error(resp.status);
+                return resp.json();
+            })
+            .then(dados => {
+                if (numero !== requisicaoAtual) return; // chegou depois de uma busca mais nova
+                linhasPagina = dados.linhas || [];
+                cursorProximo = dados.proximo;
+                cursorAnterior = dados.anterior;
+                renderizarTabela();
+            })
+            .catch(() => {
+                if (numero !== requisicaoAtual) return;
+                tabelaBody.innerHTML = `<tr><td colspan="${colunasAtivas().length}" class="text-center py-8 text-red-500">Erro ao carregar os dados. Tente novamente.</td></tr>`;
+            });
+    }
+
+    function recomecar() {
+        currentPage = 1;
+        carregarPagina(null);
+    }
+
+    // 4. AGRUPAR OU DETALHAR: quem agrupa é o servidor; aqui só decide o nível
     function processarDados() {
-        const colunasAtivas = Array.from(checkboxes)
-                                  .filter(chk => chk.checked)
-                                  .map(chk => chk.value);
-        
-        const isGranular = colunasAtivas.some(col => defColunas[col].acionaGranular);
-        
-        if (isGranular) {
-            dadosProcessados = dadosBrutos;
+        const detalhe = colunasAtivas().some(col => defColunas[col].acionaGranular) ? 'item' : 'venda';
+        if (detalhe !== detalheAtual) {
+            detalheAtual = detalhe;
+            recomecar();
         } else {
-            let mapaVendas = {};
-            dadosBrutos.forEach(row => {
-                if (!mapaVendas[row.venda_id]) {
-                    mapaVendas[row.venda_id] = { ...row, qtd_somada: 0 };
-                }
-                mapaVendas[row.venda_id].qtd_somada += row.qtd;
-            });
-            dadosProcessados = Object.values(mapaVendas);
+            renderizarTabela();
         }
-
-        // Volta para a página 1 sempre que o usuário muda os filtros de agrupamento
-        currentPage = 1; 
-        renderizarTabela();
     }
 
-    // 4. FUNÇÃO PARA RENDERIZAR NA TELA (COM PAGINAÇÃO)
+    // 5. FUNÇÃO PARA RENDERIZAR NA TELA (SÓ A PÁGINA ATUAL)
     function renderizarTabela() {
-        const colunasAtivas = Array.from(checkboxes)
-                                  .filter(chk => chk.checked)
-                                  .map(chk => chk.value);
-        const isGranular = colunasAtivas.some(col => defColunas[col].acionaGranular);
+        const ativas = colunasAtivas();
 
-        // A) CABEÇALHO
+        // A) CABEÇALHO (colunas ordenáveis ganham a seta da ordenação atual)
         let htmlHead = '<tr>';
-        colunasAtivas.forEach(col => {
+        ativas.forEach(col => {
             let classAlign = defColunas[col].align === 'right' ? 'text-right' : (defColunas[col].align === 'center' ? 'text-center' : 'text-left');
-            htmlHead += `<th class="px-4 py-3 ${classAlign}">${defColunas[col].label}</th>`;
+            const campo = defColunas[col].ordenar;
+            if (campo) {
+                const seta = campo === ordenarPor ? (direcao === 'asc' ? ' ▲' : ' ▼') : '';
+                htmlHead += `<th class="px-4 py-3 ${classAlign} cursor-pointer select-none" data-ordenar="${campo}">${defColunas[col].label}${seta}</th>`;
+            } else {
+                htmlHead += `<th class="px-4 py-3 ${classAlign}">${defColunas[col].label}</th>`;
+            }
         });
         htmlHead += '</tr>';
         tabelaHead.innerHTML = htmlHead;
 
-        // B) LÓGICA DA PAGINAÇÃO
-        const totalRows = dadosProcessados.length;
+        // B) PAGINAÇÃO
+        const totalRows = detalheAtual === 'item' ? totalItens : totalServicos;
         const totalPages = Math.ceil(totalRows / rowsPerPage) || 1;
-        
-        if (currentPage > totalPages) currentPage = totalPages;
-        if (currentPage < 1) currentPage = 1;
-        
         const startIndex = (currentPage - 1) * rowsPerPage;
-        const endIndex = startIndex + rowsPerPage;
-        
-        // Fatiar a lista (Pega apenas os itens da página atual)
-        const pageData = dadosProcessados.slice(startIndex, endIndex);
 
-        // Atualizar textos e botões na tela
         if (infoPaginacao) {
-            let startNum = totalRows === 0 ? 0 : startIndex + 1;
-            let endNum = endIndex > totalRows ? totalRows : endIndex;
+            let startNum = linhasPagina.length === 0 ? 0 : startIndex + 1;
+            let endNum = startIndex + linhasPagina.length;
             infoPaginacao.innerText = `Página ${currentPage} de ${totalPages} (${startNum}-${endNum} de ${totalRows})`;
         }
-        if (btnPrev) btnPrev.disabled = currentPage === 1;
-        if (btnNext) btnNext.disabled = currentPage === totalPages;
+        if (btnPrev) btnPrev.disabled = !cursorAnterior;
+        if (btnNext) btnNext.disabled = !cursorProximo;
 
         // C) CORPO DA TABELA
         let htmlBody = '';
-        if (pageData.length === 0) {
-            htmlBody = `<tr><td colspan="${colunasAtivas.length}" class="text-center py-8 text-gray-400">Nenhum dado encontrado.</td></tr>`;
+        if (linhasPagina.length === 0) {
+            htmlBody = `<tr><td colspan="${ativas.length}" class="text-center py-8 text-gray-400">Nenhum dado encontrado.</td></tr>`;
         } else {
-            pageData.forEach(row => {
+            linhasPagina.forEach(row => {
                 htmlBody += `<tr class="hover:bg-gray-50 transition-colors">`;
                 
-                colunasAtivas.forEach(col => {
+                ativas.forEach(col => {
                     let td = '';
                     let align = defColunas[col].align === 'right' ? 'text-right' : (defColunas[col].align === 'center' ? 'text-center' : 'text-left');
                     
@@ -134,26 +163,18 @@ document.addEventListener('DOMContentLoaded', function() {
                         case 'vendedor': td = `<span class="text-xs text-gray-600">${row.vendedor}</span>`; break;
                         case 'item': td = `<span class="font-medium text-xs">${row.item_desc}</span>`; break;
                         case 'produto': td = `<span class="text-xs text-gray-500 bg-gray-100 px-2 py-0.5 rounded">${row.produto}</span>`; break;
-                        case 'qtd': 
-                            let valorQtd = isGranular ? row.qtd : row.qtd_somada;
-                            td = `<span class="font-bold text-gray-700">${valorQtd}</span>`; break;
+                        case 'qtd': td = `<span class="font-bold text-gray-700">${row.qtd}</span>`; break;
                         case 'vunit': td = `<span class="text-xs text-gray-500">R$ ${row.valor_unit.toLocaleString('pt-BR', {minimumFractionDigits: 2})}</span>`; break;
-                        case 'vtotal': 
-                            let vtot = isGranular ? row.valor_total_item : row.valor_total_venda;
-                            td = `<span class="font-bold text-navy-900 whitespace-nowrap">R$ ${vtot.toLocaleString('pt-BR', {minimumFractionDigits: 2})}</span>`; break;
+                        case 'vtotal': td = `<span class="font-bold text-navy-900 whitespace-nowrap">R$ ${row.valor_total.toLocaleString('pt-BR', {minimumFractionDigits: 2})}</span>`; break;
                         case 'acresc_desc':
-                            let saldoVenda = row.valor_acrescimo_venda - row.valor_desconto_venda;
-                            let valorExibir = isGranular ? (saldoVenda / (row.qtd_itens_venda || 1)) : saldoVenda;
+                            let valorExibir = row.acresc_desc;
                             let corClass = valorExibir > 0 ? 'text-green-600' : (valorExibir < 0 ? 'text-red-600' : 'text-gray-500');
                             let pref = valorExibir > 0 ? '+' : '';
                             td = `<span class="font-bold ${corClass} whitespace-nowrap">${pref} R$ ${valorExibir.toLocaleString('pt-BR', {minimumFractionDigits: 2})}</span>`; 
                             break;
                         case 'vpago': td = `<span class="font-bold text-green-600 whitespace-nowrap">R$ ${row.valor_pago_venda.toLocaleString('pt-BR', {minimumFractionDigits: 2})}</span>`; break;
                         case 'vareceber': td = `<span class="font-bold text-orange-600 whitespace-nowrap">R$ ${row.a_receber_venda.toLocaleString('pt-BR', {minimumFractionDigits: 2})}</span>`; break;
-                        case 'sprod': 
-                            let statusProd = isGranular ? row.status_prod_item : row.status_prod_venda;
-                            td = getBadgeProducao(statusProd);
-                            break;
+                        case 'sprod': td = getBadgeProducao(row.status_prod); break;
                         case 'spgto': td = getBadgePagamento(row.status_pgto, row.a_receber_venda); break;
                     }
                     htmlBody += `<td class="px-4 py-3 ${align}">${td}</td>`;
@@ -165,35 +186,46 @@ document.addEventListener('DOMContentLoaded', function() {
         if (typeof lucide !== 'undefined') lucide.createIcons();
     }
 
-    // 5. LISTENERS DE EVENTOS (Cliques)
+    // 6. LISTENERS DE EVENTOS (Cliques)
     if (selectLinhas) {
         selectLinhas.addEventListener('change', function() {
             rowsPerPage = parseInt(this.value) || 10;
-            currentPage = 1;
-            renderizarTabela();
+            recomecar();
         });
     }
 
     if (btnPrev) {
         btnPrev.addEventListener('click', function() {
-            if (currentPage > 1) {
+            if (cursorAnterior) {
                 currentPage--;
-                renderizarTabela();
+                carregarPagina({ antes: cursorAnterior });
             }
         });
     }
 
     if (btnNext) {
         btnNext.addEventListener('click', function() {
-            const totalRows = dadosProcessados.length;
-            const totalPages = Math.ceil(totalRows / rowsPerPage) || 1;
-            if (currentPage < totalPages) {
+            if (cursorProximo) {
                 currentPage++;
-                renderizarTabela();
+                carregarPagina({ depois: cursorProximo });
             }
         });
     }
 
+    // Clique no cabeçalho: ordena pela coluna (de novo na mesma coluna inverte a direção)
+    tabelaHead.addEventListener('click', function(e) {
+        const th = e.target.closest('th[data-ordenar]');
+        if (!th) return;
+        const campo = th.dataset.ordenar;
+        if (campo === ordenarPor) {
+            direcao = direcao === 'asc' ? 'desc' : 'asc';
+        } else {
+            ordenarPor = campo;
+            direcao = campo === 'cliente' ? 'asc' : 'desc';
+        }
+        recomecar();
+    });
+
     checkboxes.forEach(chk => {
         chk.addEventListener('change', processarDados);
     });
@@ -201,7 +233,7 @@ document.addEventListener('DOMContentLoaded', function() {
     // START
     processarDados();
 
-    // 6. FUNÇÕES DE BADGES (MANTIDAS)
+    // 7. FUNÇÕES DE BADGES (MANTIDAS)
     function getBadgeProducao(status) {
         if(status === 'pendente') return `<span class="px-2 py-1 bg-gray-100 text-gray-600 rounded text-[10px] font-bold uppercase">Fila</span>`;
         if(status === 'producao') return `<span class="px-2 py-1 bg-blue-100 text-blue-700 rounded text-[10px] font-bold uppercase">Produção</span>`;
@@ -0,0 +1,82 @@
+import os
+import hashlib
+import tempfile
+
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+MB = 1024 * 1024
+
+
+def limite_para(content_type):
+    """Limite em bytes pelo tipo declarado da parte (prefixo mais específico de UPLOAD_LIMITES)"""
+    limites = current_app.config.get('UPLOAD_LIMITES', {})
+    tipo = (content_type or '').lower()
+    prefixos = [p for p in limites if tipo.startswith(p)]
+    if prefixos:
+        return limites[max(prefixos, key=len)]
+    return current_app.config.get('UPLOAD_LIMITE_PADRAO')
+
+
+class ArquivoRecebido:
+    """
+    Destino de cada arquivo de um upload multipart. O Werkzeug escreve aqui em blocos
+    enquanto lê o corpo da requisição: vai direto para um temporário no disco, com
+    SHA-256 e tamanho calculados no caminho, e estoura 413 assim que passa do limite
+    do tipo — o resto do corpo nem chega a ser gravado. O armazenamento de mídia
+    adota o temporário (rename) sem reler nem recalcular nada.
+    """
+
+    def __init__(self, pasta, limite, content_type=None):
+        descritor, self.caminho = tempfile.mkstemp(dir=pasta, suffix='.upload')
+        self._arquivo = os.fdopen(descritor, 'w+b')
+        self._sha = hashlib.sha256()
+        self.tamanho = 0
+        self.limite = limite
+        self.content_type = content_type
+
+    def write(self, dados):
+        self.tamanho += len(dados)
+        if self.limite and self.tamanho > self.limite:
+            raise RequestEntityTooLarge(
+                f"Arquivo acima do limite de {self.limite / MB:.0f} MB para {self.content_type or 'este tipo'}."
+            )
+        self._sha.update(dados)
+        return self._arquivo.write(dados)
+
+    @property
+    def hash_sha256(self):
+        return self._sha.hexdigest()
+
+    def finalizar(self):
+        """Grava no disco e fecha o arquivo (no Windows não dá para mover arquivo aberto)"""
+        if not self._arquivo.closed:
+            self._arquivo.flush()
+            os.fsync(self._arquivo.fileno())
+            self._arquivo.close()
+
+    def close(self):
+        # Fim da requisição: se ninguém adotou o temporário, ele é apagado
+        self._arquivo.close()
+        if os.path.exists(self.caminho):
+            os.remove(self.caminho)
+
+    def __getattr__(self, nome):
+        # read/seek/tell/readline... vão direto para o arquivo
+        return getattr(self._arquivo, nome)
+
+
+class RequisicaoComUpload(Request):
+    """Request da aplicação: uploads passam por ArquivoRecebido em vez do spool padrão do Werkzeug"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        pasta = current_app.extensions['armazenamento_midia'].pasta_temporaria
+        arquivo = ArquivoRecebido(pasta, limite_para(content_type), content_type)
+        # Guardado aqui também para ser apagado mesmo se o parse abortar no meio (413)
+        self.__dict__.setdefault('_arquivos_recebidos', []).append(arquivo)
+        return arquivo
+
+    def close(self):
+        super().close()
+        for arquivo in self.__dict__.pop('_arquivos_recebidos', []):
+            arquivo.close()